@@ -0,0 +1,88 @@
+import atexit
+import threading
+import time
+
+
+class AutoSaver:
+    """ 自動保存をまとめて行うデバウンサ
+
+    同じキー（話のID、または画面ごとの編集のキー）への保存依頼は最後の内容だけを残し、入力が delay 秒止まったら書き込む。
+    入力が続いても max_wait 秒以上は待たせない。
+    期限が来た保存は1本の自動保存スレッドが save_func に渡す（依頼ごとにスレッドや接続を作らない）。
+    """
+
+    def __init__(self, save_func, delay=5.0, max_wait=30.0):
+        self.save_func = save_func
+        self.delay = delay
+        self.max_wait = max_wait
+        # key -> [args, 最初に依頼された時刻, 書き込む時刻]
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+        # プロセス終了時に残りを渡す
+        atexit.register(self.shutdown)
+
+    def submit(self, key, *args):
+        """ 保存を依頼する（すぐには書き込まない） """
+        with self._cond:
+            now = time.monotonic()
+            entry = self._pending.get(key)
+            first_at = entry[1] if entry else now
+            wait = min(self.delay, max(self.max_wait - (now - first_at), 0))
+            self._pending[key] = [args, first_at, now + wait]
+            self._cond.notify()
+
+    def has_pending(self, key=None):
+        """ key の保存待ちがあるか（省略するといずれかのキーに保存待ちがあるか） """
+        with self._cond:
+            return bool(self._pending) if key is None else key in self._pending
+
+    def discard(self, key):
+        """ 未保存の依頼を取り消す（削除した話など） """
+        with self._cond:
+            self._pending.pop(key, None)
+
+    def flush(self, key=None):
+        """ 保留中の保存を今すぐ書き込む（key を省略すると全て） """
+        with self._cond:
+            keys = list(self._pending) if key is None else [key]
+            entries = [self._pending.pop(k) for k in keys if k in self._pending]
+        for args, _, _ in entries:
+            self.save_func(*args)
+        return len(entries)
+
+    def shutdown(self, timeout=None):
+        """ 残りの保存を渡してから自動保存スレッドを止める """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self.flush()
+
+    def _take_due(self):
+        """ 期限が来た依頼を取り出す（なければ次の期限まで待つ。停止したら None） """
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                due = [k for k, entry in self._pending.items() if entry[2] <= now]
+                if due:
+                    return [self._pending.pop(k)[0] for k in due]
+                next_at = min((entry[2] for entry in self._pending.values()), default=None)
+                self._cond.wait(None if next_at is None else next_at - now)
+            return None
+
+    def _run(self):
+        while True:
+            due = self._take_due()
+            if due is None:
+                return
+            for args in due:
+                try:
+                    self.save_func(*args)
+                except Exception:
+                    # 書き込みキューが停止した後など。ほかの依頼は続ける
+                    pass
@@ -0,0 +1,281 @@
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from core.compression import register_sql_functions
+
+# オンラインバックアップで1回にコピーするページ数と、その間に待つ秒数（待っている間はほかの接続が書き込める）
+BACKUP_PAGES = 1024
+BACKUP_SLEEP = 0.005
+# 残すバックアップの数（古いものから削除する）
+DEFAULT_KEEP = 10
+# 増分の単位（SQLite のページの大きさの倍数）。前回から変わったページを含むまとまりだけを新しく保存する
+BLOCK_SIZE = 256 * 1024
+# 圧縮・展開・ハッシュ計算の単位
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _inspect(path):
+    """ コピーしたデータベースを確かめ、(integrity_check の結果, 含まれる作品 [(id, title)]) を返す """
+    # パスに ? # % が含まれていても、相対パスでも開けるように URI にする
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+    register_sql_functions(conn)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        # カタログ（作品一覧だけのデータベース）の作品は、復元元として使わない
+        has_blocks = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'blocks'").fetchone()
+        projects = conn.execute("SELECT id, title FROM projects ORDER BY id").fetchall() if has_blocks else []
+    finally:
+        conn.close()
+    return result, [list(p) for p in projects]
+
+
+class BackupManager:
+    """ 動いているアプリを止めずに、保存先全体のバックアップを取って復元する
+
+    SQLite のオンラインバックアップ API で一貫したコピーを作り、BLOCK_SIZE ごとに gzip で圧縮して保存する。
+    まとまりは内容のハッシュで名前を付けて objects/ に置き、前回と同じ内容のまとまりは使い回す（増分）。
+    1ファイルの保存先でも、書き込まれたページを含むまとまりだけが新しく保存される。
+    バックアップごとのメタデータ（ファイルごとのまとまりのハッシュの並び）は snapshots/<ID>.json。
+    """
+
+    def __init__(self, db, directory="data/backups", keep=DEFAULT_KEEP, max_age_days=None,
+                 pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+        self.db = db
+        self.directory = directory
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self.pages = pages
+        self.sleep = sleep
+        self._objects = os.path.join(directory, "objects")
+        self._snapshots = os.path.join(directory, "snapshots")
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._snapshots, exist_ok=True)
+        # 同じプロセスでバックアップ・削除・復元が重ならないように
+        self._lock = threading.Lock()
+        # マニフェストの一覧（新しい順）。画面の再描画のたびにファイルを読まないよう、作成・削除のときだけ読み直す
+        self._manifests = None
+
+    # --- バックアップ ---
+    def create(self, label=None):
+        """ バックアップを取り、メタデータ（マニフェスト）を返す """
+        with self._lock:
+            start = time.perf_counter()
+            created = datetime.now()
+            snapshot_id = created.strftime("%Y%m%d-%H%M%S-%f")
+            files = []
+            with tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+                for name, path in sorted(self.db.backup_to(tmp, self.pages, self.sleep).items()):
+                    files.append(self._store(name, path))
+            manifest = {
+                "id": snapshot_id,
+                "created_at": created.isoformat(timespec="seconds"),
+                "label": label,
+                "backend": type(self.db).__name__,
+                "files": files,
+                "bytes": sum(f["bytes"] for f in files),
+                "compressed_bytes": sum(f["compressed_bytes"] for f in files),
+                # このバックアップで新しく保存した量（ほかは前回までのまとまりを使い回している）
+                "written_bytes": sum(f["written_bytes"] for f in files),
+                "elapsed": time.perf_counter() - start,
+            }
+            with open(self._manifest_path(snapshot_id), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            self._prune()
+        return manifest
+
+    def _store(self, name, path):
+        """ コピーしたデータベースを確かめ、BLOCK_SIZE ごとに圧縮して objects/ に置く（同じ内容のまとまりは使い回す） """
+        check, projects = _inspect(path)
+        if check != "ok":
+            raise RuntimeError(f"{name} のバックアップが壊れています: {check}")
+        digest = hashlib.sha256()
+        blocks, compressed, written = [], 0, 0
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+                sha = hashlib.sha256(block).hexdigest()
+                obj = self._object_path(sha)
+                if not os.path.exists(obj):
+                    partial = obj + ".partial"
+                    with gzip.open(partial, "wb", compresslevel=6) as dst:
+                        dst.write(block)
+                    os.replace(partial, obj)
+                    written += os.path.getsize(obj)
+                compressed += os.path.getsize(obj)
+                blocks.append(sha)
+        return {
+            "name": name,
+            "sha256": digest.hexdigest(),
+            "bytes": os.path.getsize(path),
+            "blocks": blocks,
+            "compressed_bytes": compressed,
+            "written_bytes": written,
+            "projects": projects,
+        }
+
+    def _object_path(self, sha):
+        return os.path.join(self._objects, f"{sha}.gz")
+
+    def _entry_objects(self, entry):
+        """ ファイルを組み立てる圧縮ファイルのパスを順に返す（まとまりに分ける前のバックアップは1ファイル丸ごと） """
+        if "blocks" in entry:
+            return [self._object_path(sha) for sha in entry["blocks"]]
+        return [os.path.join(self._objects, f"{entry['sha256']}.db.gz")]
+
+    def _manifest_path(self, snapshot_id):
+        return os.path.join(self._snapshots, f"{snapshot_id}.json")
+
+    # --- 一覧・保持期間 ---
+    def list(self):
+        """ バックアップのマニフェストを新しい順に返す（ほかのプロセスが取ったものは refresh() で読み込む） """
+        manifests = self._manifests
+        if manifests is None:
+            manifests = self._manifests = self._scan()
+        return manifests[:]
+
+    def refresh(self):
+        """ マニフェストの一覧を読み直す """
+        self._manifests = None
+
+    def _scan(self):
+        manifests = []
+        for path in sorted(glob.glob(os.path.join(self._snapshots, "*.json")), reverse=True):
+            with open(path, encoding="utf-8") as f:
+                manifests.append(json.load(f))
+        return manifests
+
+    def get(self, snapshot_id):
+        path = self._manifest_path(snapshot_id)
+        if not os.path.exists(path):
+            raise KeyError(f"バックアップ {snapshot_id} がありません。")
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def prune(self):
+        """ 保持数・保持期間を超えたバックアップを削除し、削除した ID の一覧を返す """
+        with self._lock:
+            return self._prune()
+
+    def _prune(self):
+        manifests = self._scan()
+        # 最新のバックアップは期間を過ぎていても必ず残す
+        kept = manifests[:max(self.keep, 1)] if self.keep else manifests
+        if self.max_age_days is not None:
+            limit = (datetime.now() - timedelta(days=self.max_age_days)).isoformat(timespec="seconds")
+            kept = kept[:1] + [m for m in kept[1:] if m["created_at"] >= limit]
+        kept_ids = {m["id"] for m in kept}
+        expired = [m["id"] for m in manifests if m["id"] not in kept_ids]
+        for snapshot_id in expired:
+            os.remove(self._manifest_path(snapshot_id))
+        self._manifests = kept
+
+        # どのバックアップからも使われなくなった圧縮ファイルを削除する
+        used = {path for m in kept for f in m["files"] for path in self._entry_objects(f)}
+        for path in glob.glob(os.path.join(self._objects, "*.gz")):
+            if path not in used:
+                os.remove(path)
+        return expired
+
+    # --- 確認・復元 ---
+    def _extract(self, entry, directory):
+        """ 圧縮したまとまりを順に展開してつなげ、ハッシュが記録と一致するか確かめてパスを返す """
+        path = os.path.join(directory, f"{entry['name']}.db")
+        with open(path, "wb") as dst:
+            for obj in self._entry_objects(entry):
+                with gzip.open(obj, "rb") as src:
+                    shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+        if _sha256(path) != entry["sha256"]:
+            raise RuntimeError(f"{entry['name']} のバックアップの内容がメタデータと一致しません。")
+        return path
+
+    def verify(self, snapshot_id):
+        """ バックアップを展開してハッシュと integrity_check を確かめ、{名前: 問題がなければ "ok"} を返す """
+        results = {}
+        with tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+            for entry in self.get(snapshot_id)["files"]:
+                try:
+                    results[entry["name"]] = _inspect(self._extract(entry, tmp))[0]
+                except (OSError, RuntimeError, sqlite3.Error) as e:
+                    results[entry["name"]] = str(e)
+        return results
+
+    def restore(self, snapshot_id):
+        """ 保存先全体をバックアップの時点に戻す（全てのファイルを確かめてから置き換える） """
+        manifest = self.get(snapshot_id)
+        with self._lock, tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+            files = {entry["name"]: self._extract(entry, tmp) for entry in manifest["files"]}
+            for name, path in files.items():
+                check = _inspect(path)[0]
+                if check != "ok":
+                    raise RuntimeError(f"{name} のバックアップが壊れています: {check}")
+            self.db.restore_from(files)
+        return manifest
+
+    def restore_project(self, snapshot_id, project_id, title=None):
+        """ バックアップの1つの作品を、新しい作品として読み込んで作品IDを返す（今の作品はそのまま残す） """
+        from core.database import DatabaseManager
+
+        manifest = self.get(snapshot_id)
+        entry = next((f for f in manifest["files"] if any(p[0] == project_id for p in f["projects"])), None)
+        if entry is None:
+            raise KeyError(f"バックアップ {snapshot_id} に作品 {project_id} がありません。")
+        with tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+            # 展開したコピーを開く（古いバージョンならコピーの方をマイグレーションする）
+            source = DatabaseManager(self._extract(entry, tmp))
+            try:
+                tables = source.fetch_snapshot_tables(project_id)
+            finally:
+                source.close()
+        title = title or f"{tables['projects']['title'][0]}（{manifest['created_at'].replace('T', ' ')} の復元）"
+        return self.db.import_project_tables(title, tables)
+
+
+class BackupScheduler:
+    """ interval 秒ごとに job()（バックアップ）を実行するスレッド。アプリと同じプロセスで動かす """
+
+    def __init__(self, job, interval):
+        self.job = job
+        self.interval = interval
+        self.last_result = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.last_result = self.job()
+                self.last_error = None
+            except Exception as e:
+                # 失敗しても次の回は試す（アプリは止めない）
+                self.last_error = e
+
+    def stop(self, timeout=None):
+        """ スケジューラを止める（実行中のバックアップは最後まで行う） """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
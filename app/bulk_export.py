@@ -0,0 +1,158 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from app.exporter import EXPORT_FORMATS, ManuscriptExporter
+
+# 一括書き出しの既定の形式
+DEFAULT_FORMATS = ("Text (.txt)", "CSV (.csv)")
+MANIFEST_NAME = "manifest.json"
+
+# ファイル名に使えない文字
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+# ワーカープロセスごとに1つだけ開く読み込み専用の保存先
+_worker_db = None
+
+
+def _safe_name(title):
+    return _UNSAFE_CHARS.sub("_", title).strip(" .") or "untitled"
+
+
+def _open_spec(spec):
+    """ StorageBackend.read_only_spec() の (クラス, 引数, キーワード引数) から保存先を開く """
+    cls, args, kwargs = spec
+    return cls(*args, **kwargs)
+
+
+def _init_worker(spec):
+    """ ワーカープロセスの起動時に、読み込み専用の接続を開く """
+    global _worker_db
+    _worker_db = _open_spec(spec)
+
+
+def _export_project(task):
+    """ 1作品を指定形式で書き出して作品ごとの zip にまとめ、マニフェスト用の情報を返す（ワーカープロセスで実行）
+
+    圧縮もワーカーで行い、親プロセスは出来上がった zip を詰めるだけにする。
+    """
+    project_id, title, formats, out_dir = task
+    exporter = ManuscriptExporter(_worker_db)
+    start = time.perf_counter()
+    name = _safe_name(title)
+    archive = os.path.join(out_dir, f"{project_id}.zip")
+    files = []
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for file_format in formats:
+            ext, mime = EXPORT_FORMATS[file_format]
+            path = os.path.join(out_dir, f"{project_id}.{ext}")
+            with open(path, "wb") as f:
+                exporter.write(project_id, title, file_format, f)
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            # EPUB は既に圧縮されているので無圧縮で入れる
+            compress = zipfile.ZIP_STORED if ext == "epub" else zipfile.ZIP_DEFLATED
+            zf.write(path, f"{name}.{ext}", compress_type=compress)
+            files.append({
+                "name": f"{name}.{ext}",
+                "format": file_format,
+                "mime": mime,
+                "size": os.path.getsize(path),
+                "sha256": sha256.hexdigest(),
+            })
+            os.remove(path)
+    return {
+        "id": project_id,
+        "title": title,
+        "archive": f"projects/{project_id:04d}_{name}.zip",
+        "path": archive,
+        "files": files,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+        "pid": os.getpid(),
+    }
+
+
+class BulkExporter:
+    """ 全作品（または指定した作品）をプロセスプールで並列に書き出し、1つの zip にまとめる
+
+    各ワーカーは読み込み専用の接続を自分で開き、ManuscriptExporter で1作品ずつ書き出して作品ごとの zip にする。
+    中身はプロセス間で受け渡さず、親プロセスは一時フォルダの zip を無圧縮で1つにまとめる。
+    """
+
+    def __init__(self, spec, max_workers=None):
+        # 保存先の read_only_spec()。ワーカーはこれを使って自分で保存先を開く
+        self.spec = spec
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def _projects(self, project_ids=None):
+        db = _open_spec(self.spec)
+        try:
+            projects = db.fetch_all_projects()
+        finally:
+            db.close()
+        if project_ids is not None:
+            wanted = set(project_ids)
+            projects = [p for p in projects if p[0] in wanted]
+        # 作品IDの順に並べて、毎回同じ順番の zip にする
+        return sorted(projects)
+
+    def _run(self, tasks):
+        """ 作品ごとの書き出しを実行する（ワーカーが1つなら、このプロセスでそのまま実行する） """
+        workers = min(self.max_workers, len(tasks))
+        if workers <= 1:
+            _init_worker(self.spec)
+            try:
+                return [_export_project(task) for task in tasks]
+            finally:
+                _worker_db.close()
+
+        # Streamlit や書き込みスレッドを抱えたまま fork しないよう、spawn で起動する
+        import multiprocessing
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(self.spec,)) as pool:
+            return list(pool.map(_export_project, tasks))
+
+    def export(self, out_path, formats=DEFAULT_FORMATS, project_ids=None):
+        """ zip を out_path に書き出し、マニフェスト（辞書）を返す """
+        import json
+
+        for file_format in formats:
+            if file_format not in EXPORT_FORMATS:
+                raise ValueError(f"不明な書き出し形式です: {file_format}")
+
+        start = time.perf_counter()
+        projects = self._projects(project_ids)
+        with tempfile.TemporaryDirectory(prefix="bulk_export_") as tmp_dir:
+            tasks = [(project_id, title, tuple(formats), tmp_dir) for project_id, title in projects]
+            results = self._run(tasks) if tasks else []
+
+            manifest = {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "storage": self.spec[0].__name__,
+                "formats": list(formats),
+                "workers": min(self.max_workers, len(tasks)),
+                "projects": [],
+            }
+            # 途中で失敗したときに壊れた zip を残さないよう、一時ファイルに書いてから置き換える
+            tmp_zip = f"{out_path}.tmp"
+            try:
+                with zipfile.ZipFile(tmp_zip, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+                    for result in results:
+                        zf.write(result.pop("path"), result["archive"])
+                        manifest["projects"].append(result)
+                    manifest["elapsed_ms"] = (time.perf_counter() - start) * 1000
+                    zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2),
+                                compress_type=zipfile.ZIP_DEFLATED)
+                os.replace(tmp_zip, out_path)
+            except BaseException:
+                if os.path.exists(tmp_zip):
+                    os.remove(tmp_zip)
+                raise
+        return manifest
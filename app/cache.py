@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """ 読み込み結果を世代番号つきで保持する LRU キャッシュ
+
+    書き込みのたびに関係するスコープ（例: ("blocks", project_id)）の世代を進める。
+    キャッシュした時点の世代と今の世代が違えば、そのエントリは読み直す。
+    """
+
+    # 特定の親が分からない書き込みで使う、全ての親をまとめて無効化するためのキー
+    ANY = "*"
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _stamp(self, scopes):
+        """ スコープごとの世代番号（と、その種類全体の世代番号）をまとめる """
+        stamp = []
+        for kind, parent_id in scopes:
+            stamp.append(self._generations.get((kind, parent_id), 0))
+            stamp.append(self._generations.get((kind, self.ANY), 0))
+        return tuple(stamp)
+
+    def get_or_load(self, key, scopes, loader):
+        """ キャッシュにあれば返し、なければ loader() で読み込んで保存する """
+        with self._lock:
+            stamp = self._stamp(scopes)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # 読み込み中に書き込みがあった場合は stamp が古くなり、次回読み直される
+        value = loader()
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def generation(self, scopes):
+        """ スコープの今の世代（どれかに書き込みがあると変わる値）を返す """
+        with self._lock:
+            return self._stamp(scopes)
+
+    def bump(self, kind, parent_id=ANY):
+        """ 書き込みがあったスコープの世代を進める（parent_id が不明なら種類全体） """
+        with self._lock:
+            key = (kind, parent_id)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,193 +1,622 @@
-import csv
-import io
+import itertools
+from functools import lru_cache
 
-from core.models import TextBlock, TodoBlock, CharacterBlock, WorldSettingBlock, StoryBlock
+from core.models import BlockView, block_from_row
 from core.database import DatabaseManager
-from datetime import datetime
+from core.storage import DuplicateTitle, VersionConflict
+from app.cache import QueryCache
+from app.autosave import AutoSaver
+from app.writer import WriteBehindQueue
+from app.preview import PreviewRenderer
+from app.export_cache import ExportCache
+
+# 設定・メモ一覧のタブ（見出し, 表示する block_type）と、1ページの件数
+BLOCK_TABS = [
+    ("📝 メモ・ToDo", ("text", "todo")),
+    ("👤 キャラクター", ("character",)),
+    ("🗺️ 世界観", ("world",)),
+    ("📌 プロット・構成", ("story",)),
+]
+BLOCK_PAGE_SIZE = 50
+
+@lru_cache(maxsize=None)
+def _load_style(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f"<style>{f.read()}</style>"
+    except FileNotFoundError:
+        return ""
+
+# 書き込みキューで、ほかの依頼とまとめない書き込みに付ける番号
+_write_ids = itertools.count(1)
+
+
+class EditSession:
+    """ 1つの画面（セッション）での話の編集。編集を始めたときの版を持つ
+
+    保存のたびに version を expected_version として渡し、成功したら新しい版に進める。
+    ほかの画面が先に保存していた場合は conflict に VersionConflict が入り、上書きはされない。
+    タイトルの重複などで保存できなかった場合は error に例外が入る（次に保存できたら None に戻る）。
+    """
+    __slots__ = ("episode_id", "version", "conflict", "error", "key", "_written")
+    _ids = itertools.count(1)
+
+    def __init__(self, episode_id, version):
+        self.episode_id = episode_id
+        self.version = version
+        self.conflict = None
+        self.error = None
+        # 自動保存・書き込みキューのキー。画面ごとに分け、別の画面の保存がまとめられないようにする
+        self.key = ("episode", episode_id, next(self._ids))
+        # 書き込んだがまだ commit していない版（commit 後に version に反映する）
+        self._written = None
+
 
 class NotionController:
-    def __init__(self):
-        # データベース操作クラスをインスタンス化（カプセル化）
-        self.db = DatabaseManager()
+    def __init__(self, db=None):
+        # 保存先（StorageBackend）。省略すると1ファイルの SQLite を使う
+        # 同じプロセスでは同じファイルの DatabaseManager を共有する（スキーマ確認も1回だけ）
+        self.db = db or DatabaseManager.shared()
+        # 読み込み結果のキャッシュ（書き込み時に世代番号を進めて無効化する）
+        self.cache = QueryCache()
+        # UI からの保存は書き込みスレッドでまとめて処理する（write-behind）
+        self.writer = WriteBehindQueue(self.db)
+        # 本文の自動保存（入力が止まってからまとめて書き込みキューに渡す）
+        self.autosaver = AutoSaver(self._queue_episode_write)
+        # プレビューの HTML（本文のハッシュごとに1回だけ作る）
+        self.previews = PreviewRenderer()
+        # 書き出したファイル（作品が変わるまで同じ形式は作り直さない）
+        self.exports = ExportCache()
+        # バックアップ（enable_backups で有効にする）
+        self.backups = None
+        self.backup_scheduler = None
 
     # --- 作品（プロジェクト）管理 ---
     def add_project(self, title):
         """ 新しい作品を作成する """
         if title.strip():
-            return self.db.save_project(title)
+            project_id = self.db.save_project(title)
+            self.cache.bump("projects")
+            return project_id
 
     def get_project(self):
         """ 全ての作品リストを取得する """
-        return self.db.fetch_all_projects()
+        return self.cache.get_or_load(
+            ("projects",), [("projects", QueryCache.ANY)], self.db.fetch_all_projects
+        )
     
     # --- ブロック追加（プロジェクトID指定）---
+    def _blocks_written(self, project_id):
+        # キャラ名・地名が変わると登場話の索引も変わる
+        self.cache.bump("blocks", project_id)
+        self.cache.bump("appearances")
+
+    def _save_block(self, block_type, content, project_id, **kwargs):
+        self.db.save_block(block_type, content, project_id=project_id, **kwargs)
+        self._blocks_written(project_id)
+
     def add_text_block(self, project_id, content):
         """ テキストブロックを作成して保存する """
         if content.strip():
-            self.db.save_block("text", content, project_id=project_id)
+            self._save_block("text", content, project_id)
 
     def add_todo_block(self, project_id, task, is_done=False):
         """ ToDoブロックを作成して保存する """
         if task.strip():
             # SQLiteに合わせてTrue/Falseを1/0に変換
             status = 1 if is_done else 0
-            self.db.save_block("todo", task, project_id=project_id, is_done=status)
+            self._save_block("todo", task, project_id, is_done=status)
 
     def add_character_block(self, project_id, name, role, content):
         if name.strip():
-            self.db.save_block("character", content, project_id=project_id, name=name, role=role)
+            self._save_block("character", content, project_id, name=name, role=role)
     
     def add_world_setting_block(self, project_id, location, content):
         if location.strip():
-            self.db.save_block("world", content, project_id=project_id, location=location)
+            self._save_block("world", content, project_id, location=location)
 
     def add_story_block(self, project_id, title, content):
         if title.strip():
             # block_type を "story" として保存。nameカラムにタイトル流用
-            self.db.save_block("story", content, project_id=project_id, name=title)
+            self._save_block("story", content, project_id, name=title)
+
+    def update_block(self, block_id, content, expected_version=None, **kwargs):
+        """ ブロックを更新して新しい版を返す（name, role, location などはキーワード引数で指定）
+
+        expected_version を渡すと、ほかの画面で先に更新されていた場合に VersionConflict を送出する。
+        """
+        project_id = self.db.fetch_parent_id("blocks", block_id)
+        try:
+            return self.db.update_block(block_id, content, expected_version, **kwargs)
+        finally:
+            # 衝突した場合も、最新の内容を読み直せるように世代を進める
+            self._blocks_written(project_id)
+
+    def update_block_async(self, block_id, content, expected_version=None, **kwargs):
+        """ ブロックの更新を書き込みキューに依頼し、WriteTicket を返す（衝突は ticket.wait() で送出される） """
+        project_id = self.db.fetch_parent_id("blocks", block_id)
+        # 版を指定した更新はほかの依頼とまとめない（別の画面の依頼に置き換えられると、衝突が検出されずに失われる）
+        key = ("block", block_id) if expected_version is None else ("block", block_id, next(_write_ids))
+        return self.writer.submit(
+            key, self._apply_block, block_id, content, expected_version, kwargs, project_id,
+            on_commit=lambda: self._blocks_written(project_id),
+        )
+
+    def _apply_block(self, block_id, content, expected_version, kwargs, project_id):
+        try:
+            self.db.update_block(block_id, content, expected_version, **kwargs)
+        except VersionConflict:
+            self._blocks_written(project_id)
+            raise
 
     def delete_block(self, block_id):
+        # キューに残っている更新が削除後に書き込まれないよう、先に書き込む
+        self.writer.flush()
+        project_id = self.db.fetch_parent_id("blocks", block_id)
         self.db.delete_block(block_id)
+        self._blocks_written(project_id)
 
     # --- 章の操作 ---
     def add_chapter(self, project_id, title):
         if title.strip():
-            existing = self.db.fetch_chapters_by_project(project_id)
-            if any(c[1] == title for c in existing):
+            # 重複チェックは UNIQUE 制約に任せる
+            if not self.db.save_chapter(project_id, title):
                 return False, "その章題は既に存在します。"
-            
-            self.db.save_chapter(project_id, title)
+            self.cache.bump("chapters", project_id)
             return True, "作成しました"
         return False, "章題を入力してください。"
 
     def get_chapters(self, project_id):
-        return self.db.fetch_chapters_by_project(project_id)
+        return self.cache.get_or_load(
+            ("chapters", project_id), [("chapters", project_id)],
+            lambda: self.db.fetch_chapters_by_project(project_id),
+        )
     
     def update_chapter_title(self, chapter_id, new_title):
         """ 章のタイトルのみを更新する """
         if new_title.strip():
-            return self.db.update_chapter_title(chapter_id, new_title)
+            project_id = self.db.fetch_parent_id("chapters", chapter_id)
+            success = self.db.update_chapter_title(chapter_id, new_title)
+            self.cache.bump("chapters", project_id)
+            return success
         return False
+
+    def move_chapter(self, chapter_id, after_id=None):
+        """ 章を after_id の章の直後（None なら先頭）に移動する """
+        project_id = self.db.fetch_parent_id("chapters", chapter_id)
+        moved = self.db.move_chapter(chapter_id, after_id)
+        self.cache.bump("chapters", project_id)
+        return moved
     
     # --- エピソード（Episode: 中項目・本文）の操作 ---
     def add_episode(self, chapter_id, title, content=""):
         if title.strip():
-            existing = self.db.fetch_episodes_by_chapter(chapter_id)
-            if any(e[1] == title for e in existing):
+            if not self.db.save_episode(chapter_id, title, content):
                 return False, "その話名は現在の章に既に存在します。"
-            
-            self.db.save_episode(chapter_id, title, content)
+            self._episodes_changed(chapter_id)
             return True, "エピソードを作成しました。"
         return False, "話名を入力してください。"
     
     def get_episodes(self, chapter_id):
-        return self.db.fetch_episodes_by_chapter(chapter_id)
+        return self.cache.get_or_load(
+            ("episodes", chapter_id), [("episodes", chapter_id)],
+            lambda: self.db.fetch_episodes_by_chapter(chapter_id),
+        )
     
-    def update_episode(self, episode_id, title, content):
-        success = self.db.update_episode(episode_id, title, content)
-        return success
+    def get_episode_list(self, chapter_id):
+        """ 話の一覧（本文なし）: (id, title, order_num, char_count, updated_at, line_count) """
+        return self.cache.get_or_load(
+            ("episode_list", chapter_id), [("episodes", chapter_id)],
+            lambda: self.db.fetch_episode_list(chapter_id),
+        )
+
+    def get_episode_body(self, episode_id, edit=None):
+        """ 選択された1話の本文だけを読み込む """
+        # まだ書き込まれていない保存があれば、その内容を返す
+        pending = self.writer.pending_args(self._episode_key(episode_id, edit))
+        if pending is not None:
+            return pending[2]
+        return self.cache.get_or_load(
+            ("episode_body", episode_id), [("episode", episode_id)],
+            lambda: self.db.fetch_episode_body(episode_id),
+        )
+
+    def open_episode(self, episode_id, previous=None):
+        """ 話の編集を始め、(本文, EditSession) を返す（話がなければ (None, None)）
+
+        previous（同じ画面の前の編集）に保存待ちがあれば、先に書き込んでから読み直す。
+        """
+        if previous is not None:
+            self.autosaver.flush(previous.key)
+            self.writer.flush()
+        row = self.db.fetch_episode_for_edit(episode_id)
+        if row is None:
+            return None, None
+        content, version = row
+        return content, EditSession(episode_id, version)
+
+    def close_edit(self, edit):
+        """ 編集をやめる（保存待ちの自動保存は捨てる） """
+        self.autosaver.discard(edit.key)
+
+    @staticmethod
+    def _episode_key(episode_id, edit):
+        return edit.key if edit is not None else ("episode", episode_id)
+
+    def update_episode(self, episode_id, title, content, edit=None, force=False):
+        """ 本文をすぐに保存して新しい版を返す（話がなければ False）
+
+        edit を渡すと、ほかの画面で先に保存されていた場合に VersionConflict を送出する。
+        force=True なら衝突していても上書きする。
+        """
+        key = self._episode_key(episode_id, edit)
+        # 手動保存が最新なので、保留中の自動保存は捨て、キューに残っている保存は先に書き込む
+        self.autosaver.discard(key)
+        if self.writer.pending_args(key) is not None:
+            self.writer.flush()
+        chapter_id = self.db.fetch_parent_id("episodes", episode_id)
+        expected = edit.version if edit is not None and not force else None
+        try:
+            version = self.db.update_episode(episode_id, title, content, expected_version=expected)
+        except VersionConflict as e:
+            edit.conflict = e
+            raise
+        except DuplicateTitle as e:
+            if edit is not None:
+                edit.error = e
+            raise
+        if version and edit is not None:
+            edit.version, edit.conflict, edit.error = version, None, None
+        self._episode_written(chapter_id, episode_id)
+        return version
+
+    def save_episode_async(self, episode_id, title, content, edit=None):
+        """ 本文の保存を書き込みキューに依頼し、完了を待てる WriteTicket を返す """
+        self.autosaver.discard(self._episode_key(episode_id, edit))
+        return self._queue_episode_write(episode_id, title, content, edit)
+
+    def _queue_episode_write(self, episode_id, title, content, edit=None):
+        # 章の検索も書き込みスレッドで行う（自動保存スレッドや画面のスレッドで接続を開かない）
+        return self.writer.submit(
+            self._episode_key(episode_id, edit), self._apply_episode, episode_id, title, content, edit,
+            on_commit=lambda: self._episode_written(self.db.fetch_parent_id("episodes", episode_id), episode_id, edit),
+        )
+
+    def _apply_episode(self, episode_id, title, content, edit=None):
+        """ 書き込みスレッドで実行される本文の更新 """
+        expected = edit.version if edit is not None else None
+        try:
+            version = self.db.update_episode(episode_id, title, content, expected_version=expected)
+        except VersionConflict as e:
+            edit.conflict = e
+            raise
+        except DuplicateTitle as e:
+            # 自動保存の失敗も画面に知らせられるように残す
+            if edit is not None:
+                edit.error = e
+            raise
+        if not version:
+            raise RuntimeError("話の保存に失敗しました。")
+        if edit is not None:
+            # まとめて書いたトランザクションが巻き戻ることがあるので、版は commit 後に進める
+            edit._written = version
+
+    def _episode_written(self, chapter_id, episode_id, edit=None):
+        if edit is not None:
+            edit.version, edit.conflict, edit.error = edit._written, None, None
+        # commit 後に世代を進める（commit 前だと古い内容が新しい世代でキャッシュされうる）
+        self._episodes_changed(chapter_id, episode_id)
+
+    def _episodes_changed(self, chapter_id, episode_id=None):
+        """ 話の追加・更新・削除で変わるスコープの世代を進める """
+        self.cache.bump("episodes", chapter_id)
+        if episode_id is not None:
+            self.cache.bump("episode", episode_id)
+        self.cache.bump("stats")
+        self.cache.bump("appearances")
+        # 作品の書き出し（ExportCache）の世代
+        self.cache.bump("manuscript", self.db.fetch_parent_id("chapters", chapter_id))
     
-    def delete_episode(self, episode_id):
+    def delete_episode(self, episode_id, edit=None):
+        self.autosaver.discard(self._episode_key(episode_id, edit))
+        self.writer.flush()
+        chapter_id = self.db.fetch_parent_id("episodes", episode_id)
         self.db.delete_episode(episode_id)
+        self._episodes_changed(chapter_id, episode_id)
     
+    def move_episode(self, episode_id, after_id=None):
+        """ 話を同じ章の after_id の話の直後（None なら先頭）に移動する """
+        chapter_id = self.db.fetch_parent_id("episodes", episode_id)
+        moved = self.db.move_episode(episode_id, after_id)
+        self.cache.bump("episodes", chapter_id)
+        self.cache.bump("manuscript", self.db.fetch_parent_id("chapters", chapter_id))
+        return moved
+
+    # --- 自動保存と変更履歴 ---
+    def autosave_episode(self, episode_id, title, content, edit=None):
+        """ 自動保存を依頼する（連続した依頼はまとめて1回だけ書き込む）
+
+        ほかの画面との衝突が解決されるまでは、上書きしないように自動保存しない。
+        """
+        if title.strip() and (edit is None or edit.conflict is None):
+            self.autosaver.submit(self._episode_key(episode_id, edit), episode_id, title, content, edit)
+
+    def flush_autosave(self, episode_id=None, edit=None):
+        """ 保留中の自動保存を今すぐ書き込みキューに渡す（省略すると全て） """
+        if episode_id is None:
+            return self.autosaver.flush()
+        return self.autosaver.flush(self._episode_key(episode_id, edit))
+
+    def flush_writes(self, timeout=None):
+        """ 自動保存と書き込みキューに残っている保存を全て commit するまで待つ """
+        self.autosaver.flush()
+        return self.writer.flush(timeout)
+
+    def close(self):
+        """ 残りの保存を書き込んでから終了する """
+        self.flush_writes()
+        self.autosaver.shutdown()
+        self.writer.shutdown()
+        if self.backup_scheduler is not None:
+            self.backup_scheduler.stop()
+        self.exports.close()
+        self.db.close()
+
+    def get_revisions(self, episode_id):
+        """ 話の変更履歴 (rev_no, char_count, created_at) を新しい順に返す """
+        return self.cache.get_or_load(
+            ("revisions", episode_id), [("episode", episode_id)],
+            lambda: self.db.fetch_revisions(episode_id),
+        )
+
+    def get_revision_text(self, episode_id, rev_no):
+        """ 過去の版の本文（キーフレームと差分から組み立てたもの）。履歴を開いたままの再実行では組み立て直さない """
+        return self.cache.get_or_load(
+            ("revision_text", episode_id, rev_no), [("episode", episode_id)],
+            lambda: self.db.fetch_revision_text(episode_id, rev_no),
+        )
+
+    def restore_revision(self, episode_id, title, rev_no):
+        """ 過去の版の本文に戻す（戻した内容も新しい版として履歴に残る） """
+        content = self.get_revision_text(episode_id, rev_no)
+        if content is None:
+            return False
+        return self.update_episode(episode_id, title, content)
+
+    # --- 登場話 ---
+    def get_appearances(self, block_id):
+        """ キャラ・世界観ブロックが登場する話 (episode_id, 章題, 話名, 出現回数, 最初の位置) の一覧 """
+        return self.cache.get_or_load(
+            ("appearances", block_id), [("appearances", QueryCache.ANY)],
+            lambda: self.db.fetch_appearances(block_id),
+        )
+
+    # --- 統計 ---
+    # 話の保存のたびに ("stats", ANY) の世代を進める（集計テーブルを読むだけなので読み直しは軽い）
+    def get_project_stats(self, project_id):
+        """ 作品の集計 (章数, 話数, 文字数, 行数) """
+        return self.cache.get_or_load(
+            ("project_stats", project_id), [("stats", project_id), ("chapters", project_id)],
+            lambda: self.db.fetch_project_stats(project_id),
+        )
+
+    def get_chapter_stats(self, project_id):
+        """ 章ごとの集計 (chapter_id, title, 話数, 文字数, 行数) """
+        return self.cache.get_or_load(
+            ("chapter_stats", project_id), [("stats", project_id), ("chapters", project_id)],
+            lambda: self.db.fetch_chapter_stats(project_id),
+        )
+
+    def get_daily_stats(self, project_id, days=30):
+        """ 直近 days 日の執筆量 (日付, 増えた文字数, 減った文字数) """
+        return self.cache.get_or_load(
+            ("daily_stats", project_id, days), [("stats", project_id)],
+            lambda: self.db.fetch_daily_stats(project_id, days),
+        )
+
+    def rebuild_statistics(self, backfill_daily=False):
+        """ 全ての本文から集計を作り直す """
+        self.flush_writes()
+        self.db.rebuild_statistics(backfill_daily=backfill_daily)
+        self.cache.bump("stats")
+        self.cache.bump("episodes")
+
+    # --- プレビュー ---
+    def get_preview(self, content):
+        """ 本文のプレビュー（RenderedPreview）を返す。ページの HTML は表示するときに作られる """
+        return self.previews.get(content)
+
+    # --- 検索 ---
+    def search(self, project_id, query, limit=50):
+        """ 作品内の本文・設定を全文検索する """
+        if not query.strip():
+            return []
+        return self.db.search(project_id, query.strip(), limit=limit)
+
     # --- 静的ファイルの読み込み ---
     def get_style(self):
-        """ static/style.css を読み込んでいます """
-        try:
-            with open("static/style.css", "r", encoding="utf-8") as f:
-                return f"<style>{f.read()}</style>"
-        except FileNotFoundError:
-            return ""
+        """ static/style.css を読み込んでいます（プロセスで1回だけ読む） """
+        return _load_style("static/style.css")
 
     # --- データ取得 ---
+    def get_block_view(self, project_id):
+        """ 指定された作品のブロックを列指向の一覧（BlockView）で取得する（キャッシュあり） """
+        return self.cache.get_or_load(
+            ("block_view", project_id), [("blocks", project_id)],
+            lambda: BlockView(self.db.fetch_blocks_by_project(project_id)),
+        )
+
+    def get_block_page(self, project_id, block_types, after_id=None, limit=50):
+        """ 種類を絞ったブロックの1ページ分を (ブロックの一覧, 次のページの after_id) で返す（キャッシュあり）
+
+        次のページがなければ after_id は None。ページの境目は ID で決める（keyset）ので、
+        前のページでブロックが追加・削除されても表示がずれない。
+        """
+        block_types = tuple(block_types)
+        return self.cache.get_or_load(
+            ("block_page", project_id, block_types, after_id, limit), [("blocks", project_id)],
+            lambda: self._load_block_page(project_id, block_types, after_id, limit),
+        )
+
+    def _load_block_page(self, project_id, block_types, after_id, limit):
+        # 1件多く読んで、次のページがあるかを確かめる
+        rows = self.db.fetch_blocks_page(project_id, block_types, after_id, limit + 1)
+        blocks = [b for b in (block_from_row(*row) for row in rows[:limit]) if b is not None]
+        return blocks, (rows[limit - 1][0] if len(rows) > limit else None)
+
+    def count_blocks(self, project_id, block_types):
+        """ 指定した種類のブロックの件数（キャッシュあり） """
+        block_types = tuple(block_types)
+        return self.cache.get_or_load(
+            ("block_count", project_id, block_types), [("blocks", project_id)],
+            lambda: self.db.count_blocks(project_id, block_types),
+        )
+
     def get_blocks_by_project(self, project_id):
-        """ 指定された作品のデータを取得し、適切なクラスに変換する """
-        raw_data = self.db.fetch_blocks_by_project(project_id)
-        blocks = []
-
-        for b_id, b_type, content, is_done, name, role, loc in raw_data:
-            block = None
-            if b_type == "text":
-                block = TextBlock(content)
-            elif b_type == "todo":
-                block = TodoBlock(content, bool(is_done))
-            elif b_type == "character":
-                block = CharacterBlock(name, role, content)
-            elif b_type == "world":
-                block = WorldSettingBlock(loc, content)
-            elif b_type == "story":
-                block = StoryBlock(name, content)
-            
-            if block:
-                block.id = b_id
-                blocks.append(block)
-        
-        return blocks
+        """ 指定された作品のデータを取得し、適切なクラスに変換する（キャッシュあり） """
+        return self.cache.get_or_load(
+            ("blocks", project_id), [("blocks", project_id)],
+            lambda: self._load_blocks(project_id),
+        )
+
+    def _load_blocks(self, project_id):
+        view = self.get_block_view(project_id)
+        # block_type → クラスの対応表で変換する（未登録の種類は読み飛ばす）
+        blocks = (view.block(i) for i in view.indices())
+        return [b for b in blocks if b is not None]
 
     # --- エクスポート関連 ---    
+    def _exporter(self):
+        # 書き出し処理は使うときだけ読み込む
+        from app.exporter import ManuscriptExporter
+        return ManuscriptExporter(self.db)
+
+    def _export_key(self, project_id, project_title, file_format):
+        # 設定・章・話のどれかが変わると世代が進み、別のキーになる
+        generation = self.cache.generation(
+            [("blocks", project_id), ("chapters", project_id), ("manuscript", project_id)]
+        )
+        return project_id, project_title, file_format, generation
+
     def get_export_data(self, project_id, project_title, file_format):
-        """ 選択中の作品データを指定形式で返す """
-        blocks = self.get_blocks_by_project(project_id)
-
-        if file_format == "Text (.txt)":
-            return self._format_as_txt(blocks, project_title), "text/plain", "txt"
-        elif file_format == "CSV (.csv)":
-            return self._format_as_csv(blocks), "text/csv", "csv"
-        return None, None, None
-    
-    def _format_as_txt(self, blocks, project_title):
-        if not blocks: return "データがありません。"
-        output = f"--- Export: {project_title} ---\n"
-        output += f"日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        for block in blocks:
-            output += block.render() + "\n"
-            output += "-" * 20 + "\n"
-        return output
-
-    def _format_as_csv(self, blocks):
-        if not blocks: 
-            return ""
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["タイプ", "内容", "完了/名前", "役割/場所"])
-        for b in blocks:
-            b_type = b.__class__.__name__
-            # クラスによってCSVに入れる値を変える
-            val1, val2 = "", ""
-            if isinstance(b, TodoBlock):
-                val1 = "完了" if b.is_done else "未完了"
-            elif isinstance(b, CharacterBlock): val1, val2 = b.name, b.role
-            elif isinstance(b, WorldSettingBlock): val1 = b.location
-            
-            writer.writerow([b_type, b.content, val1, val2])
-        return output.getvalue()
-    
-    def import_from_csv(self, project_id, uploaded_file):
-        """ CSVファイルを読み込んでDBに保存する """
-        # ファイルをテキストモードで読み込む
-        stringio = io.StringIO(uploaded_file.getvalue().decode("utf-8-sig"))
-        reader = csv.reader(stringio)
-
-        # ヘッダー（1行目）を飛ばす
-        next(reader, None)
-
-        for row in reader:
-            # CSVの列構成:　[タイプ, 内容, 完了/名前, 役割/場所]
-            if len(row) < 2: continue
-
-            b_type = row[0]
-            content = row[1]
-            val1 = row[2] if len(row) > 2 else ""
-            val2 = row[3] if len(row) > 3 else ""
-
-            # タイプに応じて保存
-            if b_type == "TextBlock":
-                self.add_text_block(project_id, content)
-            elif b_type == "TodoBlock":
-                is_done = (val1 == "完了")
-                self.add_todo_block(project_id, content, is_done)
-            elif b_type == "CharacterBlock":
-                self.add_character_block(project_id, val1, val2, content)
-            elif b_type == "WorldSettingBlock":
-                self.add_world_setting_block(project_id, val1, content)
+        """ 作品全体（設定・章・話）を指定形式で書き出し、(ファイルオブジェクト, MIME, 拡張子) を返す
+
+        中身は一時ファイルに少しずつ書き出すので、長編でも全文をメモリに溜めない。使い終わったら close すること。
+        前回の書き出しから作品が変わっていなければ、作ったファイルをそのまま開いて返す。
+        """
+        from app.exporter import EXPORT_FORMATS
+
+        if file_format not in EXPORT_FORMATS:
+            return None, None, None
+        # 保存待ちの本文も書き出しに含める
+        self.flush_writes()
+        ext, mime = EXPORT_FORMATS[file_format]
+        data = self.exports.get_or_build(
+            self._export_key(project_id, project_title, file_format),
+            lambda path: self._exporter().export_to_path(project_id, project_title, file_format, path),
+        )
+        return data, mime, ext
+
+    def get_cached_export(self, project_id, project_title, file_format):
+        """ 今の内容の書き出しが作成済みなら get_export_data と同じ形で返す（なければ None。作成はしない） """
+        from app.exporter import EXPORT_FORMATS
+
+        # 保存待ちがある間は、作成済みのファイルが最新とは限らない
+        if file_format not in EXPORT_FORMATS or self.autosaver.has_pending() or self.writer.has_pending():
+            return None
+        data = self.exports.open(self._export_key(project_id, project_title, file_format))
+        if data is None:
+            return None
+        ext, mime = EXPORT_FORMATS[file_format]
+        return data, mime, ext
+
+    def export_to_file(self, project_id, project_title, file_format, path):
+        """ 作品全体を指定形式でファイルに書き出す """
+        self.flush_writes()
+        self._exporter().export_to_path(project_id, project_title, file_format, path)
+
+    def iter_export_bytes(self, project_id, project_title, file_format, chunk_size=64 * 1024):
+        """ 作品全体を指定形式で書き出し、chunk_size バイトずつ返す """
+        self.flush_writes()
+        return self._exporter().iter_bytes(project_id, project_title, file_format, chunk_size)
+
+    def export_all_projects(self, out_path, formats=None, max_workers=None):
+        """ 全作品を並列に書き出して1つの zip にまとめ、マニフェストを返す（夜間のスナップショット用） """
+        from app.bulk_export import DEFAULT_FORMATS, BulkExporter
+
+        # メモリ上の保存先は別プロセスから読めないので ValueError になる
+        spec = self.db.read_only_spec()
+        # ワーカーは別の接続で読むので、保存待ちの内容を先に commit しておく
+        self.flush_writes()
+        return BulkExporter(spec, max_workers).export(out_path, formats or DEFAULT_FORMATS)
+
+    def export_snapshot(self, project_id, directory, fmt="parquet", compression="default"):
+        """ 作品を列指向のスナップショット（Parquet / Arrow）に書き出し、マニフェストを返す """
+        from app.snapshot import ProjectSnapshot
+
+        self.flush_writes()
+        return ProjectSnapshot(self.db).export(project_id, directory, fmt, compression)
+
+    def import_snapshot(self, directory, title=None):
+        """ スナップショットを新しい作品として読み込み、作品IDを返す """
+        from app.snapshot import ProjectSnapshot
+
+        project_id = ProjectSnapshot(self.db).load(directory, title)
+        self.cache.bump("projects")
+        self._blocks_written(project_id)
+        self.cache.bump("chapters", project_id)
+        self.cache.bump("stats")
+        return project_id
+
+    # --- バックアップ ---
+    def enable_backups(self, directory="data/backups", interval=None, keep=None, max_age_days=None):
+        """ バックアップを有効にする。interval（秒）を指定すると、その間隔で自動的にバックアップを取る """
+        from app.backup import DEFAULT_KEEP, BackupManager, BackupScheduler
+
+        self.backups = BackupManager(self.db, directory, keep=keep or DEFAULT_KEEP, max_age_days=max_age_days)
+        if interval:
+            self.backup_scheduler = BackupScheduler(self.create_backup, interval).start()
+        return self.backups
+
+    def create_backup(self, label=None):
+        """ 保存待ちの内容を書き込んでからバックアップを取り、マニフェストを返す """
+        self.flush_writes()
+        return self.backups.create(label)
+
+    def list_backups(self):
+        return self.backups.list()
+
+    def restore_backup(self, snapshot_id):
+        """ 保存先全体をバックアップの時点に戻す """
+        self.flush_writes()
+        manifest = self.backups.restore(snapshot_id)
+        # 全ての読み込み結果と書き出しが古くなる
+        self.cache.clear()
+        for kind in ("projects", "blocks", "chapters", "episodes", "episode", "stats", "appearances", "manuscript"):
+            self.cache.bump(kind)
+        self.exports.clear()
+        return manifest
+
+    def restore_project_backup(self, snapshot_id, project_id, title=None):
+        """ バックアップの1つの作品を、新しい作品として読み込んで作品IDを返す """
+        new_id = self.backups.restore_project(snapshot_id, project_id, title)
+        self.cache.bump("projects")
+        self._blocks_written(new_id)
+        self.cache.bump("chapters", new_id)
+        self.cache.bump("stats")
+        return new_id
+
+    def import_from_csv(self, project_id, uploaded_file, on_progress=None):
+        """ CSVファイルを読み込んでDBに保存する（1トランザクションでまとめて書き込む） """
+        # CSVの列構成:　[タイプ, 内容, 完了/名前, 役割/場所]
+        # 章は [Chapter, , 章名, ]、話は [Episode, 本文, 話名, 章名] として読み込む
+        from app.importer import CsvImporter
+
+        try:
+            return CsvImporter(self.db).run(project_id, uploaded_file, on_progress=on_progress)
+        finally:
+            self._blocks_written(project_id)
+            self.cache.bump("chapters", project_id)
+            self.cache.bump("episodes")
+            self.cache.bump("stats")
+            self.cache.bump("manuscript", project_id)
@@ -0,0 +1,60 @@
+import streamlit as st
+
+from core.profiling import HISTOGRAM_BOUNDS_MS, Profiler
+
+
+def _histogram_labels():
+    labels = [f"<{b}ms" for b in HISTOGRAM_BOUNDS_MS]
+    return labels + [f">={HISTOGRAM_BOUNDS_MS[-1]}ms"]
+
+
+def render_debug_panel():
+    """ サイドバーにこのセッションのクエリと描画フェーズの計測結果を表示する（オプトイン） """
+    st.sidebar.markdown("---")
+    st.sidebar.toggle("🛠 デバッグパネル", key="debug_panel", help="有効にすると次の再実行から、この画面の分だけ計測します")
+    if not st.session_state.get("debug_panel"):
+        # 無効にしたら計測結果も捨てる
+        st.session_state.pop("debug_profiler", None)
+        return
+
+    profiler = st.session_state.setdefault("debug_profiler", Profiler())
+    st.sidebar.checkbox("cProfile で再実行全体を計測する", key="debug_cprofile")
+    report = profiler.report()
+
+    with st.sidebar.expander("⏱ 直近の再実行（フェーズ別）", expanded=True):
+        if report["last_run_ms"]:
+            st.table({name: f"{ms:.1f} ms" for name, ms in report["last_run_ms"].items()})
+        else:
+            st.caption("次の再実行から計測されます。")
+
+    with st.sidebar.expander("🗄 クエリ（合計時間の多い順）"):
+        for q in report["queries"][:20]:
+            st.markdown(
+                f"**{q['total_ms']:.1f} ms** / {q['count']}回 / 平均 {q['mean_ms']:.2f} ms / {q['rows']}行"
+            )
+            st.code(q["sql"][:300], language="sql")
+
+    with st.sidebar.expander("📊 ヒストグラム"):
+        labels = _histogram_labels()
+        for name, stat in report["phases"].items():
+            st.caption(f"フェーズ: {name}")
+            st.bar_chart({"区間": labels, "件数": stat["histogram"]}, x="区間", y="件数")
+        for q in report["queries"][:5]:
+            st.caption(q["sql"][:80])
+            st.bar_chart({"区間": labels, "件数": q["histogram"]}, x="区間", y="件数")
+
+    st.sidebar.download_button(
+        "計測結果を JSON で保存", data=profiler.to_json(), file_name="profile.json", mime="application/json"
+    )
+    st.sidebar.download_button(
+        "計測結果を pstats 形式で保存", data=profiler.to_pstats(), file_name="queries.prof",
+        mime="application/octet-stream", help="python -m pstats queries.prof で読めます",
+    )
+    dump = st.session_state.get("debug_cprofile_dump")
+    if dump:
+        st.sidebar.download_button(
+            "cProfile の結果を保存", data=dump, file_name="rerun.prof", mime="application/octet-stream"
+        )
+    if st.sidebar.button("計測結果をリセット"):
+        profiler.reset()
+        st.session_state.pop("debug_cprofile_dump", None)
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class ExportCache:
+    """ 書き出したファイルを (作品, 形式, 作品の変更世代) ごとに保持する LRU キャッシュ
+
+    作品が変わらない限り、同じ形式の書き出しは1回だけ作り、以降はそのファイルを開いて返す。
+    ファイルは一時フォルダに置き、max_entries を超えたら古いものから削除する。
+    """
+
+    def __init__(self, max_entries=8, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory or tempfile.mkdtemp(prefix="notion_exports_")
+        os.makedirs(self.directory, exist_ok=True)
+        self._paths = OrderedDict()
+        self._lock = threading.Lock()
+        # キーごとの作成中ロック（同じ書き出しを複数のセッションが同時に作らないように）
+        self._building = {}
+        self._counter = 0
+
+    def open(self, key):
+        """ 作成済みならファイルを開いて返す（なければ None） """
+        with self._lock:
+            path = self._paths.get(key)
+            if path is None:
+                return None
+            self._paths.move_to_end(key)
+            # 読み込み中に削除されても、開いたファイルは POSIX では読み続けられる
+            return open(path, "rb", buffering=0)
+
+    def get_or_build(self, key, build):
+        """ キャッシュにあれば開いて返し、なければ build(path) で作ってから開いて返す """
+        f = self.open(key)
+        if f is not None:
+            return f
+        with self._lock:
+            lock = self._building.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                f = self.open(key)
+                if f is not None:
+                    return f
+                with self._lock:
+                    self._counter += 1
+                    path = os.path.join(self.directory, f"export_{self._counter}")
+                try:
+                    build(path)
+                except BaseException:
+                    self._remove(path)
+                    raise
+                with self._lock:
+                    self._paths[key] = path
+                    evicted = []
+                    while len(self._paths) > self.max_entries:
+                        evicted.append(self._paths.popitem(last=False)[1])
+                    f = open(path, "rb", buffering=0)
+            finally:
+                # 作成に失敗した場合も外す（次の依頼で作り直せるように）
+                with self._lock:
+                    self._building.pop(key, None)
+        for old in evicted:
+            self._remove(old)
+        return f
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            # 開いているファイルを削除できない環境（Windows）では残しておき、close() で消す
+            pass
+
+    def clear(self):
+        with self._lock:
+            paths, self._paths = list(self._paths.values()), OrderedDict()
+        for path in paths:
+            self._remove(path)
+
+    def close(self):
+        """ 一時フォルダごと削除する """
+        self.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
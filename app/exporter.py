@@ -0,0 +1,246 @@
+import csv
+import html
+import io
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime, timezone
+
+from core.models import iter_flyweights
+
+# 表示名 → (拡張子, MIMEタイプ)
+EXPORT_FORMATS = {
+    "Text (.txt)": ("txt", "text/plain"),
+    "CSV (.csv)": ("csv", "text/csv"),
+    "Markdown (.md)": ("md", "text/markdown"),
+    "EPUB (.epub)": ("epub", "application/epub+zip"),
+}
+
+# ファイルへの書き込み・iter_bytes で返すまとまりの大きさ
+CHUNK_SIZE = 64 * 1024
+
+
+class ManuscriptExporter:
+    """ 作品全体（設定ブロック → 章 → 話）を1件ずつ読み出しながら書き出す
+
+    話の本文は1つのクエリで少しずつ読み込むので、長編でも全文をメモリに載せない。
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    # --- 作品の読み出し ---
+    def iter_blocks(self, project_id):
+        return iter_flyweights(self.db.iter_blocks_by_project(project_id))
+
+    def iter_episodes(self, project_id):
+        """ (章ID, 章題, 話ID, 話名, 本文) を章・話の順番どおりに1話ずつ返す（話のない章は話の列が None） """
+        return self.db.iter_episodes_by_project(project_id)
+
+    # --- テキスト形式（文字列の断片を返すジェネレータ） ---
+    def iter_txt(self, project_id, project_title):
+        yield f"--- Export: {project_title} ---\n"
+        yield f"日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        yield "■ 設定・メモ\n\n"
+        for block in self.iter_blocks(project_id):
+            yield block.render() + "\n"
+            yield "-" * 20 + "\n"
+        current_ch = None
+        for ch_id, ch_title, ep_id, ep_title, body in self.iter_episodes(project_id):
+            if ch_id != current_ch:
+                current_ch = ch_id
+                yield f"\n\n■ {ch_title}\n"
+            if ep_id is not None:
+                yield f"\n◆ {ep_title}\n\n"
+                yield body
+                yield "\n"
+
+    def iter_markdown(self, project_id, project_title):
+        yield f"# {project_title}\n\n"
+        yield "## 設定・メモ\n\n"
+        for block in self.iter_blocks(project_id):
+            yield block.render() + "\n\n---\n\n"
+        current_ch = None
+        for ch_id, ch_title, ep_id, ep_title, body in self.iter_episodes(project_id):
+            if ch_id != current_ch:
+                current_ch = ch_id
+                yield f"## {ch_title}\n\n"
+            if ep_id is not None:
+                yield f"### {ep_title}\n\n"
+                # Markdown では改行1つは段落にならないので、行末に半角スペース2つを付ける
+                yield body.replace("\n", "  \n")
+                yield "\n\n"
+
+    def iter_csv(self, project_id):
+        """ インポートと同じ列構成で書き出す（章・話の行も含む） """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def row(values):
+            writer.writerow(values)
+            text = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return text
+
+        yield row(["タイプ", "内容", "完了/名前", "役割/場所"])
+        for b in self.iter_blocks(project_id):
+            val1, val2 = b.export_values()
+            yield row([b.__class__.__name__, b.content, val1, val2])
+        current_ch = None
+        for ch_id, ch_title, ep_id, ep_title, body in self.iter_episodes(project_id):
+            if ch_id != current_ch:
+                current_ch = ch_id
+                yield row(["Chapter", "", ch_title, ""])
+            if ep_id is not None:
+                yield row(["Episode", body, ep_title, ch_title])
+
+    # --- EPUB ---
+    def write_epub(self, project_id, project_title, fileobj):
+        """ EPUB（zip）を fileobj に書き込む。章ごとに1つの XHTML を少しずつ書く """
+        chapters = []
+        with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            # mimetype は無圧縮で先頭に置く決まり
+            zf.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+            zf.writestr("META-INF/container.xml", _CONTAINER_XML)
+
+            with zf.open("OEBPS/settings.xhtml", "w") as f:
+                f.write(_xhtml_head("設定・メモ").encode("utf-8"))
+                f.write("<h1>設定・メモ</h1>\n".encode("utf-8"))
+                for block in self.iter_blocks(project_id):
+                    _write_paragraphs(f, block.render())
+                    f.write(b"<hr/>\n")
+                f.write(_XHTML_TAIL.encode("utf-8"))
+
+            current_ch, f = None, None
+            for ch_id, ch_title, ep_id, ep_title, body in self.iter_episodes(project_id):
+                if ch_id != current_ch:
+                    if f:
+                        f.write(_XHTML_TAIL.encode("utf-8"))
+                        f.close()
+                    current_ch = ch_id
+                    name = f"chapter{len(chapters) + 1}.xhtml"
+                    chapters.append((name, ch_title))
+                    f = zf.open(f"OEBPS/{name}", "w", force_zip64=True)
+                    f.write(_xhtml_head(ch_title).encode("utf-8"))
+                    f.write(f"<h1>{html.escape(ch_title)}</h1>\n".encode("utf-8"))
+                if ep_id is not None:
+                    f.write(f"<h2>{html.escape(ep_title)}</h2>\n".encode("utf-8"))
+                    _write_paragraphs(f, body)
+            if f:
+                f.write(_XHTML_TAIL.encode("utf-8"))
+                f.close()
+
+            zf.writestr("OEBPS/content.opf", _content_opf(project_title, chapters))
+            zf.writestr("OEBPS/nav.xhtml", _nav_xhtml(chapters))
+
+    # --- 出力先 ---
+    def write(self, project_id, project_title, file_format, fileobj):
+        """ 指定形式で fileobj（バイナリ）に書き出す """
+        ext, _ = EXPORT_FORMATS[file_format]
+        if ext == "epub":
+            self.write_epub(project_id, project_title, fileobj)
+            return
+        if ext == "csv":
+            # Excel で文字化けしないよう BOM を付ける
+            fileobj.write("\ufeff".encode("utf-8"))
+            chunks = self.iter_csv(project_id)
+        elif ext == "md":
+            chunks = self.iter_markdown(project_id, project_title)
+        else:
+            chunks = self.iter_txt(project_id, project_title)
+        for chunk in chunks:
+            fileobj.write(chunk.encode("utf-8"))
+
+    def export_to_path(self, project_id, project_title, file_format, path):
+        with open(path, "wb") as f:
+            self.write(project_id, project_title, file_format, f)
+
+    def open_export(self, project_id, project_title, file_format):
+        """ 一時ファイルに書き出し、先頭に戻したファイルオブジェクトを返す（閉じると削除される） """
+        # download_button がそのまま読めるよう、バッファなしのファイル（io.FileIO）を返す
+        raw = tempfile.TemporaryFile(buffering=0)
+        buffered = io.BufferedWriter(raw, buffer_size=CHUNK_SIZE)
+        try:
+            self.write(project_id, project_title, file_format, buffered)
+            buffered.flush()
+        except Exception:
+            buffered.close()
+            raise
+        buffered.detach()
+        raw.seek(0)
+        return raw
+
+    def iter_bytes(self, project_id, project_title, file_format, chunk_size=CHUNK_SIZE):
+        """ 書き出した内容を chunk_size バイトずつ返す """
+        with self.open_export(project_id, project_title, file_format) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+# --- EPUB の部品 ---
+_CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+_XHTML_TAIL = "</body>\n</html>\n"
+
+
+def _xhtml_head(title):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="ja" lang="ja">\n'
+        f"<head><meta charset=\"UTF-8\"/><title>{html.escape(title)}</title></head>\n<body>\n"
+    )
+
+
+def _write_paragraphs(f, text):
+    """ 1行を1段落として XHTML を書き込む（空行は空の段落） """
+    for line in text.splitlines():
+        f.write(f"<p>{html.escape(line) or '<br/>'}</p>\n".encode("utf-8"))
+
+
+def _content_opf(title, chapters):
+    items = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+             '<item id="settings" href="settings.xhtml" media-type="application/xhtml+xml"/>']
+    spine = ['<itemref idref="settings"/>']
+    for i, (name, _) in enumerate(chapters, 1):
+        items.append(f'<item id="ch{i}" href="{name}" media-type="application/xhtml+xml"/>')
+        spine.append(f'<itemref idref="ch{i}"/>')
+    modified = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="bookid" xml:lang="ja">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="bookid">urn:uuid:{uuid.uuid4()}</dc:identifier>
+    <dc:title>{html.escape(title)}</dc:title>
+    <dc:language>ja</dc:language>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    {chr(10).join(items)}
+  </manifest>
+  <spine page-progression-direction="rtl">
+    {chr(10).join(spine)}
+  </spine>
+</package>
+"""
+
+
+def _nav_xhtml(chapters):
+    links = "\n".join(f'<li><a href="{name}">{html.escape(title)}</a></li>' for name, title in chapters)
+    return (
+        _xhtml_head("目次")
+        + '<nav epub:type="toc" xmlns:epub="http://www.idpf.org/2007/ops">\n<h1>目次</h1>\n<ol>\n'
+        + '<li><a href="settings.xhtml">設定・メモ</a></li>\n'
+        + links
+        + "\n</ol>\n</nav>\n"
+        + _XHTML_TAIL
+    )
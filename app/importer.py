@@ -0,0 +1,131 @@
+import csv
+import io
+
+# 1回の executemany でまとめて書き込む行数
+CHUNK_SIZE = 1000
+# 1話の本文は1つのセルに入るので、csv の既定の上限（131072文字）では長い話を読めない
+MAX_FIELD_SIZE = 16 * 1024 * 1024
+csv.field_size_limit(max(csv.field_size_limit(), MAX_FIELD_SIZE))
+
+
+class ImportResult:
+    """ インポートの進捗と結果 """
+
+    def __init__(self):
+        self.rows_read = 0
+        self.blocks = 0
+        self.chapters = 0
+        self.episodes = 0
+        self.skipped = 0
+
+    @property
+    def imported(self):
+        return self.blocks + self.chapters + self.episodes
+
+
+class CsvImporter:
+    """ CSVを少しずつ読み込み、チャンク単位で1つのトランザクションに書き込む """
+
+    def __init__(self, db, chunk_size=CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    def run(self, project_id, uploaded_file, on_progress=None):
+        """ CSVを取り込む。途中でエラーが起きた場合は全てロールバックされる """
+        result = ImportResult()
+        total_size = getattr(uploaded_file, "size", None)
+
+        uploaded_file.seek(0)
+        # ファイル全体を decode せず、TextIOWrapper で少しずつ読む
+        stream = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+        try:
+            reader = csv.reader(stream)
+            # ヘッダー（1行目）を飛ばす
+            next(reader, None)
+
+            with self.db.transaction(project_id) as conn:
+                chapter_ids = self.db.fetch_chapter_ids(conn, project_id)
+                chunk = []
+                for row in reader:
+                    result.rows_read += 1
+                    chunk.append(row)
+                    if len(chunk) >= self.chunk_size:
+                        self._write_chunk(conn, project_id, chunk, chapter_ids, result)
+                        chunk = []
+                        if on_progress:
+                            on_progress(result, self._fraction(uploaded_file, total_size))
+                if chunk:
+                    self._write_chunk(conn, project_id, chunk, chapter_ids, result)
+                # 一括で追加した話・キャラ・地名は、最後にまとめて登場話の索引に入れる
+                self.db.rebuild_appearances(project_id)
+        finally:
+            # アップロードファイル自体は閉じないように切り離す
+            stream.detach()
+
+        if on_progress:
+            on_progress(result, 1.0)
+        return result
+
+    def _fraction(self, uploaded_file, total_size):
+        """ 読み込んだバイト数から進捗率を求める（サイズ不明なら None） """
+        if not total_size:
+            return None
+        return min(uploaded_file.tell() / total_size, 1.0)
+
+    def _write_chunk(self, conn, project_id, rows, chapter_ids, result):
+        """ チャンク内の行を検証・変換して、種類ごとに executemany で書き込む """
+        blocks, chapter_titles, episodes = [], [], []
+
+        for row in rows:
+            # CSVの列構成:　[タイプ, 内容, 完了/名前, 役割/場所]
+            if len(row) < 2:
+                result.skipped += 1
+                continue
+
+            b_type = row[0]
+            content = row[1]
+            val1 = row[2] if len(row) > 2 else ""
+            val2 = row[3] if len(row) > 3 else ""
+
+            block = self._map_block(project_id, b_type, content, val1, val2)
+            if block:
+                blocks.append(block)
+            elif b_type == "Chapter" and val1.strip():
+                # 章: [Chapter, , 章名, ]
+                chapter_titles.append(val1)
+            elif b_type == "Episode" and val1.strip() and val2.strip():
+                # 話: [Episode, 本文, 話名, 章名]（章がなければ作成する）
+                chapter_titles.append(val2)
+                episodes.append((val2, val1, content))
+            else:
+                result.skipped += 1
+
+        if blocks:
+            self.db.save_blocks_bulk(conn, blocks)
+            result.blocks += len(blocks)
+
+        new_titles = [t for t in dict.fromkeys(chapter_titles) if t not in chapter_ids]
+        if new_titles:
+            self.db.save_chapters_bulk(conn, project_id, new_titles)
+            chapter_ids.update(self.db.fetch_chapter_ids(conn, project_id))
+            result.chapters += len(new_titles)
+
+        if episodes:
+            inserted = self.db.save_episodes_bulk(conn, [(chapter_ids[ch], title, body) for ch, title, body in episodes])
+            result.episodes += inserted
+            # 同じ章に同名の話がある行はスキップ扱い
+            result.skipped += len(episodes) - inserted
+
+    def _map_block(self, project_id, b_type, content, val1, val2):
+        """ ブロック行を blocks テーブルの行に変換する（add_*_block と同じ入力チェック） """
+        if b_type == "TextBlock" and content.strip():
+            return ("text", content, project_id, 0, None, None, None)
+        if b_type == "TodoBlock" and content.strip():
+            return ("todo", content, project_id, 1 if val1 == "完了" else 0, None, None, None)
+        if b_type == "CharacterBlock" and val1.strip():
+            return ("character", content, project_id, 0, val1, val2, None)
+        if b_type == "WorldSettingBlock" and val1.strip():
+            return ("world", content, project_id, 0, None, None, val1)
+        if b_type == "StoryBlock" and val1.strip():
+            return ("story", content, project_id, 0, val1, None, None)
+        return None
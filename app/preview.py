@@ -0,0 +1,82 @@
+import hashlib
+import html
+import threading
+from collections import OrderedDict
+
+# 1ページあたりの目安の文字数（行の途中では区切らない）
+PAGE_SIZE = 4000
+
+
+def split_pages(text, page_size=PAGE_SIZE):
+    """ 本文を行単位で page_size 文字前後のページに分ける（1行が長すぎる場合だけ行の途中で切る） """
+    pages, current, size = [], [], 0
+    for line in text.split("\n"):
+        while len(line) > page_size:
+            if current:
+                pages.append(current)
+                current, size = [], 0
+            pages.append([line[:page_size]])
+            line = line[page_size:]
+        if current and size + len(line) > page_size:
+            pages.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        pages.append(current)
+    return pages
+
+
+def render_lines(lines):
+    """ 行をエスケープして段落の HTML にする（空行は空の段落） """
+    return "".join(f"<p>{html.escape(line) or '<br>'}</p>" for line in lines)
+
+
+class RenderedPreview:
+    """ 1つの本文のプレビュー。ページの HTML は初めて表示するときに作って保持する """
+    __slots__ = ("pages", "_html", "_lock")
+
+    def __init__(self, text, page_size=PAGE_SIZE):
+        self.pages = split_pages(text, page_size)
+        self._html = [None] * len(self.pages)
+        self._lock = threading.Lock()
+
+    @property
+    def page_count(self):
+        return len(self.pages)
+
+    def page_html(self, index):
+        """ index ページ目（0始まり）の HTML を返す """
+        with self._lock:
+            rendered = self._html[index]
+            if rendered is None:
+                rendered = self._html[index] = render_lines(self.pages[index])
+            return rendered
+
+
+class PreviewRenderer:
+    """ 本文のハッシュをキーにプレビューを保持する LRU キャッシュ
+
+    同じ本文を再実行のたびにエスケープ・分割し直さないようにする。
+    """
+
+    def __init__(self, maxsize=32, page_size=PAGE_SIZE):
+        self.maxsize = maxsize
+        self.page_size = page_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text):
+        key = hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            preview = self._entries.get(key)
+            if preview is not None:
+                self._entries.move_to_end(key)
+                return preview
+
+        preview = RenderedPreview(text or "", self.page_size)
+        with self._lock:
+            self._entries[key] = preview
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return preview
@@ -0,0 +1,127 @@
+import json
+import os
+from functools import lru_cache
+
+# スナップショットに含めるテーブル（読み込みもこの順で行う）
+SNAPSHOT_TABLES = ("projects", "blocks", "chapters", "episodes")
+# 形式 → 拡張子
+SNAPSHOT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+MANIFEST_NAME = "manifest.json"
+SNAPSHOT_VERSION = 1
+# 読み込むときに Python の値へ変換する行数（大きな作品でも全体を一度にリストにしない）
+LOAD_BATCH_ROWS = 10000
+
+# 形式ごとの既定の圧縮。Arrow は無圧縮にして、読み込み時にメモリマップしたファイルをそのまま使う
+DEFAULT_COMPRESSION = {"parquet": "zstd", "arrow": None}
+
+# 整数の列（それ以外は文字列）
+_INT_COLUMNS = {"id", "chapter_id", "is_done", "order_num", "version"}
+
+
+@lru_cache(maxsize=None)
+def _pyarrow():
+    """ pyarrow はインストールされている場合のみ、初めて使うときに読み込む（なければ None） """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _require_pyarrow():
+    pa = _pyarrow()
+    if pa is None:
+        raise RuntimeError("スナップショットには pyarrow が必要です（pip install pyarrow）。")
+    return pa
+
+
+def _to_table(pa, columns):
+    """ {列名: 値のリスト} を型を決めた Arrow のテーブルにする（0行でも列の型が残るように） """
+    fields = [pa.field(name, pa.int64() if name in _INT_COLUMNS else pa.string()) for name in columns]
+    schema = pa.schema(fields)
+    return pa.table({name: pa.array(values, type=schema.field(name).type) for name, values in columns.items()},
+                    schema=schema)
+
+
+class ProjectSnapshot:
+    """ 作品を列指向のファイル（Parquet または Arrow IPC）に書き出し、そのまま別の作品として読み込む
+
+    テーブルごとに1ファイルと manifest.json をフォルダに置く。CSV と違い、行を1つずつ解釈せずに
+    列ごとにまとめて読み書きするので、大きな作品の往復（バックアップ・複製・移行）が速い。
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def export(self, project_id, directory, fmt="parquet", compression="default"):
+        """ 作品を directory に書き出し、マニフェストを返す
+
+        compression は "zstd"・"lz4" など（None で無圧縮、"default" で DEFAULT_COMPRESSION）。
+        """
+        if fmt not in SNAPSHOT_FORMATS:
+            raise ValueError(f"未対応の形式です: {fmt}")
+        if compression == "default":
+            compression = DEFAULT_COMPRESSION[fmt]
+        pa = _require_pyarrow()
+        os.makedirs(directory, exist_ok=True)
+
+        tables = self.db.fetch_snapshot_tables(project_id)
+        if not tables["projects"]["id"]:
+            raise ValueError(f"作品 {project_id} がありません。")
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "format": fmt,
+            "compression": compression,
+            "title": tables["projects"]["title"][0],
+            "tables": {},
+        }
+        for name in SNAPSHOT_TABLES:
+            table = _to_table(pa, tables[name])
+            path = os.path.join(directory, name + SNAPSHOT_FORMATS[fmt])
+            if fmt == "parquet":
+                pa.parquet.write_table(table, path, compression=compression or "none")
+            else:
+                options = pa.ipc.IpcWriteOptions(compression=compression)
+                with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                    writer.write_table(table)
+            manifest["tables"][name] = {"rows": table.num_rows, "bytes": os.path.getsize(path)}
+
+        with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return manifest
+
+    @staticmethod
+    def read(directory):
+        """ 書き出したフォルダを読み込み、(マニフェスト, {テーブル: Arrow のテーブル}) を返す
+
+        ファイルはメモリマップで開くので、無圧縮の Arrow 形式なら列のデータはコピーされない。
+        """
+        pa = _require_pyarrow()
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SNAPSHOT_VERSION or manifest.get("format") not in SNAPSHOT_FORMATS:
+            raise ValueError("このスナップショットの形式には対応していません。")
+
+        tables = {}
+        for name in SNAPSHOT_TABLES:
+            path = os.path.join(directory, name + SNAPSHOT_FORMATS[manifest["format"]])
+            if manifest["format"] == "parquet":
+                tables[name] = pa.parquet.read_table(path, memory_map=True)
+            else:
+                tables[name] = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return manifest, tables
+
+    def load(self, directory, title=None):
+        """ スナップショットを新しい作品として読み込み、作品IDを返す（title を省略すると元の題名）
+
+        SQLite に書き込むには Python の値が必要なので、レコードバッチごとに LOAD_BATCH_ROWS 行ずつ変換する。
+        作品の作成と読み込みは1つの操作で、失敗したら作品は残らない。
+        """
+        manifest, tables = self.read(directory)
+        batches = {
+            name: (batch.to_pydict() for batch in table.to_batches(max_chunksize=LOAD_BATCH_ROWS))
+            for name, table in tables.items()
+        }
+        return self.db.import_project_tables(title or manifest["title"], batches)
@@ -0,0 +1,53 @@
+from datetime import date
+
+import streamlit as st
+
+
+def render_stats_dashboard(controller, project_id, days=30):
+    """ 作品の執筆統計を表示する（集計テーブルだけを読み、本文は読み込まない） """
+    chapter_count, episode_count, char_count, line_count = controller.get_project_stats(project_id)
+    daily = controller.get_daily_stats(project_id, days)
+    today = daily[-1] if daily and daily[-1][0] == date.today().isoformat() else None
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("総文字数", f"{char_count:,}")
+    col2.metric("話数", f"{episode_count:,}", help=f"{chapter_count:,}章")
+    col3.metric("行数", f"{line_count:,}")
+    col4.metric(
+        "今日の執筆", f"{today[1]:,}文字" if today else "0文字",
+        delta=f"{today[1] - today[2]:+,}" if today else None,
+    )
+
+    chapters = controller.get_chapter_stats(project_id)
+    if chapters:
+        st.caption("章ごとの文字数（作品全体に占める割合）")
+        st.dataframe(
+            [
+                {
+                    "章": title, "話数": episodes, "文字数": chars, "行数": lines,
+                    "割合": chars * 100 / char_count if char_count else 0,
+                }
+                for _, title, episodes, chars, lines in chapters
+            ],
+            column_config={
+                "割合": st.column_config.ProgressColumn("割合", min_value=0, max_value=100, format="%.0f%%"),
+            },
+            hide_index=True,
+            width="stretch",
+        )
+
+    if daily:
+        st.caption(f"直近{days}日の執筆量")
+        st.bar_chart(
+            {
+                "日付": [d[0] for d in daily],
+                "増えた文字数": [d[1] for d in daily],
+                "減った文字数": [-d[2] for d in daily],
+            },
+            x="日付", y=["増えた文字数", "減った文字数"],
+        )
+
+    if st.button("集計を作り直す", key="stats_rebuild", help="集計がずれている場合に、全ての本文から数え直します"):
+        with st.spinner("集計中..."):
+            controller.rebuild_statistics(backfill_daily=not daily)
+        st.rerun()
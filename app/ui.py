@@ -1,13 +1,217 @@
+import os
+
 import streamlit as st
-from app.controller import NotionController
+from app.controller import BLOCK_PAGE_SIZE, BLOCK_TABS, NotionController
+from app.debug_panel import render_debug_panel
+from app.stats_dashboard import render_stats_dashboard
+from core.profiling import Profiler, begin_phase, profiling
+from core.storage import DuplicateTitle, VersionConflict
+
+@st.cache_resource
+def get_controller():
+    """ コントローラはプロセスで1つだけ作り、全セッションでキャッシュを共有する """
+    # NOTION_APP_STORAGE=sharded で作品ごとのファイルに保存する（既定は1ファイルの SQLite）
+    storage = os.environ.get("NOTION_APP_STORAGE")
+    if storage:
+        from core.backends import open_storage
+        controller = NotionController(open_storage(storage, os.environ.get("NOTION_APP_DATA")))
+    else:
+        controller = NotionController()
+    # NOTION_APP_BACKUP_DIR か NOTION_APP_BACKUP_INTERVAL（分）を指定したときだけバックアップを有効にする
+    # （間隔を指定した場合は、その間隔で自動的にバックアップを取る）
+    interval = float(os.environ.get("NOTION_APP_BACKUP_INTERVAL") or 0)
+    backup_dir = os.environ.get("NOTION_APP_BACKUP_DIR")
+    if backup_dir or interval:
+        controller.enable_backups(backup_dir or "data/backups", interval * 60)
+    return controller
 
 class NotionUI:
     def __init__(self):
         # コントローラを初期化
-        self.controller = NotionController()
+        self.controller = get_controller()
+
+    def _on_episode_change(self, ep_id):
+        """ 本文の入力欄が変更されたときに自動保存を依頼する """
+        title = st.session_state.get(f"t_{ep_id}", "")
+        content = st.session_state.get(f"c_ep_{ep_id}", "")
+        self.controller.autosave_episode(ep_id, title, content, st.session_state.get(f"edit_{ep_id}"))
+
+    def _open_episode(self, ep_id, editing):
+        """ 話の編集状態（EditSession）と表示する本文を返す
+
+        入力欄を作るときに本文と版を一緒に読み込み、保存時にほかの画面の保存と衝突していないか確かめる。
+        """
+        edit = st.session_state.get(f"edit_{ep_id}")
+        # 入力欄が作り直される場合（別の話やプレビューから戻った場合）は、最新の本文と版で始め直す
+        if editing and (edit is None or (f"c_ep_{ep_id}" not in st.session_state and edit.conflict is None)):
+            content, edit = self.controller.open_episode(ep_id, previous=edit)
+            st.session_state[f"edit_{ep_id}"] = edit
+            return edit, content or ""
+        return edit, self.controller.get_episode_body(ep_id, edit) or ""
+
+    def _reset_episode_inputs(self, ep_id):
+        """ 入力欄と編集状態を捨て、次の再描画で最新の本文を読み込み直す """
+        edit = st.session_state.pop(f"edit_{ep_id}", None)
+        if edit is not None:
+            self.controller.close_edit(edit)
+        st.session_state.pop(f"c_ep_{ep_id}", None)
+
+    def _save_block(self, b_id, content, fields, force=False):
+        """ ブロックを保存する。入力欄を作った後にほかの画面で保存されていたら、上書きせずに知らせる """
+        version = None if force else st.session_state.get(f"ver_{b_id}")
+        try:
+            # 再描画で新しい内容を表示するため、書き込みの完了を待つ（最大5秒）
+            saved = self.controller.update_block_async(b_id, content, version, **fields).wait(timeout=5)
+        except VersionConflict:
+            st.session_state[f"conflict_{b_id}"] = True
+        else:
+            if saved:
+                # 次の再描画で、保存後の内容と版から入力欄を作り直す
+                self._reset_block_inputs(b_id)
+            else:
+                # 5秒以内に書き込みが終わらなかった（キューに残っていて、後で書き込まれる）
+                st.toast("まだ保存中です。しばらくしてから保存されたか確かめてください。", icon="⏳")
+        st.rerun()
+
+    def _render_reorder(self, key, label, items, move):
+        """ 並び順の変更欄。items の (id, タイトル) から1つ選び、別の項目の直後（または先頭）に移す """
+        with st.expander(f"↕️ {label}の並び順を変更する"):
+            titles = {row_id: title for row_id, title, *_ in items}
+            target = st.selectbox(f"移動する{label}", options=list(titles), format_func=titles.get, key=f"{key}_target")
+            after = st.selectbox(
+                "移動先", options=[None] + [row_id for row_id in titles if row_id != target],
+                format_func=lambda row_id: "先頭" if row_id is None else f"「{titles[row_id]}」の後ろ",
+                key=f"{key}_after",
+            )
+            if st.button("移動", key=f"{key}_move"):
+                move(target, after)
+                st.rerun()
+
+    def _render_appearances(self, b_id):
+        """ キャラ名・地名の登場話一覧（保存時に更新される索引を読むだけで、本文は走査しない） """
+        hits = self.controller.get_appearances(b_id)
+        st.caption(f"登場話一覧（{len(hits)}話）")
+        if hits:
+            st.dataframe(
+                [
+                    {"章": ch_title, "話": ep_title, "回数": count, "初登場（文字目）": first + 1}
+                    for _, ch_title, ep_title, count, first in hits
+                ],
+                hide_index=True,
+                width="stretch",
+            )
+
+    def _render_block_list(self, project_id):
+        """ 設定・メモ一覧。タブごとに1ページ分の見出しだけを表示し、入力欄は選んだブロックにだけ作る """
+        counts = [self.controller.count_blocks(project_id, types) for _, types in BLOCK_TABS]
+        tabs = st.tabs([f"{name} ({count:,})" for (name, _), count in zip(BLOCK_TABS, counts)])
+        for n, (tab, (_, types), count) in enumerate(zip(tabs, BLOCK_TABS, counts)):
+            with tab:
+                if not count:
+                    st.info("まだありません。")
+                    continue
+                # 表示中のページの after_id を積んでおき、「前へ」で1つ戻る
+                cursors = st.session_state.setdefault(f"blk_pages_{project_id}_{n}", [None])
+                blocks, next_after = self.controller.get_block_page(project_id, types, cursors[-1], BLOCK_PAGE_SIZE)
+                if not blocks and len(cursors) > 1:
+                    # 最後のページのブロックが全て削除された
+                    cursors.pop()
+                    st.rerun()
+
+                by_id = {b.id: b for b in blocks}
+                selected = st.radio(
+                    "編集する項目", options=list(by_id), format_func=lambda b_id: by_id[b_id].label(),
+                    index=None, key=f"blk_sel_{project_id}_{n}_{cursors[-1]}", label_visibility="collapsed",
+                )
+
+                col_prev, col_page, col_next = st.columns([1, 2, 1])
+                if col_prev.button("◀ 前へ", key=f"blk_prev_{n}", disabled=len(cursors) == 1):
+                    cursors.pop()
+                    st.rerun()
+                col_page.caption(f"{len(cursors)} / {-(-count // BLOCK_PAGE_SIZE)} ページ")
+                if col_next.button("次へ ▶", key=f"blk_next_{n}", disabled=next_after is None):
+                    cursors.append(next_after)
+                    st.rerun()
+
+                if selected in by_id:
+                    with st.container(border=True):
+                        self._render_block_editor(by_id[selected])
+
+    def _render_block_editor(self, block):
+        """ 選んだブロックの入力欄・保存・削除 """
+        b_id = block.id
+        # 入力欄を作ったときの版（保存時にほかの画面の保存と衝突していないか確かめる）
+        if f"cont_{b_id}" not in st.session_state:
+            st.session_state[f"ver_{b_id}"] = block.version
+        if block.block_type == "character":
+            edit_name = st.text_input("名前", value=block.name, key=f"name_{b_id}")
+            edit_role = st.text_input("役割", value=block.role, key=f"role_{b_id}")
+            edit_cont = st.text_area("詳細", value=block.content, key=f"cont_{b_id}")
+            fields = {"name": edit_name, "role": edit_role}
+            self._render_appearances(b_id)
+
+        elif block.block_type == "world":
+            edit_loc = st.text_input("場所", value=block.location, key=f"loc_{b_id}")
+            edit_cont = st.text_area("詳細", value=block.content, key=f"cont_{b_id}")
+            fields = {"location": edit_loc}
+            self._render_appearances(b_id)
+
+        else:
+            # 通常のテキスト・ToDo
+            edit_cont = st.text_area("内容", value=block.content, key=f"cont_{b_id}")
+            fields = {}
+
+        if st.button("保存", key=f"btn_{b_id}"):
+            self._save_block(b_id, edit_cont, fields)
+
+        if st.session_state.get(f"conflict_{b_id}"):
+            st.warning("このブロックは、読み込んだ後にほかの画面で保存されています。")
+            col_reload, col_force = st.columns([1, 1])
+            if col_reload.button("最新の内容を読み込む", key=f"reload_{b_id}"):
+                self._reset_block_inputs(b_id)
+                st.rerun()
+            if col_force.button("自分の内容で上書きする", key=f"force_{b_id}"):
+                self._save_block(b_id, edit_cont, fields, force=True)
+
+        if st.button("🗑️ 削除", key=f"del_{b_id}"):
+            self.controller.delete_block(b_id)
+            st.rerun()
+
+    def _reset_block_inputs(self, b_id):
+        for prefix in ("name_", "role_", "loc_", "cont_", "ver_", "conflict_"):
+            st.session_state.pop(f"{prefix}{b_id}", None)
 
     def render_app(self):
         st.set_page_config(page_title="Creative Manager", page_icon="✍️", layout="wide")
+
+        # デバッグパネルを有効にしたセッションだけ、そのセッションの Profiler に計測する
+        # （コントローラは全セッションで共有なので、計測の有効・無効と結果はセッションごとに持つ）
+        profiler = None
+        if st.session_state.get("debug_panel", False):
+            profiler = st.session_state.setdefault("debug_profiler", Profiler())
+        cprof = None
+        if profiler is not None and st.session_state.get("debug_cprofile", False):
+            # デバッグ時しか使わないので、ここで読み込む
+            import cProfile
+            cprof = cProfile.Profile()
+            cprof.enable()
+
+        try:
+            if profiler is None:
+                self._render_main()
+            else:
+                with profiling(profiler):
+                    self._render_main()
+        finally:
+            if cprof:
+                cprof.disable()
+                cprof.create_stats()
+                import marshal
+                st.session_state["debug_cprofile_dump"] = marshal.dumps(cprof.stats)
+            render_debug_panel()
+
+    def _render_main(self):
+        begin_phase("sidebar")
         st.markdown(self.controller.get_style(), unsafe_allow_html=True)
         st.title("✍️ Creative Manager")
 
@@ -38,7 +242,7 @@ class NotionUI:
         st.sidebar.subheader("📤 書き出し")
         file_format = st.sidebar.selectbox(
             "保存形式を選択",
-            ["Text (.txt)", "CSV (.csv)"]
+            ["Text (.txt)", "CSV (.csv)", "Markdown (.md)", "EPUB (.epub)"]
         )
 
         # --- サイドバー：インポート機能 ---
@@ -50,26 +254,72 @@ class NotionUI:
 
         if uploaded_file is not None:
             if st.sidebar.button("データをインポート"):
-                self.controller.import_from_csv(selected_project_id, uploaded_file)
-                st.sidebar.success("読み込みが完了しました！")
-                st.rerun()
+                progress = st.sidebar.progress(0.0, text="読み込み中...")
 
-        # Controllerに選択中の project_id を渡す
-        data, mime, ext = self.controller.get_export_data(selected_project_id, selected_title, file_format)
+                def on_progress(result, fraction):
+                    progress.progress(fraction or 0.0, text=f"読み込み中... {result.rows_read}行")
 
-        if data:
-            # CSVかつExcel向けの場合は文字化け防止(BOM付き)にする
-            processed_data = data.encode('utf-8-sig') if ext == "csv" else data
+                try:
+                    result = self.controller.import_from_csv(selected_project_id, uploaded_file, on_progress)
+                except Exception as e:
+                    st.sidebar.error(f"読み込みに失敗しました（変更は取り消されました）: {e}")
+                else:
+                    st.sidebar.success(f"読み込みが完了しました！（{result.imported}件、スキップ{result.skipped}件）")
+                    st.rerun()
 
-            st.sidebar.download_button(
-                label = f"{selected_title}で保存",
-                data = processed_data,
-                file_name = f"{selected_title}.{ext}",
-                mime = mime
-            )
+        # --- サイドバー：バックアップ（有効にした場合のみ。一覧はキャッシュしたものを使う） ---
+        if self.controller.backups is not None:
+            with st.sidebar.expander("🗄 バックアップ"):
+                if st.button("今すぐバックアップ"):
+                    manifest = self.controller.create_backup()
+                    st.success(
+                        f"バックアップしました（新しく保存 {manifest['written_bytes'] // 1024:,} KB"
+                        f" / 全体 {manifest['compressed_bytes'] // 1024:,} KB）"
+                    )
+                backups = [
+                    m for m in self.controller.list_backups()
+                    if any(p[0] == selected_project_id for f in m["files"] for p in f["projects"])
+                ]
+                if backups:
+                    snapshot = st.selectbox(
+                        "この作品のバックアップ", backups, format_func=lambda m: m["created_at"].replace("T", " ")
+                    )
+                    if st.button("別の作品として復元"):
+                        self.controller.restore_project_backup(snapshot["id"], selected_project_id)
+                        st.rerun()
+
+        # 書き出しは重いので、ボタンを押したときだけ作る（本文は一時ファイルに少しずつ書き出される）
+        # 作成後に作品が変わっていなければ、作ったファイルをそのままダウンロードできる
+        export = self.controller.get_cached_export(selected_project_id, selected_title, file_format)
+        if export is None and st.sidebar.button("書き出しファイルを作成"):
+            export = self.controller.get_export_data(selected_project_id, selected_title, file_format)
+        if export is not None:
+            data, mime, ext = export
+            if data:
+                with data:
+                    st.sidebar.download_button(
+                        label = f"{selected_title}で保存",
+                        data = data,
+                        file_name = f"{selected_title}.{ext}",
+                        mime = mime,
+                        on_click = "ignore",
+                    )
 
         
+        # --- メインエリア：検索 ---
+        begin_phase("search")
+        search_q = st.text_input("🔍 本文・設定を検索", key="search_q", placeholder="キャラ名、地名、台詞など")
+        if search_q.strip():
+            hits = self.controller.search(selected_project_id, search_q)
+            with st.expander(f"検索結果: {len(hits)}件", expanded=True):
+                if not hits:
+                    st.info("見つかりませんでした。")
+                for kind, hit_id, heading, snippet, _ in hits:
+                    icon = "📜" if kind == "episode" else "📌"
+                    st.markdown(f"{icon} **{heading}**  \n{snippet}")
+
         # --- メインエリア：入力フォーム ---
+        begin_phase("input_forms")
         st.subheader(f"📖 作品設定: {selected_title}")
         tab1, tab2, tab3, tab4 = st.tabs(["📝 メモ・ToDo", "👤 キャラクター", "🗺️ 世界観", "📌 プロット・構成"])
 
@@ -109,7 +359,13 @@ class NotionUI:
 
         st.divider()
 
+        # --- 執筆統計 ---
+        begin_phase("stats")
+        with st.expander("📊 執筆統計"):
+            render_stats_dashboard(self.controller, selected_project_id)
+
         # --- 本編執筆エリア ---
+        begin_phase("writing_area")
         st.header(f"✒️ 本編執筆: {selected_title}")
         
         # 1. 章（大項目）の管理
@@ -140,9 +396,14 @@ class NotionUI:
             with st.expander("📝 章の名前を変更する"):
                 new_ch_name = st.text_input("新しい章名", value=selected_ch_name)
                 if st.button("章名を変更"):
-                    self.controller.update_chapter_title(selected_ch_id, new_ch_name)
-                    st.success("章名を変更しました")
-                    st.rerun()
+                    if self.controller.update_chapter_title(selected_ch_id, new_ch_name):
+                        st.success("章名を変更しました")
+                        st.rerun()
+                    else:
+                        st.error("その章題は既に存在します。")
+
+            if len(chapters) > 1:
+                self._render_reorder("order_ch", "章", chapters, self.controller.move_chapter)
 
             # 2. 話（エピソード）の管理
             with col_ep_create.expander("📜 新しい話（エピソード）を追加"):
@@ -156,87 +417,126 @@ class NotionUI:
                         st.error(msg)
 
             # 選択中の章に紐づく話を取得
-            episodes = self.controller.get_episodes(selected_ch_id)
+            # 一覧は本文を含まないメタデータだけを取得する
+            episodes = self.controller.get_episode_list(selected_ch_id)
 
             if not episodes:
                 st.info(f"「{selected_ch_name}」にはまだ話がありません。")
 
             else:
+                if len(episodes) > 1:
+                    self._render_reorder(f"order_ep_{selected_ch_id}", "話", episodes, self.controller.move_episode)
+
                 # 話を選択
                 ep_options = {f"第{i+1}話: {e[1]}": e for i, e in enumerate(episodes)}
                 selected_ep_label = st.selectbox("📜 編集する話を選択", options=ep_options.keys(), key="sel_ep")
                 target_ep = ep_options[selected_ep_label]
-                ep_id, ep_title, ep_content = target_ep[0], target_ep[1], target_ep[2]        
+                ep_id, ep_title = target_ep[0], target_ep[1]
+                # 本文は選択中の話だけ読み込む
+                edit, ep_content = self._open_episode(ep_id, st.session_state.get("p_mode", "編集") == "編集")
+                st.caption(f"{target_ep[3]:,}文字 / {target_ep[5]:,}行")
 
                 # 3. 執筆・表示モード
                 mode = st.radio("表示モード", ["編集", "プレビュー・横書き", "プレビュー・縦書き"], horizontal=True, key="p_mode")
 
                 if mode == "編集":
+                    if edit is None:
+                        # 一覧を読んだ後にほかの画面で削除された。選択を外して一覧から読み直す
+                        st.session_state.pop("sel_ep", None)
+                        st.session_state.pop(f"edit_{ep_id}", None)
+                        st.toast("この話はほかの画面で削除されました", icon="🗑️")
+                        st.rerun()
+
                     edit_t = st.text_input("タイトルを編集", value=ep_title, key=f"t_{ep_id}")
-                    edit_c = st.text_area("本文を編集", value=ep_content, height=500, key=f"c_ep_{ep_id}")
+                    # 本文が変更されたら自動保存を依頼する（連続した変更はまとめて書き込まれる）
+                    edit_c = st.text_area(
+                        "本文を編集", value=ep_content, height=500, key=f"c_ep_{ep_id}",
+                        on_change=self._on_episode_change, args=(ep_id,),
+                    )
+
+                    if edit.error is not None:
+                        # 自動保存も含め、タイトルの重複などで保存できていない
+                        st.warning(f"保存できていません: {edit.error}")
+
+                    if edit.conflict is not None:
+                        st.warning("この話は、読み込んだ後にほかの画面で保存されています。どちらの内容を残すか選ぶまで自動保存は止まります。")
+                        col_reload, col_force = st.columns([1, 1])
+                        if col_reload.button("最新の内容を読み込む", key=f"reload_ep_{ep_id}"):
+                            self._reset_episode_inputs(ep_id)
+                            st.rerun()
+                        if col_force.button("自分の内容で上書きする", key=f"force_ep_{ep_id}"):
+                            try:
+                                self.controller.update_episode(ep_id, edit_t, edit_c, edit=edit, force=True)
+                            except DuplicateTitle as e:
+                                st.warning(str(e))
+                            else:
+                                st.toast(f"「{edit_t}」を上書き保存しました！", icon="✅")
+                                st.rerun()
 
                     col_save, col_del = st.columns([1, 1])
                     if col_save.button("💾 上書き保存", key=f"save_{ep_id}"):
-                        with st.spinner("保存中..."):
-                            self.controller.update_episode(ep_id, edit_t, edit_c)    
-                            st.toast(f"「{edit_t}」を上書き保存しました！", icon="✅")
+                        # 書き込みはバックグラウンドで行う。衝突していないか確かめるため、完了は待つ（最大5秒）
+                        try:
+                            saved = self.controller.save_episode_async(ep_id, edit_t, edit_c, edit).wait(timeout=5)
+                        except VersionConflict:
+                            st.rerun()
+                        except DuplicateTitle as e:
+                            st.warning(str(e))
+                        else:
+                            if saved:
+                                st.toast(f"「{edit_t}」を上書き保存しました！", icon="✅")
+                            else:
+                                # 5秒以内に書き込みが終わらなかった（キューに残っていて、後で書き込まれる）
+                                st.warning("まだ保存中です。しばらくしてから保存されたか確かめてください。")
                         
                     if col_del.button("🗑️ この話を削除", key=f"del_ep_{ep_id}"):
                         with st.spinner("削除中..."):
-                            self.controller.delete_episode(ep_id)
+                            self.controller.delete_episode(ep_id, edit)
+                            st.session_state.pop(f"edit_{ep_id}", None)
                             st.toast("削除が完了しました", icon="🗑️")
                         st.balloons()
                         st.rerun()
 
+                    # 変更履歴
+                    with st.expander("🕘 変更履歴"):
+                        revisions = self.controller.get_revisions(ep_id)
+                        if not revisions:
+                            st.info("まだ履歴がありません。")
+                        else:
+                            rev_options = {f"第{r[0]}版 ({r[2]} / {r[1]:,}文字)": r[0] for r in revisions}
+                            rev_label = st.selectbox("版を選択", options=rev_options.keys(), key=f"rev_{ep_id}")
+                            rev_text = self.controller.get_revision_text(ep_id, rev_options[rev_label])
+                            st.text_area("この版の本文", value=rev_text, height=200, disabled=True, key=f"rev_text_{ep_id}")
+                            if st.button("この版に戻す", key=f"restore_{ep_id}"):
+                                try:
+                                    self.controller.restore_revision(ep_id, edit_t, rev_options[rev_label])
+                                except DuplicateTitle as e:
+                                    st.warning(str(e))
+                                else:
+                                    # 入力欄の内容を復元した本文と新しい版で作り直す
+                                    self._reset_episode_inputs(ep_id)
+                                    st.toast("過去の版に戻しました", icon="🕘")
+                                    st.rerun()
+
                 else:
                     # プレビュー表示
                     style_class = "vertical-mode" if "縦書き" in mode else "horizontal-mode"
                     st.markdown(f"### {ep_title}")
-                    # HTMLでプレビューを表示
+                    # エスケープ済みの HTML をページ単位で表示する（長い話でも表示するのは1ページ分だけ）
+                    preview = self.controller.get_preview(ep_content)
+                    page = 1
+                    if preview.page_count > 1:
+                        page = st.select_slider(
+                            "ページ", options=range(1, preview.page_count + 1), key=f"preview_page_{ep_id}"
+                        )
                     st.markdown(
-                        f'<div class="preview-container {style_class}">{ep_content}</div>', unsafe_allow_html=True
+                        f'<div class="preview-container {style_class}">{preview.page_html(page - 1)}</div>',
+                        unsafe_allow_html=True,
                     )
+                    if preview.page_count > 1:
+                        st.caption(f"{page} / {preview.page_count} ページ")
 
         # --- 表示エリア ---
+        begin_phase("block_list")
         st.subheader("📌 設定・メモ一覧")
-        all_blocks = self.controller.get_blocks_by_project(selected_project_id)
-
-        list_tab1, list_tab2, list_tab3, list_tab4 = st.tabs(["📝 メモ・ToDo", "👤 キャラクター", "🗺️ 世界観", "📌 プロット・構成"])
-
-        for block in all_blocks:
-            b_id = getattr(block, 'id', None)
-            target_tab = None
-            if block.__class__.__name__ in ["TextBlock", "TodoBlock"]: target_tab = list_tab1
-            elif block.__class__.__name__ == "CharacterBlock": target_tab = list_tab2
-            elif block.__class__.__name__ == "WorldSettingBlock": target_tab = list_tab3
-            elif block.__class__.__name__ == "StoryBlock": target_tab = list_tab4
-
-            if target_tab:
-                with target_tab:
-                    with st.expander(f"🔍 {block.render().splitlines()[0]}"):
-                        if block.__class__.__name__ == "CharacterBlock":
-                            edit_name = st.text_input("名前", value=block.name, key=f"name_{b_id}")
-                            edit_role = st.text_input("役割", value=block.role, key=f"role_{b_id}")
-                            edit_cont = st.text_area("詳細", value=block.content, key=f"cont_{b_id}")
-                            if st.button("保存", key=f"btn_{b_id}"):
-                                self.controller.db.update_block(b_id, edit_cont, name=edit_name, role=edit_role)
-                                st.rerun()
-
-                        elif block.__class__.__name__ == "WorldSettingBlock":
-                            edit_loc = st.text_input("場所", value=block.location, key=f"loc_{b_id}")
-                            edit_cont = st.text_area("詳細", value=block.content, key=f"cont_{b_id}")
-                            if st.button("保存", key=f"btn_{b_id}"):
-                                self.controller.db.update_block(b_id, edit_cont, location=edit_loc)
-                                st.rerun()
-                        
-                        else:
-                            # 通常のテキスト・ToDo
-                            edit_cont = st.text_area("内容", value=block.content, key=f"cont_{b_id}")
-                            if st.button("保存", key=f"btn_{b_id}"):
-                                self.controller.db.update_block(b_id, edit_cont)
-                                st.rerun()
-                            
-                        if st.button("🗑️ 削除", key=f"del_{b_id}"):
-                            self.controller.delete_block(b_id)
-                            st.rerun()
-        
\ No newline at end of file
+        self._render_block_list(selected_project_id)
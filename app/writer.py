@@ -0,0 +1,160 @@
+import atexit
+import threading
+from collections import OrderedDict
+
+
+class WriteTicket:
+    """ 書き込み依頼の完了通知（ack）。durability が必要な呼び出し元は wait() で待つ """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.error = None
+
+    @property
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """ 書き込みが commit されるまで待つ。失敗していれば例外を送出する """
+        if not self._event.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def _finish(self, error=None):
+        self.error = error
+        self._event.set()
+
+
+class _WriteItem:
+    __slots__ = ("func", "args", "on_commit", "ticket")
+
+    def __init__(self, func, args, on_commit):
+        self.func = func
+        self.args = args
+        self.on_commit = on_commit
+        self.ticket = WriteTicket()
+
+
+class WriteBehindQueue:
+    """ UI からの保存を1本の書き込みスレッドでまとめて処理するキュー
+
+    同じキー（例: ("episode", 話ID)）への依頼が未処理のうちに届いたら最新の内容で上書きし、
+    溜まった依頼は batch_size 件ずつ1つのトランザクションで書き込む。
+    """
+
+    def __init__(self, db, maxsize=1000, batch_size=100):
+        self.db = db
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self._pending = OrderedDict()   # key -> _WriteItem（投入順）
+        self._in_flight = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        # プロセス終了時に残りを書き込む
+        atexit.register(self.shutdown)
+
+    def submit(self, key, func, *args, on_commit=None):
+        """ 書き込みを依頼して WriteTicket を返す（キューが満杯の間は待つ） """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("書き込みキューは停止しています。")
+            item = self._pending.get(key)
+            if item is not None:
+                # 未処理の同じキーは最新の内容にまとめる（チケットは共有）
+                item.func, item.args, item.on_commit = func, args, on_commit
+                return item.ticket
+
+            while len(self._pending) >= self.maxsize and not self._closed:
+                self._cond.wait()
+            item = _WriteItem(func, args, on_commit)
+            self._pending[key] = item
+            self._cond.notify_all()
+            return item.ticket
+
+    def pending_args(self, key):
+        """ まだ書き込まれていない依頼の引数を返す（読み込み時に最新の内容を見せるため） """
+        with self._cond:
+            item = self._pending.get(key)
+            if item is None:
+                item = next((i for k, i in self._in_flight if k == key), None)
+            return item.args if item else None
+
+    def has_pending(self):
+        """ まだ終わっていない依頼があるか """
+        with self._cond:
+            return bool(self._pending or self._in_flight)
+
+    def flush(self, timeout=None):
+        """ 現時点で依頼済みの書き込みが全て終わるまで待つ
+
+        失敗した依頼（版の衝突など）の例外は送出せず、それぞれの WriteTicket で受け取る。
+        """
+        with self._cond:
+            tickets = [i.ticket for i in self._pending.values()] + [i.ticket for _, i in self._in_flight]
+        for ticket in tickets:
+            if not ticket._event.wait(timeout):
+                return False
+        return True
+
+    def shutdown(self, timeout=None):
+        """ 残りの依頼を書き込んでから書き込みスレッドを止める """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popitem(last=False))
+            self._in_flight = batch
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                with self.db.transaction():
+                    for _, item in batch:
+                        item.func(*item.args)
+            except Exception:
+                # まとめて書けなかった場合は1件ずつ書き直し、失敗した依頼だけにエラーを返す
+                for _, item in batch:
+                    self._write_one(item)
+            else:
+                for _, item in batch:
+                    self._commit_done(item)
+            with self._cond:
+                self._in_flight = []
+
+    def _write_one(self, item):
+        try:
+            with self.db.transaction():
+                item.func(*item.args)
+        except Exception as e:
+            item.ticket._finish(e)
+        else:
+            self._commit_done(item)
+
+    def _commit_done(self, item):
+        if item.on_commit:
+            try:
+                item.on_commit()
+            except Exception as e:
+                item.ticket._finish(e)
+                return
+        item.ticket._finish()
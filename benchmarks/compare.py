@@ -0,0 +1,39 @@
+import argparse
+import json
+
+
+def compare(old, new, threshold=1.2):
+    """ 2つのベンチマーク結果の中央値を比べ、(名前, 旧, 新, 比率, 劣化したか) を返す """
+    rows = []
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            continue
+        ratio = result["median"] / before["median"] if before["median"] else float("inf")
+        rows.append((name, before["median"], result["median"], ratio, ratio > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマーク結果（JSON）の比較")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.2, help="この比率より遅くなったら劣化とみなす")
+    args = parser.parse_args(argv)
+
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    rows = compare(old, new, args.threshold)
+    print(json.dumps([
+        {"name": n, "old_median": o, "new_median": m, "ratio": round(r, 3), "regressed": bad}
+        for n, o, m, r, bad in rows
+    ], ensure_ascii=False, indent=2))
+    # 劣化があれば終了コード 1（CI で使う想定）
+    return 1 if any(bad for *_, bad in rows) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
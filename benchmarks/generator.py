@@ -0,0 +1,96 @@
+import csv
+import io
+import random
+
+from core.backends import open_storage
+
+# 合成原稿の文章に使う語彙
+_SUBJECTS = ["勇者アルス", "魔法使いリナ", "老騎士", "少年", "王女", "旅の商人", "黒衣の男", "村の長老"]
+_PLACES = ["王都メルキド", "霧の森", "古い礼拝堂", "港町", "北の砦", "宿屋の二階", "地下水路", "丘の上"]
+_ACTIONS = [
+    "静かに剣を抜いた", "遠くの空を見上げた", "小さくため息をついた", "地図を広げた",
+    "扉の向こうに耳を澄ませた", "古い手紙を読み返した", "焚き火に薪をくべた", "足を止めた",
+]
+_CLAUSES = ["その夜、", "しかし、", "やがて、", "ふと、", "翌朝、", "気がつくと、", ""]
+_ROLES = ["主人公", "ヒロイン", "ライバル", "師匠", "村人", "敵幹部"]
+
+
+class ManuscriptGenerator:
+    """ ベンチマーク用の合成データベースを作る（乱数シード固定で再現可能） """
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def sentence(self):
+        r = self.random
+        return f"{r.choice(_CLAUSES)}{r.choice(_SUBJECTS)}は{r.choice(_PLACES)}で{r.choice(_ACTIONS)}。"
+
+    def text(self, length):
+        """ 約 length 文字の本文（数文ごとに改行を入れる） """
+        parts, size = [], 0
+        while size < length:
+            line = "".join(self.sentence() for _ in range(self.random.randint(2, 5))) + "\n"
+            parts.append(line)
+            size += len(line)
+        return "".join(parts)[:length]
+
+    def block_rows(self, project_id, count, mix):
+        """ mix（block_type → 比率）に従って blocks テーブルの行を作る """
+        types = list(mix)
+        weights = [mix[t] for t in types]
+        for _ in range(count):
+            b_type = self.random.choices(types, weights)[0]
+            content = self.text(self.random.randint(20, 200))
+            if b_type == "todo":
+                yield ("todo", content, project_id, self.random.randint(0, 1), None, None, None)
+            elif b_type == "character":
+                name = self.random.choice(_SUBJECTS) + str(self.random.randint(1, 999))
+                yield ("character", content, project_id, 0, name, self.random.choice(_ROLES), None)
+            elif b_type == "world":
+                yield ("world", content, project_id, 0, None, None, self.random.choice(_PLACES))
+            elif b_type == "story":
+                yield ("story", content, project_id, 0, f"プロット{self.random.randint(1, 99)}", None, None)
+            else:
+                yield ("text", content, project_id, 0, None, None, None)
+
+    def build(self, db_path, projects=2, chapters=10, episodes=10, episode_length=5000,
+              blocks=200, block_mix=None, compression=None, backend="sqlite"):
+        """ 合成データベースを作成して保存先（StorageBackend）を返す """
+        mix = block_mix or {"text": 3, "todo": 2, "character": 2, "world": 2, "story": 1}
+        db = open_storage(backend, db_path, compression=compression)
+        for p in range(projects):
+            project_id = db.save_project(f"合成作品{p + 1}")
+            with db.transaction(project_id) as conn:
+                db.save_blocks_bulk(conn, list(self.block_rows(project_id, blocks, mix)))
+                db.save_chapters_bulk(conn, project_id, [f"第{c + 1}章" for c in range(chapters)])
+                chapter_ids = db.fetch_chapter_ids(conn, project_id)
+                for c in range(chapters):
+                    db.save_episodes_bulk(conn, [
+                        (chapter_ids[f"第{c + 1}章"], f"第{e + 1}話", self.text(episode_length))
+                        for e in range(episodes)
+                    ])
+                db.rebuild_appearances(project_id)
+        return db
+
+    def csv_bytes(self, rows):
+        """ import_from_csv に渡せる CSV（BOM付き UTF-8）を作る """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["タイプ", "内容", "完了/名前", "役割/場所"])
+        class_names = {"text": "TextBlock", "todo": "TodoBlock", "character": "CharacterBlock",
+                       "world": "WorldSettingBlock", "story": "StoryBlock"}
+        for b_type, content, _, is_done, name, role, location in self.block_rows(None, rows, {
+            "text": 3, "todo": 2, "character": 2, "world": 2, "story": 1,
+        }):
+            if b_type == "todo":
+                val1, val2 = ("完了" if is_done else "未完了"), ""
+            elif b_type == "character":
+                val1, val2 = name, role
+            elif b_type == "world":
+                val1, val2 = location, ""
+            elif b_type == "story":
+                val1, val2 = name, ""
+            else:
+                val1, val2 = "", ""
+            writer.writerow([class_names[b_type], content, val1, val2])
+        return output.getvalue().encode("utf-8-sig")
@@ -0,0 +1,177 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from app.controller import BLOCK_PAGE_SIZE, BLOCK_TABS, NotionController
+from benchmarks.generator import ManuscriptGenerator
+from core.backends import BACKENDS
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func, repeat, setup=None):
+    """ func を repeat 回実行し、所要時間（秒）の統計を返す """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "max": max(times),
+    }
+
+
+def export_once(controller, project_id, project_title, file_format):
+    """ 書き出しを1回行い、一時ファイルを閉じる """
+    data, _, _ = controller.get_export_data(project_id, project_title, file_format)
+    data.close()
+
+
+def simulate_render_pass(controller, project_id, project_title):
+    """ NotionUI.render_app が1回の再実行で行うデータ読み込みを、Streamlit なしで再現する """
+    controller.get_project()
+    chapters = controller.get_chapters(project_id)
+    if chapters:
+        episodes = controller.get_episode_list(chapters[0][0])
+        if episodes:
+            controller.get_episode_body(episodes[0][0])
+            controller.get_revisions(episodes[0][0])
+    # 設定・メモ一覧はタブごとの件数と1ページ目だけを読む
+    for _, block_types in BLOCK_TABS:
+        controller.count_blocks(project_id, block_types)
+        controller.get_block_page(project_id, block_types, limit=BLOCK_PAGE_SIZE)
+
+
+def run_benchmarks(db_path, params, repeat=5):
+    """ 合成データベースを作り、主要な処理の所要時間を計測する """
+    generator = ManuscriptGenerator(seed=params.get("seed", 0))
+    start = time.perf_counter()
+    db = generator.build(
+        db_path, projects=params["projects"], chapters=params["chapters"], episodes=params["episodes"],
+        episode_length=params["episode_length"], blocks=params["blocks"], compression=params.get("compression"),
+        backend=params.get("backend", "sqlite"),
+    )
+    build_seconds = time.perf_counter() - start
+
+    controller = NotionController(db)
+    project_id, project_title = controller.get_project()[0]
+    chapter_id = controller.get_chapters(project_id)[0][0]
+    episode_id = controller.get_episode_list(chapter_id)[0][0]
+
+    def cold():
+        controller.cache.clear()
+        controller.exports.clear()
+
+    results = {
+        "db.fetch_all_projects": measure(db.fetch_all_projects, repeat),
+        "db.fetch_blocks_by_project": measure(lambda: db.fetch_blocks_by_project(project_id), repeat),
+        "db.fetch_chapters_by_project": measure(lambda: db.fetch_chapters_by_project(project_id), repeat),
+        "db.fetch_episodes_by_chapter": measure(lambda: db.fetch_episodes_by_chapter(chapter_id), repeat),
+        "db.fetch_episode_list": measure(lambda: db.fetch_episode_list(chapter_id), repeat),
+        "db.fetch_episode_body": measure(lambda: db.fetch_episode_body(episode_id), repeat),
+        "db.search": measure(lambda: db.search(project_id, "王都メルキド"), repeat),
+        "controller.get_blocks_by_project[cold]": measure(
+            lambda: controller.get_blocks_by_project(project_id), repeat, setup=cold),
+        "db.fetch_blocks_page": measure(
+            lambda: db.fetch_blocks_page(project_id, ("text", "todo"), limit=BLOCK_PAGE_SIZE), repeat),
+        "controller.get_export_data[txt,cold]": measure(
+            lambda: export_once(controller, project_id, project_title, "Text (.txt)"), repeat, setup=cold),
+        "controller.get_export_data[csv,cold]": measure(
+            lambda: export_once(controller, project_id, project_title, "CSV (.csv)"), repeat, setup=cold),
+        "controller.get_export_data[md,cold]": measure(
+            lambda: export_once(controller, project_id, project_title, "Markdown (.md)"), repeat, setup=cold),
+        "controller.get_export_data[epub,cold]": measure(
+            lambda: export_once(controller, project_id, project_title, "EPUB (.epub)"), repeat, setup=cold),
+        # 作品が変わっていなければ作成済みのファイルを開くだけ
+        "controller.get_export_data[txt,warm]": measure(
+            lambda: export_once(controller, project_id, project_title, "Text (.txt)"), repeat),
+        "render_pass[cold]": measure(
+            lambda: simulate_render_pass(controller, project_id, project_title), repeat, setup=cold),
+        "render_pass[warm]": measure(
+            lambda: simulate_render_pass(controller, project_id, project_title), repeat),
+    }
+
+    csv_data = generator.csv_bytes(params["import_rows"])
+    import_project = controller.add_project("インポート先")
+    results["controller.import_from_csv"] = measure(
+        lambda: controller.import_from_csv(import_project, io.BytesIO(csv_data)), max(1, repeat // 2))
+
+    controller.close()
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "params": params,
+        "build_seconds": build_seconds,
+        "db_bytes": _storage_bytes(db_path, params.get("backend", "sqlite")),
+        "results": results,
+    }
+
+
+def _storage_bytes(path, backend):
+    """ 保存先のファイルの合計サイズ（メモリ上なら None） """
+    if backend == "memory":
+        return None
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成原稿を使ったベンチマーク")
+    parser.add_argument("--projects", type=int, default=2)
+    parser.add_argument("--chapters", type=int, default=10, help="作品あたりの章数")
+    parser.add_argument("--episodes", type=int, default=10, help="章あたりの話数")
+    parser.add_argument("--episode-length", type=int, default=5000, help="1話あたりの文字数")
+    parser.add_argument("--blocks", type=int, default=500, help="作品あたりの設定ブロック数")
+    parser.add_argument("--import-rows", type=int, default=5000)
+    parser.add_argument("--compression", choices=["zlib", "zstd"], default=None)
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite",
+                        help="保存先（sharded の場合 --db はフォルダ）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="データベースの作成先（省略すると一時ファイル）")
+    parser.add_argument("--out", help="結果の JSON を書き出すファイル（省略すると標準出力）")
+    args = parser.parse_args(argv)
+
+    params = {
+        "projects": args.projects, "chapters": args.chapters, "episodes": args.episodes,
+        "episode_length": args.episode_length, "blocks": args.blocks, "import_rows": args.import_rows,
+        "compression": args.compression, "seed": args.seed, "backend": args.backend,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "bench" if args.backend == "sharded" else "bench.db")
+        report = run_benchmarks(db_path, params, repeat=args.repeat)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from app.controller import NotionController
+from core.backends import BACKENDS, open_storage
+from core.storage import VersionConflict
+
+
+# 衝突のやり直しがこの回数を超えたら、読み直しても最新にならない（キャッシュの無効化漏れ）とみなす
+MAX_RETRIES = 1000
+
+
+class _Worker:
+    """ 1つの画面（セッション）を模したスレッド。コントローラ経由で 読み込み → 変更 → 版を指定して保存 を繰り返す
+
+    ブロックは書き込みキュー（update_block_async）で、話は EditSession を使い、
+    書き込みキュー（save_episode_async）と即時保存（update_episode）を交互に使う。
+    """
+
+    def __init__(self, controller, worker_id, ops, project_id, block_id, episode_id):
+        self.controller = controller
+        self.worker_id = worker_id
+        self.ops = ops
+        self.project_id = project_id
+        self.block_id = block_id
+        self.episode_id = episode_id
+        self.conflicts = 0
+        self.errors = []
+
+    def run(self, barrier):
+        barrier.wait()
+        try:
+            content, edit = self.controller.open_episode(self.episode_id)
+            for i in range(self.ops):
+                self._increment_counter()
+                content, edit = self._append_line(content, edit, f"{self.worker_id}-{i}", queued=i % 2 == 0)
+            self.controller.close_edit(edit)
+        except Exception as e:
+            # ロック待ちのやり直しを使い切った場合や、やり直しが終わらない場合
+            self.errors.append(f"{type(e).__name__}: {e}")
+
+    def _retry(self):
+        self.conflicts += 1
+        if self.conflicts > MAX_RETRIES * self.ops:
+            raise RuntimeError("衝突のやり直しが終わりません（読み直しても最新の版になりません）。")
+
+    def _increment_counter(self):
+        """ カウンタのブロックに1を足す（衝突したらコントローラから読み直してやり直す） """
+        while True:
+            block = next(b for b in self.controller.get_blocks_by_project(self.project_id) if b.id == self.block_id)
+            ticket = self.controller.update_block_async(
+                self.block_id, str(int(block.content) + 1), expected_version=block.version
+            )
+            try:
+                ticket.wait()
+                return
+            except VersionConflict:
+                self._retry()
+
+    def _append_line(self, content, edit, line, queued):
+        """ 話の本文の末尾に1行足し、(本文, EditSession) を返す（衝突したら開き直してやり直す） """
+        while True:
+            text = f"{content}\n{line}" if content else line
+            try:
+                if queued:
+                    self.controller.save_episode_async(self.episode_id, "stress", text, edit).wait()
+                else:
+                    self.controller.update_episode(self.episode_id, "stress", text, edit=edit)
+                return text, edit
+            except VersionConflict:
+                self._retry()
+                content, edit = self.controller.open_episode(self.episode_id, previous=edit)
+
+
+def run_stress(db, threads=8, ops=50):
+    """ threads 個のスレッドからコントローラ経由で同じブロックと話を同時に更新し、更新が失われていないか確かめる """
+    controller = NotionController(db)
+    project_id = controller.add_project("stress")
+    controller.add_text_block(project_id, "0")
+    block_id = controller.get_blocks_by_project(project_id)[0].id
+    controller.add_chapter(project_id, "stress")
+    chapter_id = controller.get_chapters(project_id)[0][0]
+    controller.add_episode(chapter_id, "stress", "")
+    episode_id = controller.get_episode_list(chapter_id)[0][0]
+    _, start_edit = controller.open_episode(episode_id)
+    block_version = controller.get_blocks_by_project(project_id)[0].version
+
+    workers = [_Worker(controller, n, ops, project_id, block_id, episode_id) for n in range(threads)]
+    barrier = threading.Barrier(threads)
+    pool = [threading.Thread(target=w.run, args=(barrier,)) for w in workers]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    controller.flush_writes()
+
+    expected = threads * ops
+    # 結果はコントローラ（キャッシュ経由）から読む。無効化が漏れていれば古い値が返って失敗する
+    block = controller.get_blocks_by_project(project_id)[0]
+    body = controller.get_episode_body(episode_id) or ""
+    _, end_edit = controller.open_episode(episode_id)
+    lines = body.split("\n")
+    wanted = {f"{w}-{i}" for w in range(threads) for i in range(ops)}
+    chars = controller.get_project_stats(project_id)[2]
+    errors = [e for w in workers for e in w.errors]
+    checks = {
+        "counter": int(block.content) == expected,
+        "block_version": block.version == block_version + expected,
+        "lines_unique": len(lines) == len(set(lines)) == expected,
+        "lines_complete": set(lines) == wanted,
+        "episode_version": end_edit.version == start_edit.version + expected,
+        "stats": chars == len(body),
+        "no_errors": not errors,
+    }
+    controller.writer.shutdown()
+    return {
+        "threads": threads,
+        "ops_per_thread": ops,
+        "elapsed": elapsed,
+        # カウンタの加算と本文の追記をそれぞれ1回と数える
+        "ops_per_sec": expected * 2 / elapsed if elapsed else None,
+        "conflicts": sum(w.conflicts for w in workers),
+        "counter": int(block.content),
+        "lines": len(lines),
+        "errors": errors[:10],
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="複数セッションからの同時編集のスループットを計測する（正しさの確認は tests/test_concurrency.py）")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=50, help="スレッドあたりの更新回数")
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite",
+                        help="保存先（sharded の場合 --db はフォルダ）")
+    parser.add_argument("--db", help="データベースの作成先（省略すると一時ファイル）")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "stress" if args.backend == "sharded" else "stress.db")
+        db = open_storage(args.backend, None if args.backend == "memory" else path)
+        try:
+            report = run_stress(db, threads=args.threads, ops=args.ops)
+        finally:
+            db.close()
+
+    report["backend"] = args.backend
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
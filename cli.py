@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from app.controller import NotionController
+from core.backends import BACKENDS, open_storage
+
+# Streamlit を使わずに、インポート・書き出し・統計・メンテナンスを行うコマンドライン
+# 例: python cli.py export --format txt,csv --out exports/
+
+
+def _open_controller(args):
+    """ --backend / --db（省略時は環境変数 NOTION_APP_STORAGE / NOTION_APP_DATA）の保存先を開く """
+    kind = args.backend or os.environ.get("NOTION_APP_STORAGE") or "sqlite"
+    path = args.db or os.environ.get("NOTION_APP_DATA")
+    return NotionController(open_storage(kind, None if kind == "memory" else path))
+
+
+def _select_projects(controller, project_ids):
+    """ 指定された作品の (id, title) を返す（省略すると全ての作品） """
+    projects = controller.get_project()
+    if not project_ids:
+        return projects
+    titles = dict(projects)
+    missing = [pid for pid in project_ids if pid not in titles]
+    if missing:
+        raise SystemExit(f"作品がありません: {', '.join(map(str, missing))}")
+    return [(pid, titles[pid]) for pid in project_ids]
+
+
+def cmd_projects(controller, args):
+    projects = [{"id": pid, "title": title} for pid, title in controller.get_project()]
+    return {"projects": projects}, True
+
+
+def cmd_import(controller, args):
+    """ CSV を1ファイルずつ少しずつ読み込む（--project を省略するとファイル名の作品を作る） """
+    results = []
+    for path in args.files:
+        start = time.perf_counter()
+        entry = {"file": path}
+        try:
+            project_id = args.project or controller.add_project(os.path.splitext(os.path.basename(path))[0])
+            with open(path, "rb") as f:
+                result = controller.import_from_csv(project_id, f)
+        except Exception as e:
+            # 失敗したファイルはロールバックされるので、残りのファイルを続ける
+            entry["error"] = str(e)
+        else:
+            entry.update(
+                project_id=project_id, rows=result.rows_read, blocks=result.blocks,
+                chapters=result.chapters, episodes=result.episodes, skipped=result.skipped,
+            )
+        entry["elapsed"] = time.perf_counter() - start
+        results.append(entry)
+    return {"imports": results}, all("error" not in r for r in results)
+
+
+def cmd_export(controller, args):
+    """ 作品ごと・形式ごとに out/project_<ID>.<拡張子> に書き出す """
+    from app.exporter import EXPORT_FORMATS
+
+    by_ext = {ext: label for label, (ext, _) in EXPORT_FORMATS.items()}
+    formats = [f.strip() for f in args.format.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in by_ext]
+    if unknown:
+        raise SystemExit(f"未対応の形式です: {', '.join(unknown)}（{', '.join(by_ext)} から選んでください）")
+
+    os.makedirs(args.out, exist_ok=True)
+    results = []
+    for project_id, title in _select_projects(controller, args.project):
+        for ext in formats:
+            start = time.perf_counter()
+            path = os.path.join(args.out, f"project_{project_id}.{ext}")
+            controller.export_to_file(project_id, title, by_ext[ext], path)
+            results.append({
+                "project_id": project_id, "title": title, "format": ext, "path": path,
+                "bytes": os.path.getsize(path), "elapsed": time.perf_counter() - start,
+            })
+    return {"exports": results}, True
+
+
+def cmd_stats(controller, args):
+    results = []
+    for project_id, title in _select_projects(controller, args.project):
+        chapters, episodes, chars, lines = controller.get_project_stats(project_id)
+        entry = {
+            "project_id": project_id, "title": title,
+            "chapters": chapters, "episodes": episodes, "chars": chars, "lines": lines,
+        }
+        if args.chapters:
+            entry["chapter_stats"] = [
+                {"chapter_id": ch_id, "title": ch_title, "episodes": n, "chars": c, "lines": l}
+                for ch_id, ch_title, n, c, l in controller.get_chapter_stats(project_id)
+            ]
+        if args.days:
+            entry["daily"] = [
+                {"day": day, "added": added, "removed": removed}
+                for day, added, removed in controller.get_daily_stats(project_id, args.days)
+            ]
+        results.append(entry)
+    return {"stats": results}, True
+
+
+def cmd_maintenance(controller, args):
+    """ 集計の作り直し・integrity_check・ANALYZE・VACUUM（何も指定しなければ integrity_check だけ） """
+    check = args.check or not (args.vacuum or args.analyze or args.rebuild_stats)
+    report = {}
+    if args.rebuild_stats:
+        start = time.perf_counter()
+        controller.rebuild_statistics()
+        report["rebuild_stats"] = time.perf_counter() - start
+    start = time.perf_counter()
+    report["databases"] = controller.db.run_maintenance(
+        vacuum=args.vacuum, analyze=args.analyze, integrity_check=check,
+    )
+    report["elapsed"] = time.perf_counter() - start
+    ok = all(r.get("integrity_check", "ok") == "ok" for r in report["databases"].values())
+    return report, ok
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Creative Manager のコマンドライン（結果は JSON で出力）")
+    parser.add_argument("--backend", choices=BACKENDS, help="保存先（既定は NOTION_APP_STORAGE または sqlite）")
+    parser.add_argument("--db", help="データベースのファイル（sharded の場合はフォルダ）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("projects", help="作品の一覧")
+    p.set_defaults(func=cmd_projects)
+
+    p = commands.add_parser("import", help="CSV を読み込む")
+    p.add_argument("files", nargs="+", help="CSV ファイル（複数可）")
+    p.add_argument("--project", type=int, help="読み込み先の作品ID（省略するとファイルごとに作品を作る）")
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser("export", help="作品を書き出す")
+    p.add_argument("--project", type=int, action="append", help="作品ID（複数指定可。省略すると全て）")
+    p.add_argument("--format", default="txt", help="txt・csv・md・epub をカンマ区切りで")
+    p.add_argument("--out", required=True, help="書き出し先のフォルダ")
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser("stats", help="作品の集計")
+    p.add_argument("--project", type=int, action="append", help="作品ID（複数指定可。省略すると全て）")
+    p.add_argument("--chapters", action="store_true", help="章ごとの集計も出力する")
+    p.add_argument("--days", type=int, default=0, help="直近 N 日の執筆量も出力する")
+    p.set_defaults(func=cmd_stats)
+
+    p = commands.add_parser("maintenance", help="データベースの確認・最適化")
+    p.add_argument("--check", action="store_true", help="integrity_check")
+    p.add_argument("--analyze", action="store_true", help="ANALYZE")
+    p.add_argument("--vacuum", action="store_true", help="VACUUM")
+    p.add_argument("--rebuild-stats", action="store_true", help="集計を本文から作り直す")
+    p.set_defaults(func=cmd_maintenance)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    controller = _open_controller(args)
+    try:
+        report, ok = args.func(controller, args)
+    finally:
+        controller.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    # 失敗（読み込みエラー・integrity_check の異常）があれば終了コード 1
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
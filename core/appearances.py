@@ -0,0 +1,168 @@
+import threading
+from collections import deque
+
+from core.compression import decompress_text
+
+# 登場話の索引に使うブロックの種類と、語として使うカラム
+TERM_COLUMNS = {"character": "name", "world": "location"}
+
+
+class TermMatcher:
+    """ 複数の語（キャラ名・地名）を本文から1回の走査で探す Aho-Corasick オートマトン
+
+    terms は (ブロックID, 語) の一覧。同じ語を持つブロックが複数あれば、それぞれの出現として数える。
+    """
+
+    def __init__(self, terms):
+        self.patterns = []
+        # パターン番号 → その語を持つブロックIDの一覧
+        self.owners = []
+        index_of = {}
+        for block_id, term in terms:
+            if not term:
+                continue
+            index = index_of.get(term)
+            if index is None:
+                index = index_of[term] = len(self.patterns)
+                self.patterns.append(term)
+                self.owners.append([])
+            self.owners[index].append(block_id)
+        self._build()
+
+    def _build(self):
+        goto, fail, out = [{}], [0], [[]]
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    out.append([])
+                node = nxt
+            out[node].append(index)
+
+        # 浅いノードから順に、一致に失敗したときの戻り先を決める
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                # 戻り先で終わる語（長い語の末尾に含まれる短い語）も、このノードで見つかったことにする
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self._goto, self._fail, self._out = goto, fail, out
+
+    def scan(self, text):
+        """ 本文を1回走査し、{パターン番号: [出現回数, 最初の位置]} を返す（重なった出現も数える） """
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        hits = {}
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                hit = hits.get(index)
+                if hit is None:
+                    hits[index] = [1, pos - len(patterns[index]) + 1]
+                else:
+                    hit[0] += 1
+        return hits
+
+    def appearance_rows(self, episode_id, text):
+        """ 本文の出現を appearances テーブルの行 (block_id, episode_id, count, first_offset) にする """
+        if not self.patterns or not text:
+            return []
+        return [
+            (block_id, episode_id, count, first)
+            for index, (count, first) in self.scan(text).items()
+            for block_id in self.owners[index]
+        ]
+
+
+def count_term(text, term):
+    """ 1つの語の (出現回数, 最初の位置) を返す（TermMatcher と同じく重なった出現も数える） """
+    first = pos = text.find(term)
+    count = 0
+    while pos != -1:
+        count += 1
+        pos = text.find(term, pos + 1)
+    return count, first
+
+
+def fetch_terms(conn, project_id):
+    """ 作品のキャラ名・地名を (ブロックID, 語) の一覧で返す """
+    return conn.execute("""
+    SELECT id, CASE block_type WHEN 'character' THEN name ELSE location END
+    FROM blocks WHERE project_id = ? AND block_type IN ('character', 'world')
+    ORDER BY id
+    """, (project_id,)).fetchall()
+
+
+def _iter_project_bodies(conn, project_id):
+    """ 作品の全ての話の (episode_id, 本文) を返す """
+    cursor = conn.execute("""
+    SELECT e.id, e.content, e.codec FROM episodes e JOIN chapters c ON c.id = e.chapter_id
+    WHERE c.project_id = ?
+    """, (project_id,))
+    for episode_id, content, codec in cursor:
+        yield episode_id, decompress_text(content, codec)
+
+
+_INSERT = "INSERT OR REPLACE INTO appearances (block_id, episode_id, count, first_offset) VALUES (?, ?, ?, ?)"
+
+
+def index_episode(conn, matcher, episode_id, text):
+    """ 1話分の出現を数え直す（話を保存したとき） """
+    conn.execute("DELETE FROM appearances WHERE episode_id = ?", (episode_id,))
+    conn.executemany(_INSERT, matcher.appearance_rows(episode_id, text))
+
+
+def index_term(conn, project_id, block_id, term):
+    """ 1つのブロックの語の出現を、作品の全ての話について数え直す（名前を変えたとき） """
+    conn.execute("DELETE FROM appearances WHERE block_id = ?", (block_id,))
+    if not term:
+        return
+    rows = []
+    for episode_id, text in _iter_project_bodies(conn, project_id):
+        count, first = count_term(text, term)
+        if count:
+            rows.append((block_id, episode_id, count, first))
+    conn.executemany(_INSERT, rows)
+
+
+def rebuild(conn, project_id):
+    """ 作品の索引を作り直す（話ごとに全ての語を1回の走査で数える） """
+    conn.execute("""
+    DELETE FROM appearances WHERE block_id IN (SELECT id FROM blocks WHERE project_id = ?)
+    """, (project_id,))
+    matcher = TermMatcher(fetch_terms(conn, project_id))
+    if not matcher.patterns:
+        return
+    for episode_id, text in _iter_project_bodies(conn, project_id):
+        conn.executemany(_INSERT, matcher.appearance_rows(episode_id, text))
+
+
+class MatcherCache:
+    """ 作品ごとの TermMatcher を、語の一覧が変わるまで使い回す """
+
+    def __init__(self):
+        self._matchers = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn, project_id):
+        terms = tuple(fetch_terms(conn, project_id))
+        with self._lock:
+            entry = self._matchers.get(project_id)
+            if entry is not None and entry[0] == terms:
+                return entry[1]
+        matcher = TermMatcher(terms)
+        with self._lock:
+            self._matchers[project_id] = (terms, matcher)
+        return matcher
@@ -0,0 +1,440 @@
+import glob
+import os
+import re
+import shutil
+import threading
+from contextlib import ExitStack, contextmanager
+
+from core.connection import ConnectionManager, SingleConnectionManager, backup_into, maintain, restore_into
+from core.database import DatabaseManager
+from core.storage import StorageBackend
+
+# シャードごとに割り当てる ID の範囲。ブロック・章・話の ID の上位ビットが作品 ID になる
+SHARD_ID_BITS = 32
+# ID を持つテーブル（シャードを作るときに AUTOINCREMENT の開始値をずらす）
+_SHARDED_TABLES = ("blocks", "chapters", "episodes", "episode_revisions")
+
+
+# シャードのファイル名から作品IDを取り出す
+_SHARD_FILE = re.compile(r"project_(\d+)\.db$")
+
+
+def shard_of(row_id):
+    """ ブロック・章・話の ID から、それを保存している作品の ID を求める """
+    return int(row_id) >> SHARD_ID_BITS
+
+
+class MemoryBackend(DatabaseManager):
+    """ メモリ上の SQLite に保存する（テストやベンチマーク用。close するとデータは消える） """
+    connection_class = SingleConnectionManager
+
+    def __init__(self, pragmas=None, compression=None):
+        # 1本の接続を全スレッドで共有するので、トランザクションの間は他のスレッドを待たせる
+        self._lock = threading.RLock()
+        super().__init__(":memory:", pragmas=pragmas, compression=compression)
+
+    @contextmanager
+    def transaction(self, project_id=None):
+        with self._lock, super().transaction(project_id) as conn:
+            yield conn
+
+    @contextmanager
+    def _session(self):
+        with self._lock, super()._session() as conn:
+            yield conn
+
+    # _session を通らずに接続を使うメソッドも、使い終わるまでロックを持つ
+    def _initialize_db(self):
+        with self._lock:
+            super()._initialize_db()
+
+    def iter_blocks_by_project(self, project_id, batch_size=500):
+        """ 読み終わる（またはジェネレータを閉じる）まで、他のスレッドは接続を使えない """
+        with self._lock:
+            yield from super().iter_blocks_by_project(project_id, batch_size)
+
+    def iter_episodes_by_project(self, project_id, batch_size=100):
+        with self._lock:
+            yield from super().iter_episodes_by_project(project_id, batch_size)
+
+
+class _Catalog:
+    """ 作品の一覧（ID とタイトル）だけを持つ小さなデータベース """
+
+    def __init__(self, path, pragmas=None, read_only=False):
+        self._connections = ConnectionManager(path, pragmas=pragmas, read_only=read_only)
+        if not read_only:
+            with self._connections.get() as conn:
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """)
+
+    def add(self, title):
+        with self._connections.get() as conn:
+            return conn.execute("INSERT INTO projects (title) VALUES (?)", (title,)).lastrowid
+
+    def remove(self, project_id):
+        with self._connections.get() as conn:
+            conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+
+    def all(self):
+        with self._connections.get() as conn:
+            return conn.execute("SELECT id, title FROM projects ORDER BY created_at DESC").fetchall()
+
+    def backup(self, path, pages=-1, sleep=0.0):
+        return backup_into(self._connections.get(), path, pages, sleep)
+
+    def restore(self, path):
+        restore_into(self._connections.get(), path)
+
+    def maintain(self, vacuum=False, analyze=False, integrity_check=False):
+        return maintain(self._connections.get(), vacuum, analyze, integrity_check)
+
+    def reserve(self, project_id):
+        """ これから振る作品IDを project_id より大きくする（復元で一覧から外れた作品のファイルと重ならないように） """
+        with self._connections.get() as conn:
+            cursor = conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'projects'", (project_id,))
+            if cursor.rowcount == 0:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('projects', ?)", (project_id,))
+
+    def close(self):
+        self._connections.close_all()
+
+
+class _ShardedTransactionState(threading.local):
+    depth = 0
+    stack = None
+    # 作品ID → このトランザクションで BEGIN したシャードの接続
+    entered = None
+    # transaction(project_id) で指定された作品（一括書き込みの書き込み先）
+    primary = None
+
+
+class ShardedBackend(StorageBackend):
+    """ 作品ごとに1つの SQLite ファイルに保存し、作品の一覧は小さなカタログに持つ保存先
+
+    root/catalog.db と root/project_<作品ID>.db からなる。作品ごとに書き込みロックが分かれるので、
+    別の作品への書き込みは互いに待たない。ファイルは作品ごとに開いたり移動したりできる。
+    """
+
+    def __init__(self, root="data/shards", pragmas=None, compression=None, read_only=False):
+        self.root = root
+        self.pragmas = pragmas
+        self.compression = compression
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(root, exist_ok=True)
+        self._catalog = _Catalog(os.path.join(root, "catalog.db"), pragmas=pragmas, read_only=read_only)
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._tx = _ShardedTransactionState()
+
+    def read_only_spec(self):
+        return ShardedBackend, (self.root,), {"read_only": True}
+
+    # --- シャードの管理 ---
+    def shard_path(self, project_id):
+        return os.path.join(self.root, f"project_{int(project_id)}.db")
+
+    def _open(self, project_id):
+        """ 作品のシャードを開く（開いたものは使い回す） """
+        with self._lock:
+            db = self._shards.get(project_id)
+            if db is None:
+                path = self.shard_path(project_id)
+                if not os.path.exists(path):
+                    raise KeyError(f"作品 {project_id} のデータベースがありません: {path}")
+                db = self._shards[project_id] = DatabaseManager(
+                    path, pragmas=self.pragmas, compression=self.compression,
+                    read_only=self.read_only,
+                )
+            return db
+
+    def _create(self, project_id, title):
+        """ 新しい作品のシャードを作り、ID の開始値をその作品の範囲にずらす """
+        db = DatabaseManager(
+            self.shard_path(project_id), pragmas=self.pragmas, compression=self.compression,
+        )
+        base = project_id << SHARD_ID_BITS
+        with db.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO projects (id, title) VALUES (?, ?)", (project_id, title))
+            conn.executemany("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?1, ?2 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?1)
+            """, [(table, base) for table in _SHARDED_TABLES])
+        with self._lock:
+            self._shards[project_id] = db
+        return db
+
+    def _shard(self, project_id):
+        """ 作品のシャードを返す。transaction() の中なら、初めて使うシャードでトランザクションを始める """
+        if project_id is None:
+            raise ValueError("作品IDを指定してください。")
+        db = self._open(project_id)
+        tx = self._tx
+        if tx.depth and project_id not in tx.entered:
+            tx.entered[project_id] = tx.stack.enter_context(db.transaction())
+        return db
+
+    def _shard_of(self, row_id):
+        return self._shard(shard_of(row_id))
+
+    def detach(self, project_id):
+        """ 作品のシャードの接続を閉じる（ファイルを移動・バックアップする前などに使う） """
+        with self._lock:
+            db = self._shards.pop(project_id, None)
+        if db is not None:
+            db.close()
+
+    def _drop(self, project_id):
+        """ 作品をカタログから外し、シャードのファイルを削除する """
+        self._catalog.remove(project_id)
+        self.detach(project_id)
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.shard_path(project_id) + suffix)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self._lock:
+            shards, self._shards = list(self._shards.values()), {}
+        for db in shards:
+            db.close()
+        self._catalog.close()
+
+    @contextmanager
+    def transaction(self, project_id=None):
+        """ 複数の書き込みを、使ったシャードごとのトランザクションにまとめる
+
+        シャードをまたぐ書き込みは、シャードごとに順番に commit される（全体では不可分にならない）。
+        """
+        tx = self._tx
+        if tx.depth:
+            tx.depth += 1
+            try:
+                yield self._transaction_conn(project_id)
+            finally:
+                tx.depth -= 1
+            return
+
+        tx.depth, tx.entered = 1, {}
+        try:
+            with ExitStack() as stack:
+                tx.stack = stack
+                yield self._transaction_conn(project_id)
+        finally:
+            tx.depth, tx.entered, tx.stack, tx.primary = 0, None, None, None
+
+    def _transaction_conn(self, project_id):
+        if project_id is None:
+            return None
+        self._tx.primary = self._shard(project_id)
+        return self._tx.entered[project_id]
+
+    def _primary(self):
+        if self._tx.primary is None:
+            raise RuntimeError("一括書き込みは transaction(project_id) の中で行ってください。")
+        return self._tx.primary
+
+    # --- 作品 ---
+    def save_project(self, title):
+        project_id = self._catalog.add(title)
+        try:
+            self._create(project_id, title)
+        except Exception:
+            self._catalog.remove(project_id)
+            raise
+        return project_id
+
+    def fetch_all_projects(self):
+        return self._catalog.all()
+
+    def fetch_parent_id(self, table, row_id):
+        return self._shard_of(row_id).fetch_parent_id(table, row_id)
+
+    # --- ブロック ---
+    def save_block(self, block_type, content, project_id=None, is_done=0, name=None, role=None, location=None):
+        self._shard(project_id).save_block(block_type, content, project_id, is_done, name, role, location)
+
+    def update_block(self, block_id, content, expected_version=None, **kwargs):
+        return self._shard_of(block_id).update_block(block_id, content, expected_version, **kwargs)
+
+    def delete_block(self, block_id):
+        return self._shard_of(block_id).delete_block(block_id)
+
+    def fetch_blocks_by_project(self, project_id):
+        return self._shard(project_id).fetch_blocks_by_project(project_id)
+
+    def iter_blocks_by_project(self, project_id, batch_size=500):
+        return self._shard(project_id).iter_blocks_by_project(project_id, batch_size)
+
+    def fetch_blocks_page(self, project_id, block_types, after_id=None, limit=50):
+        return self._shard(project_id).fetch_blocks_page(project_id, block_types, after_id, limit)
+
+    def count_blocks(self, project_id, block_types):
+        return self._shard(project_id).count_blocks(project_id, block_types)
+
+    def fetch_all_blocks(self):
+        rows = []
+        for project_id, _ in self.fetch_all_projects():
+            rows.extend(self._shard(project_id).fetch_all_blocks())
+        return rows
+
+    # --- 章 ---
+    def save_chapter(self, project_id, title):
+        return self._shard(project_id).save_chapter(project_id, title)
+
+    def fetch_chapters_by_project(self, project_id):
+        return self._shard(project_id).fetch_chapters_by_project(project_id)
+
+    def update_chapter_title(self, chapter_id, title):
+        return self._shard_of(chapter_id).update_chapter_title(chapter_id, title)
+
+    def move_chapter(self, chapter_id, after_id=None):
+        return self._shard_of(chapter_id).move_chapter(chapter_id, after_id)
+
+    # --- 話 ---
+    def save_episode(self, chapter_id, title, content):
+        return self._shard_of(chapter_id).save_episode(chapter_id, title, content)
+
+    def fetch_episodes_by_chapter(self, chapter_id):
+        return self._shard_of(chapter_id).fetch_episodes_by_chapter(chapter_id)
+
+    def iter_episodes_by_project(self, project_id, batch_size=100):
+        return self._shard(project_id).iter_episodes_by_project(project_id, batch_size)
+
+    def fetch_episode_list(self, chapter_id):
+        return self._shard_of(chapter_id).fetch_episode_list(chapter_id)
+
+    def fetch_episode_body(self, episode_id):
+        return self._shard_of(episode_id).fetch_episode_body(episode_id)
+
+    def fetch_episode_for_edit(self, episode_id):
+        return self._shard_of(episode_id).fetch_episode_for_edit(episode_id)
+
+    def update_episode(self, episode_id, title, content, expected_version=None):
+        return self._shard_of(episode_id).update_episode(episode_id, title, content, expected_version)
+
+    def delete_episode(self, episode_id):
+        return self._shard_of(episode_id).delete_episode(episode_id)
+
+    def move_episode(self, episode_id, after_id=None):
+        return self._shard_of(episode_id).move_episode(episode_id, after_id)
+
+    def fetch_revisions(self, episode_id):
+        return self._shard_of(episode_id).fetch_revisions(episode_id)
+
+    def fetch_revision_text(self, episode_id, rev_no):
+        return self._shard_of(episode_id).fetch_revision_text(episode_id, rev_no)
+
+    # --- 一括書き込み ---
+    def save_blocks_bulk(self, conn, rows):
+        return self._primary().save_blocks_bulk(conn, rows)
+
+    def save_chapters_bulk(self, conn, project_id, titles):
+        return self._primary().save_chapters_bulk(conn, project_id, titles)
+
+    def save_episodes_bulk(self, conn, rows):
+        return self._primary().save_episodes_bulk(conn, rows)
+
+    def fetch_chapter_ids(self, conn, project_id):
+        return self._primary().fetch_chapter_ids(conn, project_id)
+
+    def load_snapshot_tables(self, conn, project_id, tables):
+        return self._primary().load_snapshot_tables(conn, project_id, tables)
+
+    # --- スナップショット ---
+    def fetch_snapshot_tables(self, project_id):
+        return self._shard(project_id).fetch_snapshot_tables(project_id)
+
+    def import_project_tables(self, title, tables):
+        """ 作品のシャードを作って読み込む（カタログとシャードは1つのトランザクションにできないので、失敗したら消す） """
+        project_id = self.save_project(title)
+        try:
+            with self.transaction(project_id) as conn:
+                self.load_snapshot_tables(conn, project_id, tables)
+        except BaseException:
+            self._drop(project_id)
+            raise
+        return project_id
+
+    # --- 登場話 ---
+    def fetch_appearances(self, block_id):
+        return self._shard_of(block_id).fetch_appearances(block_id)
+
+    def rebuild_appearances(self, project_id=None):
+        project_ids = [p for p, _ in self.fetch_all_projects()] if project_id is None else [project_id]
+        for pid in project_ids:
+            self._shard(pid).rebuild_appearances(pid)
+
+    # --- バックアップ ---
+    def backup_to(self, directory, pages=-1, sleep=0.0):
+        """ カタログと全ての作品のシャードを1ファイルずつコピーする（作品ごとに一貫した内容になる） """
+        files = {"catalog": self._catalog.backup(os.path.join(directory, "catalog.db"), pages, sleep)}
+        for project_id, _ in self._catalog.all():
+            files.update(self._open(project_id).backup_to(directory, pages, sleep, name=f"project_{project_id}"))
+        return files
+
+    def restore_from(self, files):
+        """ カタログと作品のシャードをバックアップの内容に戻す（バックアップより後に作った作品は一覧から外れる） """
+        if self.read_only:
+            raise RuntimeError("読み込み専用の保存先には復元できません。")
+        self._catalog.restore(files["catalog"])
+        for name, path in files.items():
+            if name == "catalog":
+                continue
+            project_id = int(name.rsplit("_", 1)[1])
+            if os.path.exists(self.shard_path(project_id)):
+                self._open(project_id).restore_from({"main": path})
+            else:
+                shutil.copyfile(path, self.shard_path(project_id))
+        # 一覧から外れた作品のファイルは残るので、新しい作品にその ID を振らない
+        existing = [int(m.group(1)) for m in map(_SHARD_FILE.search, glob.glob(os.path.join(self.root, "project_*.db"))) if m]
+        self._catalog.reserve(max(existing, default=0))
+
+    # --- メンテナンス ---
+    def run_maintenance(self, vacuum=False, analyze=False, integrity_check=False):
+        """ カタログと全ての作品のシャードを1ファイルずつ処理する """
+        results = {"catalog": self._catalog.maintain(vacuum, analyze, integrity_check)}
+        for project_id, _ in self._catalog.all():
+            results.update(self._open(project_id).run_maintenance(
+                vacuum, analyze, integrity_check, name=f"project_{project_id}",
+            ))
+        return results
+
+    # --- 統計・検索 ---
+    def rebuild_statistics(self, backfill_daily=False):
+        for project_id, _ in self.fetch_all_projects():
+            self._shard(project_id).rebuild_statistics(backfill_daily=backfill_daily)
+
+    def fetch_project_stats(self, project_id):
+        return self._shard(project_id).fetch_project_stats(project_id)
+
+    def fetch_chapter_stats(self, project_id):
+        return self._shard(project_id).fetch_chapter_stats(project_id)
+
+    def fetch_daily_stats(self, project_id, days=30):
+        return self._shard(project_id).fetch_daily_stats(project_id, days)
+
+    def search(self, project_id, query, limit=50):
+        return self._shard(project_id).search(project_id, query, limit=limit)
+
+
+# open_storage で選べる保存先
+BACKENDS = ("sqlite", "memory", "sharded")
+
+
+def open_storage(kind="sqlite", path=None, **kwargs):
+    """ 保存先を種類で選んで開く（path は sqlite ならファイル、sharded ならフォルダ） """
+    if kind == "sqlite":
+        return DatabaseManager(path or "data/notion_app.db", **kwargs)
+    if kind == "memory":
+        return MemoryBackend(**kwargs)
+    if kind == "sharded":
+        return ShardedBackend(path or "data/shards", **kwargs)
+    raise ValueError(f"不明な保存先です: {kind}")
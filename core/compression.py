@@ -0,0 +1,59 @@
+import zlib
+from functools import lru_cache
+
+# これより短い本文は圧縮しても小さくならないのでそのまま保存する
+MIN_COMPRESS_LENGTH = 1024
+
+CODECS = ("zlib", "zstd")
+
+
+@lru_cache(maxsize=None)
+def _zstandard():
+    """ zstandard はインストールされている場合のみ、初めて使うときに読み込む（なければ None） """
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def available_codec(codec):
+    """ 指定された圧縮方式が使えなければ zlib に置き換える """
+    if codec == "zstd" and _zstandard() is None:
+        return "zlib"
+    return codec
+
+
+def compress_text(text, codec):
+    """ 本文を圧縮して (保存する値, 圧縮方式) を返す。圧縮しない場合の方式は None """
+    if not codec or text is None or len(text) < MIN_COMPRESS_LENGTH:
+        return text, None
+
+    codec = available_codec(codec)
+    raw = text.encode("utf-8")
+    if codec == "zstd":
+        return _zstandard().ZstdCompressor(level=3).compress(raw), codec
+    return zlib.compress(raw, 6), "zlib"
+
+
+def decompress_text(value, codec):
+    """ compress_text で保存した値を元の文字列に戻す """
+    if codec is None or value is None:
+        return value
+    if codec == "zstd":
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError("zstd で圧縮された本文を読むには zstandard が必要です。")
+        return zstandard.ZstdDecompressor().decompress(value).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(value).decode("utf-8")
+    raise ValueError(f"不明な圧縮方式です: {codec}")
+
+
+def register_sql_functions(conn):
+    """ 検索インデックスのトリガーとビューが使う SQL 関数を接続に登録する
+
+    episodes のトリガーが decompress_text を呼ぶので、登録していない接続（sqlite3 シェルなど）で
+    話を追加・更新・削除すると "no such function" で失敗する。
+    """
+    conn.create_function("decompress_text", 2, decompress_text, deterministic=True)
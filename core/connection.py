@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+
+# SQLite の接続ごとに適用するチューニング設定
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",      # 読み込みと書き込みを同時に行えるようにする
+    "synchronous": "NORMAL",    # WAL と組み合わせて fsync の回数を減らす
+    "busy_timeout": 5000,       # ロック中は最大5秒待つ（ミリ秒）
+    "mmap_size": 268435456,     # 256MB までメモリマップで読む
+    "cache_size": -65536,       # ページキャッシュ 64MB（負の値は KiB 指定）
+    "temp_store": "MEMORY",
+}
+
+# sqlite3 モジュールが接続ごとに保持するプリペアドステートメントの数
+STATEMENT_CACHE_SIZE = 256
+
+
+def backup_into(source, path, pages=-1, sleep=0.0):
+    """ 接続 source のデータベースを、オンラインバックアップ API で path のファイルにコピーする
+
+    pages ページずつコピーし、間で sleep 秒待つ（その間はほかの接続が書き込める。
+    途中で書き込まれた場合は SQLite がコピーをやり直すので、出来上がるのは常にある時点の一貫した内容）。
+    """
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+    return path
+
+
+def restore_into(target, path):
+    """ path のデータベースの内容で、接続 target のデータベースを丸ごと置き換える """
+    source = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+
+
+def maintain(conn, vacuum=False, analyze=False, integrity_check=False):
+    """ VACUUM・ANALYZE・integrity_check を行い、{処理: 結果} を返す（トランザクションの外で呼ぶこと） """
+    def size():
+        return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+    result = {"bytes": size()}
+    if integrity_check:
+        messages = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        result["integrity_check"] = "ok" if messages == ["ok"] else messages
+    if analyze:
+        conn.execute("ANALYZE")
+        result["analyze"] = True
+    if vacuum:
+        conn.execute("VACUUM")
+        result["vacuum"] = True
+        result["bytes_after"] = size()
+    return result
+
+
+class ConnectionManager:
+    """ スレッドごとに1本の SQLite 接続を使い回す接続マネージャ """
+
+    def __init__(self, db_path, pragmas=None, cached_statements=STATEMENT_CACHE_SIZE, on_connect=None,
+                 factory=sqlite3.Connection, read_only=False):
+        self.db_path = db_path
+        # True の場合は mode=ro の URI で開き、書き込みできない接続にする
+        self.read_only = read_only
+        # sqlite3.Connection のサブクラスを使う場合に指定する
+        self.factory = factory
+        # 接続ごとに SQL 関数の登録などを行うためのフック
+        self.on_connect = on_connect
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        # 全スレッドの接続を管理（終了したスレッドの接続を後で閉じるため）
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """ 新しい接続を作成して PRAGMA を適用する """
+        if self.read_only:
+            database, uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro", True
+        else:
+            database, uri = self.db_path, False
+        conn = sqlite3.connect(
+            database,
+            uri=uri,
+            cached_statements=self.cached_statements,
+            factory=self.factory,
+            # 終了したスレッドの接続を別スレッドから閉じられるようにする
+            check_same_thread=False,
+        )
+        for key, value in self.pragmas.items():
+            # journal_mode の変更は書き込みになるので、メモリ上の DB と読み込み専用の接続では行わない
+            if key == "journal_mode" and (self.db_path == ":memory:" or self.read_only):
+                continue
+            conn.execute(f"PRAGMA {key} = {value}")
+        if self.on_connect:
+            self.on_connect(conn)
+        return conn
+
+    def get(self):
+        """ 現在のスレッド用の接続を返す（なければ作成する） """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+
+        conn = self._connect()
+        self._local.conn = conn
+        with self._lock:
+            self._reap_dead_threads()
+            self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+        return conn
+
+    def _reap_dead_threads(self):
+        """ Streamlit のスクリプトスレッドは再実行ごとに入れ替わるので、終了済みスレッドの接続を閉じる """
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                conn.close()
+                del self._connections[ident]
+
+    def close(self):
+        """ 現在のスレッドの接続を閉じる """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+        conn.close()
+
+    def close_all(self):
+        """ 管理している全ての接続を閉じる """
+        with self._lock:
+            for _, conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class SingleConnectionManager(ConnectionManager):
+    """ 全スレッドで1本の接続を共有する接続マネージャ（メモリ上の DB 用）
+
+    :memory: は接続ごとに別のデータベースになるため、スレッドごとに接続を作れない。
+    同時に使わないよう、呼び出し側（MemoryBackend）がロックで守る。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._conn = None
+
+    def get(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            return self._conn
+
+    def close(self):
+        self.close_all()
+
+    def close_all(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,167 +1,985 @@
-import sqlite3
+import functools
+import heapq
 import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from core.compression import compress_text, decompress_text, register_sql_functions
+from core.connection import ConnectionManager, backup_into, maintain, restore_into
+from core import appearances, revisions
+from core.ordering import ORDER_GAP, key_between, spread_keys
+from core.statistics import sum_by_key, text_stats
+from core.storage import DuplicateTitle, StorageBackend, VersionConflict
+from core.migrations import SCHEMA_VERSION, get_schema_version, migrate
+from core.profiling import raw_connection, wrap_connection
+
+# busy_timeout を待っても書き込めなかったときにやり直す回数と、最初の待ち時間・上限（秒）
+LOCK_RETRY_ATTEMPTS = 5
+LOCK_RETRY_DELAY = 0.05
+LOCK_RETRY_MAX_DELAY = 1.0
+
+
+def _is_locked(error):
+    message = str(error)
+    return "database is locked" in message or "database table is locked" in message
+
+
+def retry_when_locked(method):
+    """ "database is locked" で失敗した書き込みを、待ち時間を倍にしながら数回やり直す
+
+    transaction() の中で失敗した場合は、それまでの書き込みごとやり直す必要があるので、そのまま送出する。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        delay = LOCK_RETRY_DELAY
+        for attempt in range(1, LOCK_RETRY_ATTEMPTS + 1):
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if self._tx.depth or not _is_locked(e) or attempt == LOCK_RETRY_ATTEMPTS:
+                    raise
+            # 同時に失敗した書き込みが同じ間隔でぶつかり続けないように、待ち時間をばらつかせる
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, LOCK_RETRY_MAX_DELAY)
+    return wrapper
+
 
-class DatabaseManager:
-    def __init__(self, db_path="data/notion_app.db"):
+def _batches(table):
+    """ {列名: 値のリスト} を1つだけ含む列、または分けて渡されたものをそのまま返す """
+    return [table] if isinstance(table, dict) else table
+
+
+class _TransactionState(threading.local):
+    depth = 0
+
+class DatabaseManager(StorageBackend):
+    """ 1つの SQLite ファイルに全ての作品を保存する保存先 """
+    # 接続の管理方法（MemoryBackend は全スレッドで1本の接続を使う）
+    connection_class = ConnectionManager
+
+    # shared() で作ったインスタンス（db_path ごとにプロセスで1つ）
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, db_path="data/notion_app.db", **kwargs):
+        """ 同じファイルの DatabaseManager をプロセス内で使い回す（スレッドセーフ） """
+        key = os.path.abspath(db_path)
+        with cls._shared_lock:
+            db = cls._shared.get(key)
+            if db is None:
+                db = cls._shared[key] = cls(db_path, **kwargs)
+            return db
+
+    def __init__(self, db_path="data/notion_app.db", pragmas=None, compression=None, read_only=False):
         self.db_path = db_path
+        # 読み込み専用（書き出し用のワーカープロセスなど）。マイグレーションも行わない
+        self.read_only = read_only
+        # 話の本文を圧縮して保存する場合の方式（None / "zlib" / "zstd"）
+        self.compression = compression
         # data フォルダがない場合に備えて作成
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        if not read_only and os.path.dirname(self.db_path) and not os.path.isdir(os.path.dirname(self.db_path)):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # スレッドごとの transaction() の入れ子の深さ
+        self._tx = _TransactionState()
+        # 登場話の索引に使う、作品ごとのキャラ名・地名のオートマトン
+        self._matchers = appearances.MatcherCache()
+        # 接続はスレッドごとに使い回す（毎回 connect しない）
+        self._connections = self.connection_class(
+            self.db_path, pragmas=pragmas, on_connect=register_sql_functions, read_only=read_only,
+        )
         self._initialize_db()
     
     def _get_connection(self):
         """ データベースへの接続を取得する（内部用メソッド） """
-        return sqlite3.connect(self.db_path)
+        # with 文で使うとトランザクションの commit/rollback のみ行われ、接続は閉じられない
+        # デバッグパネルで計測中のスレッドにだけ、記録するラッパーを付ける
+        return wrap_connection(self._connections.get())
 
-    def _initialize_db(self):
-        """ テーブルの初期設定  """
-        with self._get_connection() as conn:
-            # 1. 作品（プロジェクト）を管理するテーブル
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )    
-            """)
-
-            # 2. ブロックテーブルを拡張
-            # name, role, location など作品設定に必要なカラムを追加
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS blocks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER,
-                block_type TEXT NOT NULL,
-                content TEXT,
-                is_done INTEGER DEFAULT 0,
-                name TEXT,      -- キャラクター名
-                role TEXT,      -- 役割
-                location TEXT,  -- 場所
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (project_id) REFERENCES projects (id)
-            )
-            """)
+    def close(self):
+        """ 全ての接続を閉じる """
+        self._connections.close_all()
 
-            # 3. 章（Chapter）を管理するテーブル
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS chapters (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER,
-                title TEXT NOT NULL,
-                order_num INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (project_id) REFERENCES projects (id)
-            )
-            """)
+    def read_only_spec(self):
+        if self.db_path == ":memory:":
+            return super().read_only_spec()
+        return DatabaseManager, (self.db_path,), {"read_only": True}
 
-            # 4. 話（Episode）を管理するテーブル - 「中項目 - 本文」として使用
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS episodes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chapter_id INTEGER,
-                title TEXT NOT NULL,
-                content TEXT,
-                order_num INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (chapter_id) REFERENCES chapters (id)
-            )
-            """)
+    @contextmanager
+    def transaction(self, project_id=None):
+        """ 複数の書き込みを1つのトランザクションにまとめる（例外時はロールバック）
+
+        入れ子にした場合や、中で通常のメソッドを呼んだ場合は外側のトランザクションに参加する。
+        1ファイルに全ての作品があるので project_id は使わない。
+        """
+        conn = self._get_connection()
+        if self._tx.depth:
+            self._tx.depth += 1
+            try:
+                yield conn
+            finally:
+                self._tx.depth -= 1
+            return
+
+        self._begin(conn)
+        self._tx.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._tx.depth = 0
+
+    @retry_when_locked
+    def _begin(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+
+    @contextmanager
+    def _session(self):
+        """ 各メソッド用の接続。transaction() の中ならそのまま参加し、外なら1文ごとに commit する """
+        conn = self._get_connection()
+        if self._tx.depth:
+            yield conn
+        else:
+            with conn:
+                yield conn
+
+    def _initialize_db(self):
+        """ テーブルの初期設定（未適用のマイグレーションを適用する）  """
+        conn = self._get_connection()
+        # 記録されているスキーマバージョンが最新なら何もしない
+        version = get_schema_version(conn)
+        if version == SCHEMA_VERSION:
+            return
+        if self.read_only:
+            raise RuntimeError(f"スキーマのバージョンが一致しないため読み込み専用では開けません（{version} != {SCHEMA_VERSION}）。")
+        migrate(conn)
     
+    # 各テーブルの親を指すカラム
+    PARENT_COLUMNS = {"blocks": "project_id", "chapters": "project_id", "episodes": "chapter_id"}
+
+    def fetch_parent_id(self, table, row_id):
+        """ ブロック・章・話が属する親（作品または章）のIDを返す """
+        query = f"SELECT {self.PARENT_COLUMNS[table]} FROM {table} WHERE id = ?"
+        with self._session() as conn:
+            row = conn.execute(query, (row_id,)).fetchone()
+        return row[0] if row else None
+
     # --- プロジェクト関連の操作 ---
+    @retry_when_locked
     def save_project(self, title):
         """ 新しい作品を登録する """
         query = "INSERT INTO projects (title) VALUES (?)"
-        with self._get_connection() as conn:
+        with self._session() as conn:
             cursor = conn.execute(query, (title,))
             return cursor.lastrowid     # 新しく作ったプロジェクトIDを返す
 
     def fetch_all_projects(self):
         """ 全ての作品リストを取得 """
         query =  "SELECT id, title FROM projects ORDER BY created_at DESC"
-        with self._get_connection() as conn:
+        with self._session() as conn:
             return conn.execute(query).fetchall()
 
     # --- ブロック関連の操作 ---
+    @retry_when_locked
     def save_block(self, block_type, content, project_id=None , is_done=0, name=None, role=None, location=None):
         """ ブロックの保存（作品IDやキャラ設定などに対応） """
         query = """
         INSERT INTO blocks (block_type, content, project_id, is_done, name, role, location)
         VALUES (?, ?, ?, ?, ?, ?, ?)
         """
-        with self._get_connection() as conn:
-            conn.execute(query, (block_type, content, project_id, is_done, name, role, location))
+        with self._session() as conn:
+            cursor = conn.execute(query, (block_type, content, project_id, is_done, name, role, location))
+            column = appearances.TERM_COLUMNS.get(block_type)
+            if column:
+                term = name if column == "name" else location
+                appearances.index_term(conn, project_id, cursor.lastrowid, term)
 
-    def update_block(self, block_id, content, **kwargs):
-        """ 指定したIDブロックを更新する """
+    def update_block(self, block_id, content, expected_version=None, **kwargs):
+        """ 指定したIDブロックを更新して新しい版を返す（なければ False）
+
+        expected_version が現在の版と違う場合は、上書きせずに VersionConflict を送出する。
+        """
         # kwargsから動的に更新カラムを作る（少し高度なリファクタリング）
         keys = ["content"] + list(kwargs.keys())
         values = [content] + list(kwargs.values())
         set_clause = ", ".join([f"{k} = ?" for k in keys])
 
-        query = f"UPDATE blocks SET {set_clause} WHERE id = ?"
-        with self._get_connection() as conn:
+        query = f"UPDATE blocks SET {set_clause}, version = version + 1 WHERE id = ?"
+        # 版の確認と更新の間にほかの書き込みが入らないように、同じトランザクションで行う
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT version, project_id, block_type, name, location FROM blocks WHERE id = ?", (block_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            if expected_version is not None and row[0] != expected_version:
+                raise VersionConflict("blocks", block_id, expected_version, row[0])
             conn.execute(query, values + [block_id])
+            # キャラ名・地名が変わったら、その語の登場話だけを数え直す
+            column = appearances.TERM_COLUMNS.get(row[2])
+            if column in kwargs and kwargs[column] != (row[3] if column == "name" else row[4]):
+                appearances.index_term(conn, row[1], block_id, kwargs[column])
+        return row[0] + 1
 
+    @retry_when_locked
     def delete_block(self, block_id):
         """ 指定したIDのブロックを削除する """
         query = "DELETE FROM blocks WHERE id = ?"
-        with self._get_connection() as conn:
+        with self._session() as conn:
+            conn.execute("DELETE FROM appearances WHERE block_id = ?", (block_id,))
             conn.execute(query, (block_id,))
 
     def fetch_blocks_by_project(self, project_id):
         """ 特定の作品に紐づくブロックのみを取得する """
         query = """
-        SELECT id, block_type, content, is_done, name, role, location
+        SELECT id, block_type, content, is_done, name, role, location, version
         FROM blocks
         WHERE project_id = ?
         ORDER BY created_at ASC
         """
-        with self._get_connection() as conn:
+        with self._session() as conn:
             return conn.execute(query, (project_id,)).fetchall()
         
+    def iter_blocks_by_project(self, project_id, batch_size=500):
+        """ 作品のブロックを batch_size 行ずつ読み出すジェネレータ（書き出し用。同じスレッドで使い切ること） """
+        query = """
+        SELECT id, block_type, content, is_done, name, role, location, version
+        FROM blocks
+        WHERE project_id = ?
+        ORDER BY created_at ASC
+        """
+        cursor = self._get_connection().execute(query, (project_id,))
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def fetch_blocks_page(self, project_id, block_types, after_id=None, limit=50):
+        """ 指定した種類のブロックを ID 順に limit 件まで返す（after_id より後ろから。keyset ページング）
+
+        種類ごとに (project_id, block_type, id) のインデックスを引いて ID 順に併合するので、
+        何ページ目でも読むのは limit 件 × 種類数の行だけで済む。
+        """
+        query = """
+        SELECT id, block_type, content, is_done, name, role, location, version
+        FROM blocks
+        WHERE project_id = ? AND block_type = ? AND id > ?
+        ORDER BY id LIMIT ?
+        """
+        start = -1 if after_id is None else after_id
+        with self._session() as conn:
+            runs = [conn.execute(query, (project_id, t, start, limit)).fetchall() for t in block_types]
+        return list(heapq.merge(*runs))[:limit]
+
+    def count_blocks(self, project_id, block_types):
+        """ 指定した種類のブロックの件数 """
+        marks = ", ".join("?" * len(block_types))
+        query = f"SELECT COUNT(*) FROM blocks WHERE project_id = ? AND block_type IN ({marks})"
+        with self._session() as conn:
+            return conn.execute(query, (project_id, *block_types)).fetchone()[0]
+
     def fetch_all_blocks(self):
         """ 全てのブロックを取得 """
         query = "SELECT block_type, content, is_done, name, role, location FROM blocks ORDER BY created_at ASC"
-        with self._get_connection() as conn:
+        with self._session() as conn:
             return conn.execute(query).fetchall()
         
     # --- 章（Chapter）操作用のメソッド ---
+    @retry_when_locked
     def save_chapter(self, project_id, title):
-        query = "INSERT INTO chapters (project_id, title) VALUES (?, ?)"
-        with self._get_connection() as conn:
-            conn.execute(query, (project_id, title))
+        """ 章を追加する。同じ作品に同名の章があれば何もせず False を返す """
+        with self._session() as conn:
+            cursor = conn.execute(self._INSERT_CHAPTER, (project_id, title, ORDER_GAP))
+            return cursor.rowcount > 0
+
+    # 新しい章・話は末尾（同じ親の最大の order_num + ORDER_GAP）に追加する
+    _INSERT_CHAPTER = """
+    INSERT INTO chapters (project_id, title, order_num)
+    VALUES (?1, ?2, (SELECT COALESCE(MAX(order_num), 0) + ?3 FROM chapters WHERE project_id = ?1))
+    ON CONFLICT (project_id, title) DO NOTHING
+    """
+    _INSERT_EPISODE = """
+    INSERT INTO episodes (chapter_id, title, content, codec, char_count, line_count, order_num, updated_at)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6,
+            (SELECT COALESCE(MAX(order_num), 0) + ?7 FROM episodes WHERE chapter_id = ?1), CURRENT_TIMESTAMP)
+    ON CONFLICT (chapter_id, title) DO NOTHING
+    """
 
     def fetch_chapters_by_project(self, project_id):
         query = "SELECT id, title FROM chapters WHERE project_id = ? ORDER BY order_num ASC, id ASC"
-        with self._get_connection() as conn:
+        with self._session() as conn:
             return conn.execute(query, (project_id,)).fetchall()
         
+    @retry_when_locked
     def update_chapter_title(self, chapter_id, title):
-        query = "UPDATE chapter SET title = ? WHERE id = ?"
-        with self._get_connection() as conn:
-            conn.execute(query, (title, chapter_id))
+        query = "UPDATE chapters SET title = ? WHERE id = ?"
+        try:
+            with self._session() as conn:
+                conn.execute(query, (title, chapter_id))
             return True
+        except sqlite3.IntegrityError:
+            # 同じ作品に同名の章がある
+            return False
 
     # --- 話（Episode）を操作用 ---
+    def _pack_body(self, content):
+        """ 本文を保存用の (値, 圧縮方式, 文字数, 行数) に変換する """
+        value, codec = compress_text(content, self.compression)
+        return (value, codec, *text_stats(content))
+
+    @retry_when_locked
     def save_episode(self, chapter_id, title, content):
-        query = "INSERT INTO episodes (chapter_id, title, content) VALUES (?, ?, ?)"
-        with self._get_connection() as conn:
-            conn.execute(query, (chapter_id, title, content))
+        """ 話を追加する。同じ章に同名の話があれば何もせず False を返す """
+        packed = self._pack_body(content)
+        with self._session() as conn:
+            cursor = conn.execute(self._INSERT_EPISODE, (chapter_id, title, *packed, ORDER_GAP))
+            if cursor.rowcount > 0:
+                self._update_stats(conn, chapter_id, 1, packed[2], packed[3])
+                if content:
+                    self._record_revision(conn, cursor.lastrowid, content)
+                    self._index_appearances(conn, chapter_id, cursor.lastrowid, content)
+            return cursor.rowcount > 0
     
     def fetch_episodes_by_chapter(self, chapter_id):
-        query = "SELECT id, title, content FROM episodes WHERE chapter_id = ? ORDER BY order_num ASC, id ASC"
-        with self._get_connection() as conn:
-            return conn.execute(query, (chapter_id,)).fetchall()
-        
-    def update_episode(self, episode_id, title, content):
+        """ 章の話を本文つきで取得する（書き出し用） """
+        query = "SELECT id, title, content, codec FROM episodes WHERE chapter_id = ? ORDER BY order_num ASC, id ASC"
+        with self._session() as conn:
+            rows = conn.execute(query, (chapter_id,)).fetchall()
+        return [(e_id, title, decompress_text(content, codec)) for e_id, title, content, codec in rows]
+
+    def iter_episodes_by_project(self, project_id, batch_size=100):
+        """ 作品の話を本文つきで章・話の順に batch_size 行ずつ読み出すジェネレータ（書き出し用。同じスレッドで使い切ること）
+
+        (章ID, 章題, 話ID, 話名, 本文) を返す。話のない章は話ID・話名・本文が None。
+        章と話の (親, order_num, id) のインデックスの順に読むので、並べ替えのために全文を溜めることはない。
+        """
+        query = """
+        SELECT c.id, c.title, e.id, e.title, e.content, e.codec
+        FROM chapters c LEFT JOIN episodes e ON e.chapter_id = c.id
+        WHERE c.project_id = ?
+        ORDER BY c.order_num ASC, c.id ASC, e.order_num ASC, e.id ASC
+        """
+        cursor = self._get_connection().execute(query, (project_id,))
         try:
-            query = "UPDATE episodes SET title = ?, content = ? WHERE id = ?"
-            with self._get_connection() as conn:
-                conn.execute(query, (title, content, episode_id))
-            return True
-        except Exception:
-            return False
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for ch_id, ch_title, ep_id, ep_title, content, codec in rows:
+                    body = None if ep_id is None else decompress_text(content, codec) or ""
+                    yield ch_id, ch_title, ep_id, ep_title, body
+        finally:
+            cursor.close()
+
+    def fetch_episode_list(self, chapter_id):
+        """ 章の話の一覧を本文なしで取得する (id, title, order_num, char_count, updated_at, line_count) """
+        query = """
+        SELECT id, title, order_num, char_count, updated_at, line_count
+        FROM episodes WHERE chapter_id = ? ORDER BY order_num ASC, id ASC
+        """
+        with self._session() as conn:
+            return conn.execute(query, (chapter_id,)).fetchall()
+
+    def fetch_episode_body(self, episode_id):
+        """ 1話分の本文だけを取得する（なければ None） """
+        query = "SELECT content, codec FROM episodes WHERE id = ?"
+        with self._session() as conn:
+            row = conn.execute(query, (episode_id,)).fetchone()
+        return decompress_text(*row) if row else None
+
+    def fetch_episode_for_edit(self, episode_id):
+        """ 編集を始めるときの (本文, 版) を返す（なければ None）。本文と版は必ず同じ時点のもの """
+        query = "SELECT content, codec, version FROM episodes WHERE id = ?"
+        with self._session() as conn:
+            row = conn.execute(query, (episode_id,)).fetchone()
+        return (decompress_text(row[0], row[1]), row[2]) if row else None
+
+    def update_episode(self, episode_id, title, content, expected_version=None):
+        """ 話を更新して新しい版を返す（なければ False）
+
+        expected_version が現在の版と違う場合（読み込んだ後にほかの画面で保存された場合）は、
+        上書きせずに VersionConflict を送出する。ロックが取れないときは数回やり直してから送出する。
+        同じ章のほかの話と同じタイトルに変えようとした場合は DuplicateTitle を送出する。
+        """
+        query = """
+        UPDATE episodes
+        SET title = ?, content = ?, codec = ?, char_count = ?, line_count = ?,
+            updated_at = CURRENT_TIMESTAMP, version = version + 1
+        WHERE id = ?
+        """
+        packed = self._pack_body(content)
+        # 版の確認・本文の更新・集計・履歴の追加は同じトランザクションで行う
+        with self.transaction() as conn:
+            old = conn.execute(
+                "SELECT chapter_id, char_count, line_count, version FROM episodes WHERE id = ?", (episode_id,)
+            ).fetchone()
+            if old is None:
+                return False
+            if expected_version is not None and old[3] != expected_version:
+                raise VersionConflict("episodes", episode_id, expected_version, old[3])
+            # 書き込みロックを取った後に確かめるので、確認と更新の間にほかの保存が割り込むことはない
+            if conn.execute(
+                "SELECT 1 FROM episodes WHERE chapter_id = ? AND title = ? AND id <> ?", (old[0], title, episode_id)
+            ).fetchone():
+                raise DuplicateTitle("episodes", old[0], title)
+            conn.execute(query, (title, *packed, episode_id))
+            self._update_stats(conn, old[0], 0, packed[2] - old[1], packed[3] - old[2])
+            self._record_revision(conn, episode_id, content)
+            self._index_appearances(conn, old[0], episode_id, content)
+        return old[3] + 1
 
     def delete_episode(self, episode_id):
         query = "DELETE FROM episodes WHERE id = ?"
-        with self._get_connection() as conn:
+        with self.transaction() as conn:
+            old = conn.execute(
+                "SELECT chapter_id, char_count, line_count FROM episodes WHERE id = ?", (episode_id,)
+            ).fetchone()
+            conn.execute("DELETE FROM episode_revisions WHERE episode_id = ?", (episode_id,))
+            conn.execute("DELETE FROM appearances WHERE episode_id = ?", (episode_id,))
             conn.execute(query, (episode_id,))
+            if old is not None:
+                self._update_stats(conn, old[0], -1, -old[1], -old[2])
+
+    # --- 並び順 ---
+    def move_chapter(self, chapter_id, after_id=None):
+        """ 章を after_id の章の直後（None なら先頭）に移動する """
+        return self._move("chapters", chapter_id, after_id)
+
+    def move_episode(self, episode_id, after_id=None):
+        """ 話を同じ章の after_id の話の直後（None なら先頭）に移動する """
+        return self._move("episodes", episode_id, after_id)
+
+    def _move(self, table, row_id, after_id):
+        """ 行の order_num を前後の行の間の値に変える。書き換えるのは通常その1行だけ
+
+        間が詰まって値を作れない場合だけ、同じ親の行の order_num をまとめて振り直す。
+        """
+        parent = self.PARENT_COLUMNS[table]
+        with self.transaction() as conn:
+            row = conn.execute(f"SELECT {parent} FROM {table} WHERE id = ?", (row_id,)).fetchone()
+            if row is None:
+                return False
+            if after_id == row_id:
+                return True
+            key = self._order_key_after(conn, table, row[0], row_id, after_id)
+            if key is None:
+                self._rebalance_order(conn, table, row[0])
+                key = self._order_key_after(conn, table, row[0], row_id, after_id)
+            conn.execute(f"UPDATE {table} SET order_num = ? WHERE id = ?", (key, row_id))
+        return True
+
+    def _order_key_after(self, conn, table, parent_id, row_id, after_id):
+        """ row_id を after_id の直後に置くための order_num（(親, order_num, id) のインデックスで前後を引く） """
+        parent = self.PARENT_COLUMNS[table]
+        before = None
+        if after_id is None:
+            following = conn.execute(f"""
+            SELECT order_num FROM {table} WHERE {parent} = ? AND id != ?
+            ORDER BY order_num, id LIMIT 1
+            """, (parent_id, row_id)).fetchone()
+        else:
+            anchor = conn.execute(
+                f"SELECT order_num FROM {table} WHERE id = ? AND {parent} = ?", (after_id, parent_id)
+            ).fetchone()
+            if anchor is None:
+                raise ValueError("移動先は同じ親（作品・章）の中から指定してください。")
+            before = anchor[0]
+            following = conn.execute(f"""
+            SELECT order_num FROM {table} WHERE {parent} = ? AND id != ? AND (order_num, id) > (?, ?)
+            ORDER BY order_num, id LIMIT 1
+            """, (parent_id, row_id, before, after_id)).fetchone()
+        return key_between(before, following[0] if following else None)
+
+    def _rebalance_order(self, conn, table, parent_id):
+        """ 親の中の並び順を保ったまま、order_num を ORDER_GAP 間隔に振り直す """
+        parent = self.PARENT_COLUMNS[table]
+        ids = [r[0] for r in conn.execute(
+            f"SELECT id FROM {table} WHERE {parent} = ? ORDER BY order_num, id", (parent_id,)
+        )]
+        conn.executemany(f"UPDATE {table} SET order_num = ? WHERE id = ?", spread_keys(ids))
+
+    # --- バックアップ ---
+    def backup_to(self, directory, pages=-1, sleep=0.0, name="main"):
+        """ オンラインバックアップ API で directory/<name>.db にコピーし、{name: パス} を返す """
+        with self._session() as conn:
+            return {name: backup_into(conn, os.path.join(directory, f"{name}.db"), pages, sleep)}
+
+    @retry_when_locked
+    def restore_from(self, files):
+        """ バックアップ（files["main"]）の内容で、開いたままのデータベースを置き換える """
+        if self.read_only:
+            raise RuntimeError("読み込み専用の保存先には復元できません。")
+        with self._session() as conn:
+            restore_into(raw_connection(conn), files["main"])
+        # 古いバージョンのバックアップなら、今のスキーマまでマイグレーションする
+        self._initialize_db()
+
+    # --- メンテナンス ---
+    @retry_when_locked
+    def run_maintenance(self, vacuum=False, analyze=False, integrity_check=False, name="main"):
+        """ VACUUM・ANALYZE・integrity_check を行い、{name: {処理: 結果}} を返す """
+        if self.read_only and (vacuum or analyze):
+            raise RuntimeError("読み込み専用の保存先では VACUUM・ANALYZE を行えません。")
+        with self._session() as conn:
+            return {name: maintain(conn, vacuum, analyze, integrity_check)}
+
+    # --- スナップショット（作品を丸ごと列ごとのリストでやり取りする） ---
+    # テーブル → (列名, 作品の行を読むクエリ)。話の本文は展開した文字列で持つ
+    SNAPSHOT_TABLES = {
+        "projects": (
+            ("id", "title", "created_at"),
+            "SELECT id, title, created_at FROM projects WHERE id = ?",
+        ),
+        "blocks": (
+            ("id", "block_type", "content", "is_done", "name", "role", "location", "version", "created_at"),
+            """
+            SELECT id, block_type, content, is_done, name, role, location, version, created_at
+            FROM blocks WHERE project_id = ? ORDER BY id
+            """,
+        ),
+        "chapters": (
+            ("id", "title", "order_num", "created_at"),
+            "SELECT id, title, order_num, created_at FROM chapters WHERE project_id = ? ORDER BY order_num, id",
+        ),
+        "episodes": (
+            ("id", "chapter_id", "title", "content", "order_num", "version", "created_at", "updated_at"),
+            """
+            SELECT e.id, e.chapter_id, e.title, decompress_text(e.content, e.codec),
+                   e.order_num, e.version, e.created_at, e.updated_at
+            FROM episodes e JOIN chapters c ON c.id = e.chapter_id
+            WHERE c.project_id = ? ORDER BY c.order_num, c.id, e.order_num, e.id
+            """,
+        ),
+    }
+
+    def fetch_snapshot_tables(self, project_id):
+        """ 作品の projects・blocks・chapters・episodes を {テーブル: {列名: 値のリスト}} で返す """
+        tables = {}
+        with self._session() as conn:
+            for name, (columns, query) in self.SNAPSHOT_TABLES.items():
+                rows = conn.execute(query, (project_id,)).fetchall()
+                values = list(zip(*rows)) if rows else [()] * len(columns)
+                tables[name] = {column: list(v) for column, v in zip(columns, values)}
+        return tables
+
+    def load_snapshot_tables(self, conn, project_id, tables):
+        """ fetch_snapshot_tables の形のデータを作品に追加する（transaction(project_id) の中で使う）
+
+        各テーブルは {列名: 値のリスト}、またはそれを少しずつ返すイテラブル（大きな作品を分けて読み込む場合）。
+        ID は振り直し、章は章題で対応づける。集計と登場話の索引は最後にまとめて作り直す。
+        """
+        for blocks in _batches(tables["blocks"]):
+            conn.executemany("""
+            INSERT INTO blocks (project_id, block_type, content, is_done, name, role, location, version, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            """, zip(
+                [project_id] * len(blocks["id"]), blocks["block_type"], blocks["content"], blocks["is_done"],
+                blocks["name"], blocks["role"], blocks["location"], blocks["version"], blocks["created_at"],
+            ))
+
+        old_chapters = []
+        for chapters in _batches(tables["chapters"]):
+            conn.executemany("""
+            INSERT INTO chapters (project_id, title, order_num, created_at)
+            VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ON CONFLICT (project_id, title) DO NOTHING
+            """, zip([project_id] * len(chapters["id"]), chapters["title"], chapters["order_num"], chapters["created_at"]))
+            old_chapters.extend(zip(chapters["id"], chapters["title"]))
+        new_ids = dict(conn.execute("SELECT title, id FROM chapters WHERE project_id = ?", (project_id,)).fetchall())
+        chapter_map = {old: new_ids[title] for old, title in old_chapters}
+
+        for episodes in _batches(tables["episodes"]):
+            packed = (self._pack_body(content) for content in episodes["content"])
+            conn.executemany("""
+            INSERT INTO episodes (chapter_id, title, content, codec, char_count, line_count, order_num, version,
+                                  created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+            ON CONFLICT (chapter_id, title) DO NOTHING
+            """, (
+                (chapter_map[ch], title, *body, order_num, version, created_at, updated_at)
+                for ch, title, body, order_num, version, created_at, updated_at in zip(
+                    episodes["chapter_id"], episodes["title"], packed, episodes["order_num"],
+                    episodes["version"], episodes["created_at"], episodes["updated_at"],
+                )
+            ))
+        self._refresh_chapter_stats(conn, set(chapter_map.values()))
+        appearances.rebuild(conn, project_id)
+
+    def import_project_tables(self, title, tables):
+        """ 新しい作品を作り、load_snapshot_tables と同じ形のデータを読み込んで作品IDを返す
+
+        作品の作成も同じトランザクションで行うので、読み込みに失敗したら空の作品も残らない。
+        """
+        with self.transaction() as conn:
+            project_id = self.save_project(title)
+            self.load_snapshot_tables(conn, project_id, tables)
+        return project_id
+
+    # --- キャラ名・地名の登場話 ---
+    def _index_appearances(self, conn, chapter_id, episode_id, content):
+        """ 保存した話の本文から、作品のキャラ名・地名の出現を数え直す """
+        project_id = conn.execute("SELECT project_id FROM chapters WHERE id = ?", (chapter_id,)).fetchone()[0]
+        appearances.index_episode(conn, self._matchers.get(conn, project_id), episode_id, content)
+
+    def fetch_appearances(self, block_id):
+        """ キャラ・世界観ブロックが登場する話 (episode_id, 章題, 話名, 出現回数, 最初の位置) を順番どおりに返す """
+        query = """
+        SELECT a.episode_id, c.title, e.title, a.count, a.first_offset
+        FROM appearances a
+        JOIN episodes e ON e.id = a.episode_id
+        JOIN chapters c ON c.id = e.chapter_id
+        WHERE a.block_id = ?
+        ORDER BY c.order_num, c.id, e.order_num, e.id
+        """
+        with self._session() as conn:
+            return conn.execute(query, (block_id,)).fetchall()
+
+    def rebuild_appearances(self, project_id=None):
+        """ 登場話の索引を作り直す（project_id を省略すると全ての作品） """
+        with self.transaction() as conn:
+            if project_id is None:
+                project_ids = [r[0] for r in conn.execute("SELECT id FROM projects")]
+            else:
+                project_ids = [project_id]
+            for pid in project_ids:
+                appearances.rebuild(conn, pid)
+
+    # --- 話の変更履歴 ---
+    # 直前の差分リビジョンがこの秒数以内なら、新しい版を追加せずに上書きする
+    REVISION_COALESCE_SECONDS = 60
+
+    def _record_revision(self, conn, episode_id, content):
+        """ 本文の新しい版を履歴に追加する（キーフレームとの差分として保存） """
+        content = content or ""
+        latest = conn.execute("""
+        SELECT rev_no, base_rev, data,
+               CAST(strftime('%s', 'now') AS INTEGER) - CAST(strftime('%s', created_at) AS INTEGER)
+        FROM episode_revisions WHERE episode_id = ? ORDER BY rev_no DESC LIMIT 1
+        """, (episode_id,)).fetchone()
+
+        if latest is None:
+            self._insert_revision(conn, episode_id, 1, None, revisions.pack_text(content), content)
+            return
+
+        rev_no, base_rev, data, age = latest
+        if base_rev is None:
+            key_rev, key_text = rev_no, revisions.unpack_text(data)
+            latest_text = key_text
+        else:
+            key_rev = base_rev
+            key_text = revisions.unpack_text(conn.execute(
+                "SELECT data FROM episode_revisions WHERE episode_id = ? AND rev_no = ?", (episode_id, key_rev)
+            ).fetchone()[0])
+            latest_text = revisions.apply_delta(key_text, data)
+        if latest_text == content:
+            return
+
+        # 短い間隔の連続保存は、直前の差分リビジョンを書き換えてまとめる
+        if base_rev is not None and age < self.REVISION_COALESCE_SECONDS:
+            delta = revisions.make_delta(key_text, content)
+            if len(delta) <= len(content.encode("utf-8")) * revisions.MAX_DELTA_RATIO:
+                conn.execute("""
+                UPDATE episode_revisions SET data = ?, char_count = ?, created_at = CURRENT_TIMESTAMP
+                WHERE episode_id = ? AND rev_no = ?
+                """, (delta, len(content), episode_id, rev_no))
+                return
+
+        new_rev = rev_no + 1
+        if new_rev - key_rev >= revisions.KEYFRAME_INTERVAL:
+            self._insert_revision(conn, episode_id, new_rev, None, revisions.pack_text(content), content)
+            return
+        delta = revisions.make_delta(key_text, content)
+        if len(delta) > len(content.encode("utf-8")) * revisions.MAX_DELTA_RATIO:
+            # 大きく書き換えられた場合は全文を保存した方が小さく、復元も速い
+            self._insert_revision(conn, episode_id, new_rev, None, revisions.pack_text(content), content)
+        else:
+            self._insert_revision(conn, episode_id, new_rev, key_rev, delta, content)
+
+    def _insert_revision(self, conn, episode_id, rev_no, base_rev, data, content):
+        conn.execute("""
+        INSERT INTO episode_revisions (episode_id, rev_no, base_rev, data, char_count)
+        VALUES (?, ?, ?, ?, ?)
+        """, (episode_id, rev_no, base_rev, data, len(content)))
+
+    def _revision_text(self, conn, episode_id, rev_no):
+        """ 指定した版の本文を復元する（キーフレーム1つ + 差分1つで復元できる） """
+        row = conn.execute(
+            "SELECT base_rev, data FROM episode_revisions WHERE episode_id = ? AND rev_no = ?",
+            (episode_id, rev_no),
+        ).fetchone()
+        if row is None:
+            return None
+        base_rev, data = row
+        if base_rev is None:
+            return revisions.unpack_text(data)
+        key_data = conn.execute(
+            "SELECT data FROM episode_revisions WHERE episode_id = ? AND rev_no = ?", (episode_id, base_rev)
+        ).fetchone()[0]
+        return revisions.apply_delta(revisions.unpack_text(key_data), data)
+
+    def fetch_revisions(self, episode_id):
+        """ 話の履歴一覧を新しい順に返す (rev_no, char_count, created_at) """
+        query = """
+        SELECT rev_no, char_count, created_at FROM episode_revisions
+        WHERE episode_id = ? ORDER BY rev_no DESC
+        """
+        with self._session() as conn:
+            return conn.execute(query, (episode_id,)).fetchall()
+
+    def fetch_revision_text(self, episode_id, rev_no):
+        """ 指定した版の本文を返す """
+        with self._session() as conn:
+            return self._revision_text(conn, episode_id, rev_no)
+
+    # --- 一括書き込み（transaction() の中で conn を渡して使う） ---
+    def save_blocks_bulk(self, conn, rows):
+        """ (block_type, content, project_id, is_done, name, role, location) の行をまとめて保存する """
+        query = """
+        INSERT INTO blocks (block_type, content, project_id, is_done, name, role, location)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+        conn.executemany(query, rows)
+
+    def save_chapters_bulk(self, conn, project_id, titles):
+        """ 章をまとめて追加する（既にある章題は無視） """
+        conn.executemany(self._INSERT_CHAPTER, [(project_id, t, ORDER_GAP) for t in titles])
+
+    def save_episodes_bulk(self, conn, rows):
+        """ (chapter_id, title, content) の行をまとめて追加し、追加できた件数を返す（既にある話名は無視） """
+        chapter_ids = set()
+
+        def packed_rows():
+            for ch, title, body in rows:
+                chapter_ids.add(ch)
+                yield (ch, title, *self._pack_body(body), ORDER_GAP)
+
+        cursor = conn.executemany(self._INSERT_EPISODE, packed_rows())
+        # どの行が追加されたか分からないので、関係した章の集計は数え直す
+        self._refresh_chapter_stats(conn, chapter_ids)
+        return cursor.rowcount
+
+    def fetch_chapter_ids(self, conn, project_id):
+        """ 章題 → 章ID の辞書を返す """
+        query = "SELECT title, id FROM chapters WHERE project_id = ?"
+        return dict(conn.execute(query, (project_id,)).fetchall())
+
+    # --- 統計（文字数・行数の集計） ---
+    def _update_stats(self, conn, chapter_id, episodes, chars, lines):
+        """ 話の追加・更新・削除による増減を、章・作品の集計と今日の執筆量に足す """
+        conn.execute("""
+        INSERT INTO chapter_stats (chapter_id, episode_count, char_count, line_count) VALUES (?, ?, ?, ?)
+        ON CONFLICT (chapter_id) DO UPDATE SET
+            episode_count = episode_count + excluded.episode_count,
+            char_count = char_count + excluded.char_count,
+            line_count = line_count + excluded.line_count,
+            updated_at = CURRENT_TIMESTAMP
+        """, (chapter_id, episodes, chars, lines))
+        row = conn.execute("SELECT project_id FROM chapters WHERE id = ?", (chapter_id,)).fetchone()
+        if row is None:
+            return
+        conn.execute("""
+        INSERT INTO project_stats (project_id, episode_count, char_count, line_count) VALUES (?, ?, ?, ?)
+        ON CONFLICT (project_id) DO UPDATE SET
+            episode_count = episode_count + excluded.episode_count,
+            char_count = char_count + excluded.char_count,
+            line_count = line_count + excluded.line_count,
+            updated_at = CURRENT_TIMESTAMP
+        """, (row[0], episodes, chars, lines))
+        if chars:
+            conn.execute("""
+            INSERT INTO daily_stats (project_id, day, added, removed) VALUES (?, date('now', 'localtime'), ?, ?)
+            ON CONFLICT (project_id, day) DO UPDATE SET
+                added = added + excluded.added, removed = removed + excluded.removed
+            """, (row[0], max(chars, 0), max(-chars, 0)))
+
+    def _refresh_chapter_stats(self, conn, chapter_ids):
+        """ 指定した章と、その章が属する作品の集計を episodes から数え直す（インポート用。執筆量には数えない） """
+        if not chapter_ids:
+            return
+        params = [(ch,) for ch in chapter_ids]
+        conn.executemany("""
+        INSERT OR REPLACE INTO chapter_stats (chapter_id, episode_count, char_count, line_count)
+        SELECT ?1, COUNT(*), COALESCE(SUM(char_count), 0), COALESCE(SUM(line_count), 0)
+        FROM episodes WHERE chapter_id = ?1
+        """, params)
+        conn.executemany("""
+        INSERT OR REPLACE INTO project_stats (project_id, episode_count, char_count, line_count)
+        SELECT c.project_id, COALESCE(SUM(s.episode_count), 0), COALESCE(SUM(s.char_count), 0),
+               COALESCE(SUM(s.line_count), 0)
+        FROM chapters c LEFT JOIN chapter_stats s ON s.chapter_id = c.id
+        WHERE c.project_id = (SELECT project_id FROM chapters WHERE id = ?)
+        GROUP BY c.project_id
+        """, params)
+
+    def rebuild_statistics(self, backfill_daily=False, batch_size=500):
+        """ 全ての話の本文から集計を作り直す（既存のデータベースや、集計がずれた場合に1回だけ実行する）
+
+        backfill_daily=True の場合、日ごとの執筆量も変更履歴の文字数の差から作り直す。
+        """
+        with self.transaction() as conn:
+            episode_ids, chapter_ids, chars, lines = [], [], [], []
+            cursor = conn.execute("SELECT id, chapter_id, content, codec FROM episodes")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for e_id, ch_id, content, codec in rows:
+                    n_chars, n_lines = text_stats(decompress_text(content, codec))
+                    episode_ids.append(e_id)
+                    chapter_ids.append(ch_id)
+                    chars.append(n_chars)
+                    lines.append(n_lines)
+            conn.executemany(
+                "UPDATE episodes SET char_count = ?, line_count = ? WHERE id = ?",
+                zip(chars, lines, episode_ids),
+            )
+
+            # 章ごと・作品ごとの合計はまとめて集計する（NumPy があればベクトル化される）
+            by_chapter = sum_by_key(chapter_ids, chars, lines)
+            chapter_projects = dict(conn.execute("SELECT id, project_id FROM chapters").fetchall())
+            conn.execute("DELETE FROM chapter_stats")
+            conn.executemany(
+                "INSERT INTO chapter_stats (chapter_id, episode_count, char_count, line_count) VALUES (?, ?, ?, ?)",
+                ((ch, *by_chapter.get(ch, (0, 0, 0))) for ch in chapter_projects),
+            )
+            known = [ch for ch in chapter_projects if ch in by_chapter]
+            by_project = sum_by_key(
+                [chapter_projects[ch] for ch in known],
+                [by_chapter[ch][0] for ch in known],
+                [by_chapter[ch][1] for ch in known],
+                [by_chapter[ch][2] for ch in known],
+            )
+            project_ids = [row[0] for row in conn.execute("SELECT id FROM projects").fetchall()]
+            conn.execute("DELETE FROM project_stats")
+            conn.executemany(
+                "INSERT INTO project_stats (project_id, episode_count, char_count, line_count) VALUES (?, ?, ?, ?)",
+                ((p, *by_project.get(p, (0, 0, 0, 0))[1:]) for p in project_ids),
+            )
+
+            if backfill_daily:
+                self._backfill_daily_stats(conn)
+
+    def _backfill_daily_stats(self, conn):
+        """ 変更履歴の版ごとの文字数の差を、日ごとの執筆量として集計し直す """
+        daily = {}
+        previous = {}
+        rows = conn.execute("""
+        SELECT r.episode_id, c.project_id, date(r.created_at, 'localtime'), r.char_count
+        FROM episode_revisions r
+        JOIN episodes e ON e.id = r.episode_id
+        JOIN chapters c ON c.id = e.chapter_id
+        ORDER BY r.episode_id, r.rev_no
+        """)
+        for episode_id, project_id, day, char_count in rows:
+            delta = char_count - previous.get(episode_id, 0)
+            previous[episode_id] = char_count
+            added, removed = daily.get((project_id, day), (0, 0))
+            daily[(project_id, day)] = (added + max(delta, 0), removed + max(-delta, 0))
+        conn.execute("DELETE FROM daily_stats")
+        conn.executemany(
+            "INSERT INTO daily_stats (project_id, day, added, removed) VALUES (?, ?, ?, ?)",
+            ((p, day, added, removed) for (p, day), (added, removed) in daily.items()),
+        )
+
+    def fetch_project_stats(self, project_id):
+        """ 作品の集計 (章数, 話数, 文字数, 行数) を返す """
+        query = """
+        SELECT (SELECT COUNT(*) FROM chapters WHERE project_id = ?1),
+               COALESCE(s.episode_count, 0), COALESCE(s.char_count, 0), COALESCE(s.line_count, 0)
+        FROM (SELECT ?1 AS project_id) p LEFT JOIN project_stats s ON s.project_id = p.project_id
+        """
+        with self._session() as conn:
+            return conn.execute(query, (project_id,)).fetchone()
+
+    def fetch_chapter_stats(self, project_id):
+        """ 章ごとの集計 (chapter_id, title, 話数, 文字数, 行数) を章の順番で返す """
+        query = """
+        SELECT c.id, c.title, COALESCE(s.episode_count, 0), COALESCE(s.char_count, 0), COALESCE(s.line_count, 0)
+        FROM chapters c LEFT JOIN chapter_stats s ON s.chapter_id = c.id
+        WHERE c.project_id = ? ORDER BY c.order_num ASC, c.id ASC
+        """
+        with self._session() as conn:
+            return conn.execute(query, (project_id,)).fetchall()
+
+    def fetch_daily_stats(self, project_id, days=30):
+        """ 直近 days 日の執筆量 (日付, 増えた文字数, 減った文字数) を古い順に返す """
+        query = """
+        SELECT day, added, removed FROM daily_stats
+        WHERE project_id = ? AND day > date('now', 'localtime', ?)
+        ORDER BY day ASC
+        """
+        with self._session() as conn:
+            return conn.execute(query, (project_id, f"-{int(days)} days")).fetchall()
+
+    # --- 全文検索 ---
+    # trigram トークナイザは3文字未満の語をインデックスで引けない
+    MIN_FTS_TERM_LENGTH = 3
+
+    def search(self, project_id, query, limit=50):
+        """ 作品内の話と設定ブロックを検索し、(種類, ID, 見出し, 抜粋, スコア) をスコア順に返す """
+        terms = query.split()
+        if not terms:
+            return []
+        if all(len(t) >= self.MIN_FTS_TERM_LENGTH for t in terms):
+            return self._search_fts(project_id, terms, limit)
+        return self._search_scan(project_id, terms, limit)
+
+    def _search_fts(self, project_id, terms, limit):
+        """ FTS5 のインデックスで検索する（bm25 の値が小さいほど上位） """
+        # 記号が演算子として解釈されないよう、各語をフレーズとして囲む（複数語は AND）
+        match = " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+        query = """
+        SELECT 'episode', e.id, c.title || ' / ' || e.title,
+               snippet(episodes_fts, -1, '**', '**', '…', 16),
+               bm25(episodes_fts, 5.0, 1.0) AS score
+        FROM episodes_fts
+        JOIN episodes e ON e.id = episodes_fts.rowid
+        JOIN chapters c ON c.id = e.chapter_id
+        WHERE episodes_fts MATCH ? AND c.project_id = ?
+        UNION ALL
+        SELECT 'block', b.id, COALESCE(b.name, b.location, b.block_type),
+               snippet(blocks_fts, -1, '**', '**', '…', 16),
+               bm25(blocks_fts, 1.0, 5.0, 2.0, 5.0) AS score
+        FROM blocks_fts
+        JOIN blocks b ON b.id = blocks_fts.rowid
+        WHERE blocks_fts MATCH ? AND b.project_id = ?
+        ORDER BY score
+        LIMIT ?
+        """
+        with self._session() as conn:
+            return conn.execute(query, (match, project_id, match, project_id, limit)).fetchall()
+
+    def _search_scan(self, project_id, terms, limit):
+        """ 短い語（2文字の名前など）は instr() で走査して探す """
+        first = terms[0]
+        ep_where = " AND ".join(["instr(e.title || ' ' || COALESCE(e.content, ''), ?) > 0"] * len(terms))
+        bl_text = "COALESCE(b.content, '') || ' ' || COALESCE(b.name, '') || ' ' || COALESCE(b.role, '') || ' ' || COALESCE(b.location, '')"
+        bl_where = " AND ".join([f"instr({bl_text}, ?) > 0"] * len(terms))
+        query = f"""
+        SELECT 'episode', e.id, c.title || ' / ' || e.title,
+               substr(e.content, max(instr(e.content, ?) - 16, 1), 40), 0
+        FROM episode_texts e
+        JOIN episodes ep ON ep.id = e.id
+        JOIN chapters c ON c.id = ep.chapter_id
+        WHERE c.project_id = ? AND {ep_where}
+        UNION ALL
+        SELECT 'block', b.id, COALESCE(b.name, b.location, b.block_type),
+               substr({bl_text}, max(instr({bl_text}, ?) - 16, 1), 40), 0
+        FROM blocks b
+        WHERE b.project_id = ? AND {bl_where}
+        LIMIT ?
+        """
+        params = [first, project_id, *terms, first, project_id, *terms, limit]
+        with self._session() as conn:
+            return conn.execute(query, params).fetchall()
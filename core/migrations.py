@@ -0,0 +1,351 @@
+# スキーマのマイグレーション（PRAGMA user_version でバージョン管理）
+from itertools import groupby
+
+from core import appearances
+from core.compression import register_sql_functions
+from core.ordering import spread_keys
+
+
+def _create_base_tables(conn):
+    """ v1: 基本テーブルの作成 """
+    # 1. 作品（プロジェクト）を管理するテーブル
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # 2. ブロックテーブルを拡張
+    # name, role, location など作品設定に必要なカラムを追加
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS blocks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id INTEGER,
+        block_type TEXT NOT NULL,
+        content TEXT,
+        is_done INTEGER DEFAULT 0,
+        name TEXT,      -- キャラクター名
+        role TEXT,      -- 役割
+        location TEXT,  -- 場所
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (project_id) REFERENCES projects (id)
+    )
+    """)
+
+    # 3. 章（Chapter）を管理するテーブル
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS chapters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id INTEGER,
+        title TEXT NOT NULL,
+        order_num INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (project_id) REFERENCES projects (id)
+    )
+    """)
+
+    # 4. 話（Episode）を管理するテーブル - 「中項目 - 本文」として使用
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS episodes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chapter_id INTEGER,
+        title TEXT NOT NULL,
+        content TEXT,
+        order_num INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chapter_id) REFERENCES chapters (id)
+    )
+    """)
+
+
+def _dedupe_titles(conn, table, parent_column):
+    """ UNIQUE 制約を付ける前に、同じ親の中で重複しているタイトルを「タイトル (id)」に改名する """
+    conn.execute(f"""
+    UPDATE {table} SET title = title || ' (' || id || ')'
+    WHERE id NOT IN (
+        SELECT MIN(id) FROM {table} GROUP BY {parent_column}, title
+    )
+    """)
+
+
+def _add_indexes_and_unique(conn):
+    """ v2: 一覧取得用の複合インデックスと、タイトル重複防止の UNIQUE 制約 """
+    # 作品ごとのブロック一覧（ORDER BY created_at）をインデックスだけで並べる
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_blocks_project_created ON blocks (project_id, created_at)")
+    # 章・話の一覧（ORDER BY order_num, id）
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chapters_project_order ON chapters (project_id, order_num, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_episodes_chapter_order ON episodes (chapter_id, order_num, id)")
+
+    # 章題・話名の重複チェックは制約に任せる
+    _dedupe_titles(conn, "chapters", "project_id")
+    _dedupe_titles(conn, "episodes", "chapter_id")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_chapters_project_title ON chapters (project_id, title)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_episodes_chapter_title ON episodes (chapter_id, title)")
+
+
+def _add_fulltext_search(conn):
+    """ v3: 話の本文と設定ブロックの全文検索インデックス（FTS5 / trigram） """
+    # trigram トークナイザなら分かち書きなしで日本語の部分一致検索ができる
+    # 本文は元のテーブルを参照する external content 方式にして二重に保存しない
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS episodes_fts USING fts5(
+        title, content, content='episodes', content_rowid='id', tokenize='trigram'
+    )
+    """)
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS blocks_fts USING fts5(
+        content, name, role, location, content='blocks', content_rowid='id', tokenize='trigram'
+    )
+    """)
+
+    # 書き込みのたびにトリガーで差分だけインデックスを更新する
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS episodes_fts_ai AFTER INSERT ON episodes BEGIN
+        INSERT INTO episodes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS episodes_fts_ad AFTER DELETE ON episodes BEGIN
+        INSERT INTO episodes_fts (episodes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS episodes_fts_au AFTER UPDATE OF title, content ON episodes BEGIN
+        INSERT INTO episodes_fts (episodes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO episodes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS blocks_fts_ai AFTER INSERT ON blocks BEGIN
+        INSERT INTO blocks_fts (rowid, content, name, role, location)
+        VALUES (new.id, new.content, new.name, new.role, new.location);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS blocks_fts_ad AFTER DELETE ON blocks BEGIN
+        INSERT INTO blocks_fts (blocks_fts, rowid, content, name, role, location)
+        VALUES ('delete', old.id, old.content, old.name, old.role, old.location);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS blocks_fts_au AFTER UPDATE OF content, name, role, location ON blocks BEGIN
+        INSERT INTO blocks_fts (blocks_fts, rowid, content, name, role, location)
+        VALUES ('delete', old.id, old.content, old.name, old.role, old.location);
+        INSERT INTO blocks_fts (rowid, content, name, role, location)
+        VALUES (new.id, new.content, new.name, new.role, new.location);
+    END
+    """)
+
+    # 既存データからインデックスを作り直す
+    conn.execute("INSERT INTO episodes_fts (episodes_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO blocks_fts (blocks_fts) VALUES ('rebuild')")
+
+
+def _add_episode_metadata(conn):
+    """ v4: 話の一覧用メタデータ（文字数・更新日時）と本文の圧縮 """
+    conn.execute("ALTER TABLE episodes ADD COLUMN char_count INTEGER DEFAULT 0")
+    conn.execute("ALTER TABLE episodes ADD COLUMN updated_at TIMESTAMP")
+    # 本文を圧縮して保存した場合の方式（zlib / zstd）。NULL なら content はそのままの文字列
+    conn.execute("ALTER TABLE episodes ADD COLUMN codec TEXT")
+    conn.execute("UPDATE episodes SET char_count = length(COALESCE(content, '')), updated_at = created_at")
+
+    # 本文は圧縮されている可能性があるので、検索インデックスは展開済みのビューを参照する
+    # decompress_text は SQLite の組み込みではなく、register_sql_functions で接続ごとに登録する SQL 関数。
+    # このバージョン以降、episodes を書き換える接続（ほかのツールやマイグレーションも）は登録が必須
+    conn.execute("""
+    CREATE VIEW IF NOT EXISTS episode_texts AS
+    SELECT id, title, decompress_text(content, codec) AS content FROM episodes
+    """)
+    for name in ("episodes_fts_ai", "episodes_fts_ad", "episodes_fts_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP TABLE IF EXISTS episodes_fts")
+    conn.execute("""
+    CREATE VIRTUAL TABLE episodes_fts USING fts5(
+        title, content, content='episode_texts', content_rowid='id', tokenize='trigram'
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER episodes_fts_ai AFTER INSERT ON episodes BEGIN
+        INSERT INTO episodes_fts (rowid, title, content)
+        VALUES (new.id, new.title, decompress_text(new.content, new.codec));
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER episodes_fts_ad AFTER DELETE ON episodes BEGIN
+        INSERT INTO episodes_fts (episodes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, decompress_text(old.content, old.codec));
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER episodes_fts_au AFTER UPDATE OF title, content, codec ON episodes BEGIN
+        INSERT INTO episodes_fts (episodes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, decompress_text(old.content, old.codec));
+        INSERT INTO episodes_fts (rowid, title, content)
+        VALUES (new.id, new.title, decompress_text(new.content, new.codec));
+    END
+    """)
+    conn.execute("INSERT INTO episodes_fts (episodes_fts) VALUES ('rebuild')")
+
+
+def _add_episode_revisions(conn):
+    """ v5: 話の変更履歴（キーフレーム + 差分） """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS episode_revisions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        episode_id INTEGER NOT NULL,
+        rev_no INTEGER NOT NULL,
+        base_rev INTEGER,           -- NULL ならキーフレーム（全文）、それ以外はこの版との差分
+        data BLOB NOT NULL,
+        char_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (episode_id, rev_no),
+        FOREIGN KEY (episode_id) REFERENCES episodes (id)
+    )
+    """)
+
+
+def _add_statistics(conn):
+    """ v6: 文字数・行数の集計テーブル（話・章・作品ごと）と日ごとの執筆量 """
+    conn.execute("ALTER TABLE episodes ADD COLUMN line_count INTEGER DEFAULT 0")
+    conn.execute("""
+    UPDATE episodes SET line_count = CASE
+        WHEN COALESCE(content, '') = '' THEN 0
+        ELSE length(decompress_text(content, codec)) - length(replace(decompress_text(content, codec), char(10), '')) + 1
+    END
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS chapter_stats (
+        chapter_id INTEGER PRIMARY KEY,
+        episode_count INTEGER NOT NULL DEFAULT 0,
+        char_count INTEGER NOT NULL DEFAULT 0,
+        line_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chapter_id) REFERENCES chapters (id)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS project_stats (
+        project_id INTEGER PRIMARY KEY,
+        episode_count INTEGER NOT NULL DEFAULT 0,
+        char_count INTEGER NOT NULL DEFAULT 0,
+        line_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (project_id) REFERENCES projects (id)
+    )
+    """)
+    # 日ごと（ローカル日付）の文字数の増減。added は増えた分、removed は減った分の合計
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        project_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        added INTEGER NOT NULL DEFAULT 0,
+        removed INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (project_id, day),
+        FOREIGN KEY (project_id) REFERENCES projects (id)
+    )
+    """)
+    # 既存の話から集計を作る（文字数は v4 の char_count を使う）
+    conn.execute("""
+    INSERT INTO chapter_stats (chapter_id, episode_count, char_count, line_count)
+    SELECT c.id, COUNT(e.id), COALESCE(SUM(e.char_count), 0), COALESCE(SUM(e.line_count), 0)
+    FROM chapters c LEFT JOIN episodes e ON e.chapter_id = c.id
+    GROUP BY c.id
+    """)
+    conn.execute("""
+    INSERT INTO project_stats (project_id, episode_count, char_count, line_count)
+    SELECT p.id, COALESCE(SUM(s.episode_count), 0), COALESCE(SUM(s.char_count), 0), COALESCE(SUM(s.line_count), 0)
+    FROM projects p
+    LEFT JOIN chapters c ON c.project_id = p.id
+    LEFT JOIN chapter_stats s ON s.chapter_id = c.id
+    GROUP BY p.id
+    """)
+
+
+def _add_row_versions(conn):
+    """ v7: 楽観的排他制御のための版番号（更新のたびに1ずつ増える） """
+    conn.execute("ALTER TABLE episodes ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    conn.execute("ALTER TABLE blocks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _spread_order_keys(conn):
+    """ v8: 章・話の order_num（これまで全て 0）を、今の並び順のまま間隔を空けた値にする """
+    for table, parent in (("chapters", "project_id"), ("episodes", "chapter_id")):
+        rows = conn.execute(f"SELECT {parent}, id FROM {table} ORDER BY {parent}, order_num, id").fetchall()
+        for _, group in groupby(rows, key=lambda r: r[0]):
+            conn.executemany(
+                f"UPDATE {table} SET order_num = ? WHERE id = ?", spread_keys([r[1] for r in group])
+            )
+
+
+def _add_appearances(conn):
+    """ v9: キャラ名・地名が登場する話の索引（ブロック × 話ごとの出現回数と最初の位置） """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS appearances (
+        block_id INTEGER NOT NULL,
+        episode_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        first_offset INTEGER NOT NULL,
+        PRIMARY KEY (block_id, episode_id)
+    ) WITHOUT ROWID
+    """)
+    # 話を保存・削除したときに、その話の行だけを消す
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appearances_episode ON appearances (episode_id)")
+    for (project_id,) in conn.execute("SELECT id FROM projects").fetchall():
+        appearances.rebuild(conn, project_id)
+
+
+def _add_block_type_index(conn):
+    """ v10: 種類ごとのブロック一覧を ID 順にページングするためのインデックス """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_blocks_project_type ON blocks (project_id, block_type, id)")
+
+
+# (バージョン番号, 適用する関数) の一覧。新しいマイグレーションは末尾に追加する
+MIGRATIONS = [
+    (1, _create_base_tables),
+    (2, _add_indexes_and_unique),
+    (3, _add_fulltext_search),
+    (4, _add_episode_metadata),
+    (5, _add_episode_revisions),
+    (6, _add_statistics),
+    (7, _add_row_versions),
+    (8, _spread_order_keys),
+    (9, _add_appearances),
+    (10, _add_block_type_index),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """ データベースに記録されているスキーマバージョンを返す """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """ 未適用のマイグレーションを順番に適用する（既存DBはその場でアップグレード） """
+    # v4 以降のトリガーが使う SQL 関数（DatabaseManager 以外の接続から呼ばれた場合に備えて登録する）
+    register_sql_functions(conn)
+    current = get_schema_version(conn)
+    for version, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        # 1バージョンごとに1トランザクション。失敗したらそのバージョンは丸ごと取り消す
+        conn.execute("BEGIN IMMEDIATE")
+        # 同時に起動した別のプロセスが先に適用していることがあるので、書き込みロックを取ってから読み直す
+        current = get_schema_version(conn)
+        if version <= current:
+            conn.rollback()
+            continue
+        try:
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        current = version
+    return current
@@ -1,13 +1,65 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
 
+# --- block_type（DBの値）→ ブロッククラスの対応表 ---
+BLOCK_TYPES = {}
+
+def register_block(block_type):
+    """ ブロッククラスを block_type と結びつけて登録するデコレータ """
+    def decorator(cls):
+        cls.block_type = block_type
+        BLOCK_TYPES[block_type] = cls
+        return cls
+    return decorator
+
+def block_from_row(b_id, b_type, content, is_done, name, role, location, version=None):
+    """ blocks テーブルの1行を対応するクラスのインスタンスに変換する（未登録の種類は None） """
+    cls = BLOCK_TYPES.get(b_type)
+    if cls is None:
+        return None
+    return cls.from_columns(b_id, content, is_done, name, role, location, version)
+
+def _first_line(text, width):
+    """ 文字列の1行目を width 文字までに切り詰める """
+    line = (text or "").split("\n", 1)[0]
+    return line if len(line) <= width else line[:width] + "…"
+
 # --- 抽象クラス：すべてのブロックの「親」---
 class BaseBlock(ABC):
-    def __init__(self, content="", id=None, created_at=None):
+    # __dict__ を持たせず、ブロック1つあたりのメモリを減らす
+    __slots__ = ("id", "content", "created_at", "version")
+    block_type = None
+
+    def __init__(self, content="", id=None, created_at=None, version=None):
         # 共通の属性はすべて親クラスで管理する
         self.id = id
         self.content = content # ← これを共通名にする
         self.created_at = created_at or datetime.now()
+        # 読み込んだときの版（更新時に expected_version として渡し、ほかの画面の保存との衝突を検出する）
+        self.version = version
+
+    @classmethod
+    def from_columns(cls, b_id, content, is_done, name, role, location, version=None):
+        """ DBのカラムから直接作る（__init__ を通さず、datetime.now() も呼ばない） """
+        block = cls.__new__(cls)
+        block.id = b_id
+        block.content = content
+        block.created_at = None
+        block.version = version
+        block._load_columns(is_done, name, role, location)
+        return block
+
+    def _load_columns(self, is_done, name, role, location):
+        """ 子クラス固有のカラムを読み込む """
+        pass
+
+    def export_values(self):
+        """ CSVの「完了/名前」「役割/場所」列に書き出す値 """
+        return "", ""
+
+    def label(self, width=40):
+        """ 一覧に表示する1行の見出し（render() と違い、本文全体を整形しない） """
+        return _first_line(self.content, width)
 
     @abstractmethod
     def render(self):
@@ -15,43 +67,154 @@ class BaseBlock(ABC):
         pass
 
 # --- 継承：テキスト入力用のブロック ---
+@register_block("text")
 class TextBlock(BaseBlock):
+    __slots__ = ()
+
     def render(self):
         return f"Text: {self.content}"
 
 # --- 継承：ToDoリスト用のブロック ---
+@register_block("todo")
 class TodoBlock(BaseBlock):
+    __slots__ = ("is_done",)
+
     def __init__(self, content="", is_done=False, **kwargs):
         super().__init__(content, **kwargs)
         self.is_done = is_done
-    
+
+    def _load_columns(self, is_done, name, role, location):
+        self.is_done = bool(is_done)
+
+    def export_values(self):
+        return ("完了" if self.is_done else "未完了"), ""
+
+    def label(self, width=40):
+        return f"{'✅' if self.is_done else '⬜'} {_first_line(self.content, width)}"
+
     def render(self):
         status = "✅" if self.is_done else "⬜"
         return f"{status} {self.content}"
-    
+
 # --- 作品用管理用のクラス ---
+@register_block("character")
 class CharacterBlock(BaseBlock):
+    __slots__ = ("name", "role")
+
     def __init__(self, name, role, content, **kwargs):
         # content には「性格・外見」などの詳細を入れる想定
         super().__init__(content, **kwargs)
         self.name = name
         self.role = role # 主人公、ライバル、村人Ａなど
-    
+
+    def _load_columns(self, is_done, name, role, location):
+        self.name = name
+        self.role = role
+
+    def export_values(self):
+        return self.name, self.role
+
+    def label(self, width=40):
+        return f"👤 {self.name} ({self.role})" if self.role else f"👤 {self.name}"
+
     def render(self):
         return f"👤 **キャラ名: {self.name}** ({self.role})\n\n設定: {self.content}"
-    
+
+@register_block("world")
 class WorldSettingBlock(BaseBlock):
+    __slots__ = ("location",)
+
     def __init__(self, location, content, **kwargs):
         super().__init__(content, **kwargs)
         self.location = location
-    
+
+    def _load_columns(self, is_done, name, role, location):
+        self.location = location
+
+    def export_values(self):
+        return self.location, ""
+
+    def label(self, width=40):
+        return f"🗺️ {self.location}"
+
     def render(self):
         return f"🗺️ **場所・項目: {self.location}**\n\n詳細: {self.content}"
 
+@register_block("story")
 class StoryBlock(BaseBlock):
+    __slots__ = ("title",)
+
     def __init__(self, title, content, **kwargs):
         super().__init__(content, **kwargs)
         self.title = title      # 第1話、プロットなど
-    
+
+    def _load_columns(self, is_done, name, role, location):
+        # story は name カラムにタイトルを保存している
+        self.title = name
+
+    def export_values(self):
+        return self.title, ""
+
+    def label(self, width=40):
+        return f"📖 {self.title}"
+
     def render(self):
-        return f"📖 ### {self.title}\n\n{self.content}"
\ No newline at end of file
+        return f"📖 ### {self.title}\n\n{self.content}"
+
+def iter_flyweights(rows):
+    """ blocks テーブルの行を、種類ごとに1つのオブジェクトを使い回しながら変換する
+
+    返されたオブジェクトは次の行で上書きされるので、保持したい場合は block_from_row を使う。
+    """
+    flyweights = {}
+    for b_id, b_type, content, is_done, name, role, location, version in rows:
+        cls = BLOCK_TYPES.get(b_type)
+        if cls is None:
+            continue
+        block = flyweights.get(cls)
+        if block is None:
+            block = flyweights[cls] = cls.__new__(cls)
+            block.created_at = None
+        block.id = b_id
+        block.content = content
+        block.version = version
+        block._load_columns(is_done, name, role, location)
+        yield block
+
+# --- 列指向のブロック一覧 ---
+class BlockView:
+    """ blocks テーブルの行を列ごとのリストで持つ軽量な一覧
+
+    一覧表示や書き出しで、行ごとにオブジェクトを作らずに走査するために使う。
+    """
+    __slots__ = ("ids", "types", "contents", "is_done", "names", "roles", "locations", "versions")
+
+    def __init__(self, rows):
+        # rows: (id, block_type, content, is_done, name, role, location, version) のリスト
+        columns = list(zip(*rows)) if rows else [()] * 8
+        (self.ids, self.types, self.contents, self.is_done,
+         self.names, self.roles, self.locations, self.versions) = columns
+
+    def __len__(self):
+        return len(self.ids)
+
+    def indices(self, *block_types):
+        """ 指定した種類の行番号を返す（省略すると全て） """
+        if not block_types:
+            return range(len(self.ids))
+        return [i for i, t in enumerate(self.types) if t in block_types]
+
+    def block(self, i):
+        """ i 行目のブロックオブジェクトを作る """
+        return block_from_row(self.ids[i], self.types[i], self.contents[i], self.is_done[i],
+                              self.names[i], self.roles[i], self.locations[i], self.versions[i])
+
+    def iter_blocks(self, *block_types):
+        """ 種類ごとに1つのオブジェクトを使い回しながら走査する（flyweight）
+
+        返されたオブジェクトは次の行で上書きされるので、保持したい場合は block(i) を使う。
+        """
+        rows = ((self.ids[i], self.types[i], self.contents[i], self.is_done[i],
+                 self.names[i], self.roles[i], self.locations[i], self.versions[i])
+                for i in self.indices(*block_types))
+        return iter_flyweights(rows)
@@ -0,0 +1,23 @@
+# 章・話の並び順（order_num）の間隔。移動するときは前後の値の間を使うので、1行の更新で済む
+ORDER_GAP = 1 << 16
+
+
+def key_between(before, after):
+    """ before と after の間に入る並び順の値を返す（間が詰まっていて入らなければ None）
+
+    before が None なら先頭、after が None なら末尾に置く値を返す。
+    """
+    if before is None and after is None:
+        return ORDER_GAP
+    if before is None:
+        return after - ORDER_GAP
+    if after is None:
+        return before + ORDER_GAP
+    if after - before < 2:
+        return None
+    return (before + after) // 2
+
+
+def spread_keys(ids):
+    """ 並べたい順の ID から、間隔を空け直した (order_num, id) の行を作る（詰まったときの振り直し用） """
+    return [((i + 1) * ORDER_GAP, row_id) for i, row_id in enumerate(ids)]
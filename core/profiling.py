@@ -0,0 +1,287 @@
+import marshal
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# ヒストグラムの区切り（ミリ秒）。最後の区間は「それ以上」
+HISTOGRAM_BOUNDS_MS = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000)
+# カーソルを for 文で読む場合に、読み出しの時間と行数をまとめて記録する行数
+ITER_RECORD_ROWS = 500
+
+
+def _bucket(ms):
+    for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+        if ms < bound:
+            return i
+    return len(HISTOGRAM_BOUNDS_MS)
+
+
+def normalize_sql(sql):
+    """ 空白をまとめて、同じ文を1つの集計にまとめられるようにする """
+    return " ".join(sql.split())
+
+
+class _Stat:
+    """ 1つのSQL文（または描画フェーズ）の集計 """
+    __slots__ = ("count", "total", "max", "rows", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, seconds, rows=0, count=True):
+        if count:
+            self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.rows += max(rows, 0)
+        if count:
+            self.histogram[_bucket(seconds * 1000)] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "rows": self.rows,
+            "histogram": self.histogram,
+        }
+
+
+class Profiler:
+    """ クエリごとの所要時間・行数と、画面描画のフェーズごとの所要時間を集計する
+
+    画面（セッション）ごとに1つ作り、profiling() の間だけそのスレッドのクエリと描画フェーズを記録する。
+    """
+
+    def __init__(self, recent_size=200):
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._phases = {}
+        # 直近に実行されたクエリ（文, ミリ秒, 行数）
+        self.recent = deque(maxlen=recent_size)
+        self._phase_local = threading.local()
+        # 直近の再実行のフェーズ別所要時間
+        self.last_run = {}
+
+    # --- クエリ ---
+    def record_query(self, sql, seconds, rows):
+        key = normalize_sql(sql)
+        with self._lock:
+            stat = self._queries.get(key)
+            if stat is None:
+                stat = self._queries[key] = _Stat()
+            stat.add(seconds, rows)
+            self.recent.append((key, seconds * 1000, rows))
+
+    def record_fetch(self, sql, seconds, rows):
+        """ SELECT の結果の読み出しにかかった時間と行数を、その文の集計に足す """
+        key = normalize_sql(sql)
+        with self._lock:
+            stat = self._queries.get(key)
+            if stat is not None:
+                stat.add(seconds, rows, count=False)
+
+    # --- 描画フェーズ ---
+    def begin_phase(self, name):
+        """ フェーズの計測を始める（前のフェーズは終了する） """
+        self.end_phase()
+        self._phase_local.current = (name, time.perf_counter())
+
+    def end_phase(self):
+        current = getattr(self._phase_local, "current", None)
+        if current is None:
+            return
+        self._phase_local.current = None
+        name, start = current
+        seconds = time.perf_counter() - start
+        with self._lock:
+            stat = self._phases.get(name)
+            if stat is None:
+                stat = self._phases[name] = _Stat()
+            stat.add(seconds)
+            self.last_run[name] = seconds * 1000
+
+    # --- 出力 ---
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._phases.clear()
+            self.recent.clear()
+            self.last_run = {}
+
+    def report(self):
+        """ 集計結果を JSON にできる辞書で返す（クエリは合計時間の多い順） """
+        with self._lock:
+            queries = sorted(self._queries.items(), key=lambda kv: kv[1].total, reverse=True)
+            return {
+                "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+                "queries": [dict(sql=sql, **stat.to_dict()) for sql, stat in queries],
+                "phases": {name: stat.to_dict() for name, stat in self._phases.items()},
+                "last_run_ms": dict(self.last_run),
+            }
+
+    def to_json(self):
+        import json
+        return json.dumps(self.report(), ensure_ascii=False, indent=2)
+
+    def to_pstats(self):
+        """ pstats.Stats で読み込める形式（cProfile のダンプと同じ marshal 形式）で返す
+
+        クエリは ("sql", 0, 文)、描画フェーズは ("render", 0, フェーズ名) という関数として扱う。
+        """
+        stats = {}
+        with self._lock:
+            for prefix, items in (("sql", self._queries), ("render", self._phases)):
+                for name, stat in items.items():
+                    stats[(prefix, 0, name)] = (stat.count, stat.count, stat.total, stat.total, {})
+        return marshal.dumps(stats)
+
+
+class ProfilingCursor:
+    """ 実行と fetch にかかった時間と行数を Profiler に記録するカーソルのラッパー
+
+    set_trace_callback では実行された文しか分からない（時間も行数も取れない）ので、カーソルを包んで計る。
+    fetchone・fetchmany・fetchall と for 文での読み出しを計測し、行を受け取った側の処理時間は含めない。
+    """
+
+    __slots__ = ("_cursor", "_profiler", "_sql")
+
+    def __init__(self, cursor, profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._sql = ""
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return self._iterate()
+
+    def _iterate(self):
+        """ 1行ずつ返しながら、読み出しの時間と行数を ITER_RECORD_ROWS 行ごとに記録する """
+        sql, seconds, rows = self._sql, 0.0, 0
+        try:
+            next_row = iter(self._cursor).__next__
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next_row()
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - start
+                rows += 1
+                if rows == ITER_RECORD_ROWS:
+                    self._profiler.record_fetch(sql, seconds, rows)
+                    seconds, rows = 0.0, 0
+                yield row
+        finally:
+            if rows or seconds:
+                self._profiler.record_fetch(sql, seconds, rows)
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        return result, time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        _, seconds = self._timed(self._cursor.execute, sql, parameters)
+        self._profiler.record_query(sql, seconds, self._cursor.rowcount)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        _, seconds = self._timed(self._cursor.executemany, sql, seq_of_parameters)
+        self._profiler.record_query(sql, seconds, self._cursor.rowcount)
+        return self
+
+    def fetchall(self):
+        rows, seconds = self._timed(self._cursor.fetchall)
+        self._profiler.record_fetch(self._sql, seconds, len(rows))
+        return rows
+
+    def fetchmany(self, *size):
+        rows, seconds = self._timed(self._cursor.fetchmany, *size)
+        self._profiler.record_fetch(self._sql, seconds, len(rows))
+        return rows
+
+    def fetchone(self):
+        row, seconds = self._timed(self._cursor.fetchone)
+        self._profiler.record_fetch(self._sql, seconds, 1 if row is not None else 0)
+        return row
+
+
+class ProfilingConnection:
+    """ sqlite3.Connection のラッパー。計測中のスレッドにだけ渡すので、計測しない間は素の接続のまま動く """
+
+    __slots__ = ("raw", "_profiler")
+
+    def __init__(self, conn, profiler):
+        self.raw = conn
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.raw.__exit__(*exc)
+
+    def cursor(self):
+        return ProfilingCursor(self.raw.cursor(), self._profiler)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def raw_connection(conn):
+    """ ラッパーを外した sqlite3.Connection を返す（backup など本物の接続が必要な API 用） """
+    return conn.raw if isinstance(conn, ProfilingConnection) else conn
+
+
+# スレッドごとの計測先（Streamlit ではセッションの再実行ごとのスレッド）
+_active = threading.local()
+
+
+def active_profiler():
+    """ 現在のスレッドの計測先（計測していなければ None） """
+    return getattr(_active, "profiler", None)
+
+
+@contextmanager
+def profiling(profiler):
+    """ この間に現在のスレッドで実行したクエリと描画フェーズを profiler に記録する """
+    previous = active_profiler()
+    _active.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        profiler.end_phase()
+        _active.profiler = previous
+
+
+def wrap_connection(conn):
+    """ 現在のスレッドが計測中なら、記録するラッパーを付けて返す """
+    profiler = active_profiler()
+    return conn if profiler is None else ProfilingConnection(conn, profiler)
+
+
+def begin_phase(name):
+    """ 計測中なら描画フェーズを始める（計測していなければ何もしない） """
+    profiler = active_profiler()
+    if profiler is not None:
+        profiler.begin_phase(name)
@@ -0,0 +1,51 @@
+import zlib
+
+# キーフレーム（全文）を保存する間隔。間のリビジョンはキーフレームとの差分だけを保存する
+KEYFRAME_INTERVAL = 20
+# 差分が全文のこの割合より大きくなったら、差分ではなく新しいキーフレームにする
+MAX_DELTA_RATIO = 0.5
+
+
+def pack_text(text):
+    """ 全文（キーフレーム）を圧縮する """
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def unpack_text(data):
+    return zlib.decompress(data).decode("utf-8")
+
+
+def make_delta(base, text):
+    """ base から text を作るための差分を圧縮して返す
+
+    行単位で比較し、[開始行, 終了行] は base の行をそのまま使う、文字列はその内容を挿入する、という命令の列にする。
+    """
+    # 差分を作るのは保存時だけなので、起動時には読み込まない
+    import json
+    from difflib import SequenceMatcher
+
+    base_lines = base.splitlines(keepends=True)
+    new_lines = text.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, base_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j1 < j2:
+            # replace / insert は新しい行を文字列で持つ（delete は何も出力しない）
+            ops.append("".join(new_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def apply_delta(base, delta):
+    """ make_delta の差分を base に適用して元の文字列を復元する """
+    import json
+
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(delta).decode("utf-8")):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return "".join(parts)
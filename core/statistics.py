@@ -0,0 +1,51 @@
+from functools import lru_cache
+
+
+def text_stats(text):
+    """ 本文の (文字数, 行数) を返す（空の本文は 0 行） """
+    if not text:
+        return 0, 0
+    return len(text), text.count("\n") + 1
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """ NumPy は集計の作り直しのときだけ、初めて使うときに読み込む（なければ None） """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def sum_by_key(keys, *columns):
+    """ keys ごとに件数と各列の合計を求め、{key: (件数, 列1の合計, ...)} を返す
+
+    NumPy があれば np.unique と np.bincount でまとめて集計し、なければ1行ずつ足す。
+    """
+    if not keys:
+        return {}
+    np = _numpy()
+    if np is None:
+        result = {}
+        for i, key in enumerate(keys):
+            sums = result.get(key)
+            if sums is None:
+                sums = result[key] = [0] * (len(columns) + 1)
+            sums[0] += 1
+            for j, column in enumerate(columns, 1):
+                sums[j] += column[i]
+        return {key: tuple(sums) for key, sums in result.items()}
+
+    unique, inverse = np.unique(np.asarray(keys, dtype=np.int64), return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(unique))
+    # 重み付きの bincount は float64 を返すので、整数の列は np.add.at で int64 のまま足す
+    totals = []
+    for column in columns:
+        total = np.zeros(len(unique), dtype=np.int64)
+        np.add.at(total, inverse, np.asarray(column, dtype=np.int64))
+        totals.append(total)
+    return {
+        int(key): (int(counts[i]), *(int(total[i]) for total in totals))
+        for i, key in enumerate(unique)
+    }
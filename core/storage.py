@@ -0,0 +1,241 @@
+from abc import ABC, abstractmethod
+
+
+class VersionConflict(Exception):
+    """ 読み込んだ後にほかのセッションが先に保存していたため、更新しなかったことを表す """
+
+    def __init__(self, table, row_id, expected, actual):
+        super().__init__(f"{table} {row_id} はほかの画面で更新されています（読み込んだ版: {expected}、現在の版: {actual}）。")
+        self.table = table
+        self.row_id = row_id
+        self.expected = expected
+        self.actual = actual
+
+
+class DuplicateTitle(Exception):
+    """ 同じ親（作品・章）に同じタイトルがあるため、保存しなかったことを表す """
+
+    def __init__(self, table, parent_id, title):
+        super().__init__(f"「{title}」はすでにあります。別のタイトルにしてください。")
+        self.table = table
+        self.parent_id = parent_id
+        self.title = title
+
+
+class StorageBackend(ABC):
+    """ NotionController・インポート・書き出しが使う保存先のインターフェース
+
+    実装は DatabaseManager（1ファイルの SQLite）、MemoryBackend（メモリ上）、
+    ShardedBackend（作品ごとの SQLite ファイル + カタログ）の3つ。
+    ブロック・章・話の ID は保存先全体で一意で、ID だけで対象を特定できる。
+    SQLite の実装では、episodes の検索インデックスのトリガーが SQL 関数 decompress_text を使う。
+    同じファイルをほかの接続から書き換える場合は core.compression.register_sql_functions で登録すること。
+    """
+
+    # --- 接続・トランザクション ---
+    @abstractmethod
+    def close(self):
+        """ 全ての接続を閉じる """
+
+    @abstractmethod
+    def transaction(self, project_id=None):
+        """ 複数の書き込みを1つのトランザクションにまとめる context manager
+
+        project_id を指定すると、その作品を保存している接続を返す（一括書き込み用の *_bulk に渡す）。
+        """
+
+    def read_only_spec(self):
+        """ 別プロセスで同じ保存先を読み込み専用で開くための (クラス, 引数, キーワード引数) """
+        raise ValueError("この保存先は別プロセスから開けません。")
+
+    # --- 作品 ---
+    @abstractmethod
+    def save_project(self, title):
+        """ 作品を追加して ID を返す """
+
+    @abstractmethod
+    def fetch_all_projects(self):
+        """ (id, title) の一覧を新しい順に返す """
+
+    @abstractmethod
+    def fetch_parent_id(self, table, row_id):
+        """ ブロック・章・話が属する親（作品または章）の ID を返す """
+
+    # --- ブロック ---
+    @abstractmethod
+    def save_block(self, block_type, content, project_id=None, is_done=0, name=None, role=None, location=None):
+        pass
+
+    @abstractmethod
+    def update_block(self, block_id, content, expected_version=None, **kwargs):
+        """ ブロックを更新して新しい版を返す（なければ False）
+
+        expected_version を指定した場合、現在の版と違えば更新せずに VersionConflict を送出する。
+        """
+
+    @abstractmethod
+    def delete_block(self, block_id):
+        pass
+
+    @abstractmethod
+    def fetch_blocks_by_project(self, project_id):
+        """ (id, block_type, content, is_done, name, role, location, version) の一覧 """
+
+    @abstractmethod
+    def iter_blocks_by_project(self, project_id, batch_size=500):
+        """ fetch_blocks_by_project と同じ行を少しずつ返す """
+
+    @abstractmethod
+    def fetch_blocks_page(self, project_id, block_types, after_id=None, limit=50):
+        """ 指定した種類のブロックを ID 順に、after_id より後ろから limit 件まで返す """
+
+    @abstractmethod
+    def count_blocks(self, project_id, block_types):
+        pass
+
+    @abstractmethod
+    def fetch_all_blocks(self):
+        pass
+
+    # --- 章 ---
+    @abstractmethod
+    def save_chapter(self, project_id, title):
+        """ 章を追加する。同名の章があれば False """
+
+    @abstractmethod
+    def fetch_chapters_by_project(self, project_id):
+        """ (id, title) の一覧を順番どおりに返す """
+
+    @abstractmethod
+    def update_chapter_title(self, chapter_id, title):
+        pass
+
+    @abstractmethod
+    def move_chapter(self, chapter_id, after_id=None):
+        """ 章を after_id の章の直後（None なら先頭）に移動する """
+
+    # --- 話 ---
+    @abstractmethod
+    def save_episode(self, chapter_id, title, content):
+        """ 話を追加する。同じ章に同名の話があれば False """
+
+    @abstractmethod
+    def fetch_episodes_by_chapter(self, chapter_id):
+        pass
+
+    @abstractmethod
+    def iter_episodes_by_project(self, project_id, batch_size=100):
+        """ (章ID, 章題, 話ID, 話名, 本文) を章・話の順に1つのクエリで少しずつ返す（話のない章は話の列が None） """
+
+    @abstractmethod
+    def fetch_episode_list(self, chapter_id):
+        pass
+
+    @abstractmethod
+    def fetch_episode_body(self, episode_id):
+        pass
+
+    @abstractmethod
+    def fetch_episode_for_edit(self, episode_id):
+        """ 編集を始めるときの (本文, 版) を1回の読み込みで返す（なければ None） """
+
+    @abstractmethod
+    def update_episode(self, episode_id, title, content, expected_version=None):
+        """ 話を更新して新しい版を返す（なければ False）
+
+        expected_version を指定した場合、現在の版と違えば更新せずに VersionConflict を送出する。
+        同じ章にほかの同名の話があれば DuplicateTitle を送出する。
+        """
+
+    @abstractmethod
+    def delete_episode(self, episode_id):
+        pass
+
+    @abstractmethod
+    def move_episode(self, episode_id, after_id=None):
+        """ 話を同じ章の after_id の話の直後（None なら先頭）に移動する """
+
+    @abstractmethod
+    def fetch_revisions(self, episode_id):
+        pass
+
+    @abstractmethod
+    def fetch_revision_text(self, episode_id, rev_no):
+        pass
+
+    # --- 一括書き込み（transaction(project_id) の接続を渡す） ---
+    @abstractmethod
+    def save_blocks_bulk(self, conn, rows):
+        pass
+
+    @abstractmethod
+    def save_chapters_bulk(self, conn, project_id, titles):
+        pass
+
+    @abstractmethod
+    def save_episodes_bulk(self, conn, rows):
+        pass
+
+    @abstractmethod
+    def fetch_chapter_ids(self, conn, project_id):
+        pass
+
+    @abstractmethod
+    def load_snapshot_tables(self, conn, project_id, tables):
+        """ fetch_snapshot_tables の形のデータを作品に追加する """
+
+    # --- スナップショット ---
+    @abstractmethod
+    def fetch_snapshot_tables(self, project_id):
+        """ 作品の projects・blocks・chapters・episodes を {テーブル: {列名: 値のリスト}} で返す """
+
+    @abstractmethod
+    def import_project_tables(self, title, tables):
+        """ 新しい作品を作ってデータを読み込み、作品IDを返す（失敗したら作品も残さない） """
+
+    # --- 登場話 ---
+    @abstractmethod
+    def fetch_appearances(self, block_id):
+        """ キャラ・世界観ブロックが登場する話 (episode_id, 章題, 話名, 出現回数, 最初の位置) の一覧 """
+
+    @abstractmethod
+    def rebuild_appearances(self, project_id=None):
+        """ 登場話の索引を作り直す（一括書き込みの後に呼ぶ） """
+
+    # --- バックアップ ---
+    @abstractmethod
+    def backup_to(self, directory, pages=-1, sleep=0.0):
+        """ オンラインバックアップ API でデータベースを directory にコピーし、{名前: パス} を返す
+
+        書き込みを止めずに pages ページずつコピーする（間で sleep 秒待つ）。
+        """
+
+    @abstractmethod
+    def restore_from(self, files):
+        """ backup_to で作った {名前: パス} のデータベースで、今の内容を置き換える """
+
+    # --- メンテナンス ---
+    @abstractmethod
+    def run_maintenance(self, vacuum=False, analyze=False, integrity_check=False):
+        """ VACUUM・ANALYZE・integrity_check を行い、{データベース名: {処理: 結果}} を返す """
+
+    # --- 統計・検索 ---
+    @abstractmethod
+    def rebuild_statistics(self, backfill_daily=False):
+        pass
+
+    @abstractmethod
+    def fetch_project_stats(self, project_id):
+        pass
+
+    @abstractmethod
+    def fetch_chapter_stats(self, project_id):
+        pass
+
+    @abstractmethod
+    def fetch_daily_stats(self, project_id, days=30):
+        pass
+
+    @abstractmethod
+    def search(self, project_id, query, limit=50):
+        pass
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from core.appearances import TermMatcher, count_term
+from core.database import DatabaseManager
+
+
+def test_matcher_agrees_with_naive_count():
+    terms = ["アリス", "リス", "アリ", "ス", "ああ", "白ウサギ"]
+    matcher = TermMatcher(list(enumerate(terms)))
+    rng = random.Random(0)
+    for _ in range(200):
+        text = "".join(rng.choice("アリスああ白ウサギ。") for _ in range(rng.randint(0, 60)))
+        expected = {i: list(count_term(text, t)) for i, t in enumerate(terms) if t in text}
+        assert matcher.scan(text) == expected
+
+
+def test_overlapping_and_shared_terms():
+    matcher = TermMatcher([(1, "ああ"), (2, "ああ"), (3, ""), (4, None)])
+    assert sorted(matcher.appearance_rows(10, "あああ")) == [(1, 10, 2, 0), (2, 10, 2, 0)]
+    assert TermMatcher([]).appearance_rows(10, "ああ") == []
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "data.db"))
+    yield manager
+    manager.close()
+
+
+def _setup(db):
+    project_id = db.save_project("作品")
+    db.save_block("character", "主人公", project_id, name="太郎")
+    db.save_block("world", "舞台", project_id, location="東京")
+    taro, tokyo = (row[0] for row in db.fetch_blocks_by_project(project_id))
+    db.save_chapter(project_id, "一章")
+    chapter_id = db.fetch_chapters_by_project(project_id)[0][0]
+    db.save_episode(chapter_id, "第一話", "太郎は東京へ行った。太郎は笑った。")
+    db.save_episode(chapter_id, "第二話", "次郎が来た。")
+    first, second = (row[0] for row in db.fetch_episode_list(chapter_id))
+    return project_id, taro, tokyo, first, second
+
+
+def _counts(db, block_id):
+    return [(row[0], row[3], row[4]) for row in db.fetch_appearances(block_id)]
+
+
+def _table(db):
+    with db.transaction() as conn:
+        return sorted(conn.execute("SELECT block_id, episode_id, count, first_offset FROM appearances"))
+
+
+def test_index_follows_episode_saves_and_block_renames(db):
+    project_id, taro, tokyo, first, second = _setup(db)
+    assert _counts(db, taro) == [(first, 2, 0)]
+    assert _counts(db, tokyo) == [(first, 1, 3)]
+
+    # 話を保存するとその話だけ数え直す
+    db.update_episode(second, "第二話", "次郎と太郎が来た。")
+    assert _counts(db, taro) == [(first, 2, 0), (second, 1, 3)]
+
+    # 名前を変えると、その語の出現を全ての話で数え直す（オートマトンも作り直される）
+    db.update_block(taro, "主人公", name="次郎")
+    assert _counts(db, taro) == [(second, 1, 0)]
+    db.update_episode(first, "第一話", "次郎は東京へ行った。")
+    assert _counts(db, taro) == [(first, 1, 0), (second, 1, 0)]
+
+    # 削除したブロックの索引は残らない
+    db.delete_block(tokyo)
+    assert all(row[0] != tokyo for row in _table(db))
+
+    # 少しずつ更新した索引は、作り直した結果と同じ
+    incremental = _table(db)
+    db.rebuild_appearances(project_id)
+    assert _table(db) == incremental
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from app.autosave import AutoSaver
+
+
+class _Recorder:
+    def __init__(self):
+        self.saved = []
+        self.threads = set()
+        self.event = threading.Event()
+
+    def __call__(self, *args):
+        self.saved.append(args)
+        self.threads.add(threading.current_thread().name)
+        self.event.set()
+
+
+def _wait_for(recorder, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while len(recorder.saved) < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_submits_are_coalesced_and_saved_on_one_thread():
+    recorder = _Recorder()
+    saver = AutoSaver(recorder, delay=0.05, max_wait=1.0)
+    before = threading.active_count()
+    for i in range(20):
+        saver.submit("a", i)
+        saver.submit("b", i)
+    # 依頼ごとにタイマーのスレッドを作らない
+    assert threading.active_count() == before
+
+    _wait_for(recorder, 2)
+    assert sorted(recorder.saved) == [(19,), (19,)]
+    assert recorder.threads == {"autosave"}
+    assert not saver.has_pending()
+    saver.shutdown()
+
+
+def test_max_wait_bounds_the_delay_while_typing():
+    recorder = _Recorder()
+    saver = AutoSaver(recorder, delay=0.2, max_wait=0.1)
+    start = time.monotonic()
+    while not recorder.event.is_set() and time.monotonic() - start < 2:
+        saver.submit("a", time.monotonic())
+        time.sleep(0.01)
+    assert recorder.saved and time.monotonic() - start < 0.5
+    saver.shutdown()
+
+
+def test_discard_flush_and_shutdown():
+    recorder = _Recorder()
+    saver = AutoSaver(recorder, delay=60)
+    saver.submit("a", 1)
+    saver.discard("a")
+    saver.submit("b", 2)
+    assert saver.flush("b") == 1
+    saver.submit("c", 3)
+    # 停止するときに残りを渡す
+    saver.shutdown()
+    assert recorder.saved == [(2,), (3,)]
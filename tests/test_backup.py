@@ -0,0 +1,74 @@
+from app.backup import BackupManager
+from core.database import DatabaseManager
+
+
+def test_list_is_cached_until_backups_change(tmp_path, monkeypatch):
+    db = DatabaseManager(str(tmp_path / "data.db"))
+    db.save_project("作品")
+    backups = BackupManager(db, str(tmp_path / "backups"), keep=2)
+    scans = []
+    original = backups._scan
+    monkeypatch.setattr(backups, "_scan", lambda: scans.append(1) or original())
+
+    first = backups.create()
+    assert [m["id"] for m in backups.list()] == [first["id"]]
+    assert [m["id"] for m in backups.list()] == [first["id"]]
+    # 作成時の削除の確認で1回だけ読み、一覧はそれを使い回す
+    assert len(scans) == 1
+
+    ids = [backups.create()["id"] for _ in range(2)]
+    assert [m["id"] for m in backups.list()] == ids[::-1]
+    assert len(scans) == 3
+    db.close()
+
+
+def test_restore_project_creates_new_project(tmp_path):
+    db = DatabaseManager(str(tmp_path / "data.db"))
+    project_id = db.save_project("作品")
+    db.save_chapter(project_id, "一章")
+    chapter_id = db.fetch_chapters_by_project(project_id)[0][0]
+    db.save_episode(chapter_id, "第一話", "本文")
+    backups = BackupManager(db, str(tmp_path / "backups"))
+
+    manifest = backups.create()
+    new_id = backups.restore_project(manifest["id"], project_id, "復元")
+    assert (new_id, "復元") in db.fetch_all_projects()
+    assert db.fetch_snapshot_tables(new_id)["episodes"]["content"] == ["本文"]
+    db.close()
+
+
+def test_backup_directory_with_uri_characters(tmp_path, monkeypatch):
+    db = DatabaseManager(str(tmp_path / "data.db"))
+    db.save_project("作品")
+    # 相対パスで、URI で特別な意味を持つ文字を含むフォルダ
+    monkeypatch.chdir(tmp_path)
+    backups = BackupManager(db, "back?up#1%20")
+
+    manifest = backups.create()
+    assert manifest["files"][0]["projects"] == [[1, "作品"]]
+    assert backups.verify(manifest["id"]) == {"main": "ok"}
+    db.close()
+
+
+def test_backup_stores_only_changed_blocks(tmp_path):
+    import random
+
+    db = DatabaseManager(str(tmp_path / "data.db"))
+    project_id = db.save_project("作品")
+    rng = random.Random(0)
+    for i in range(200):
+        db.save_block("memo", "".join(rng.choice("あいうえおかきくけこ") for _ in range(3000)), project_id)
+    backups = BackupManager(db, str(tmp_path / "backups"))
+
+    first = backups.create()
+    block_id, _, content = db.fetch_blocks_by_project(project_id)[0][:3]
+    db.update_block(block_id, "書き換え")
+    second = backups.create()
+    # 書き込まれたページを含むまとまりだけを新しく保存する
+    assert first["written_bytes"] == first["compressed_bytes"]
+    assert 0 < second["written_bytes"] < second["compressed_bytes"] / 2
+
+    backups.restore(first["id"])
+    assert db.fetch_blocks_by_project(project_id)[0][2] == content
+    assert backups.verify(second["id"]) == {"main": "ok"}
+    db.close()
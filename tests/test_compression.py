@@ -0,0 +1,55 @@
+import pytest
+
+from core.compression import MIN_COMPRESS_LENGTH, _zstandard, available_codec, compress_text, decompress_text
+from core.database import DatabaseManager
+
+LONG = "吾輩は猫である。名前はまだ無い。\n" * 200
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_round_trip(codec):
+    if codec == "zstd" and _zstandard() is None:
+        pytest.skip("zstandard がインストールされていません")
+    value, used = compress_text(LONG, codec)
+    assert used == codec
+    assert len(value) < len(LONG.encode("utf-8"))
+    assert decompress_text(value, used) == LONG
+
+
+def test_short_text_and_no_codec_are_stored_as_is():
+    short = "あ" * (MIN_COMPRESS_LENGTH - 1)
+    assert compress_text(short, "zlib") == (short, None)
+    assert compress_text(LONG, None) == (LONG, None)
+    assert decompress_text(None, None) is None
+
+
+def test_unavailable_zstd_falls_back_to_zlib(monkeypatch):
+    monkeypatch.setattr("core.compression._zstandard", lambda: None)
+    assert available_codec("zstd") == "zlib"
+    assert compress_text(LONG, "zstd")[1] == "zlib"
+
+
+def test_episodes_round_trip_through_database_with_mixed_codecs(tmp_path):
+    path = str(tmp_path / "data.db")
+    plain = DatabaseManager(path)
+    project_id = plain.save_project("作品")
+    plain.save_chapter(project_id, "一章")
+    chapter_id = plain.fetch_chapters_by_project(project_id)[0][0]
+    plain.save_episode(chapter_id, "非圧縮", LONG)
+    plain.close()
+
+    # 圧縮を有効にした後に保存した話だけが圧縮され、どちらも読める
+    db = DatabaseManager(path, compression="zlib")
+    db.save_episode(chapter_id, "圧縮", LONG + "続き")
+    with db.transaction() as conn:
+        codecs = dict(conn.execute("SELECT title, codec FROM episodes").fetchall())
+    assert codecs == {"非圧縮": None, "圧縮": "zlib"}
+
+    listing = db.fetch_episode_list(chapter_id)
+    assert [(row[1], row[3], row[5]) for row in listing] == [
+        ("非圧縮", len(LONG), LONG.count("\n") + 1), ("圧縮", len(LONG) + 2, LONG.count("\n") + 1),
+    ]
+    assert [db.fetch_episode_body(row[0]) for row in listing] == [LONG, LONG + "続き"]
+    # 検索インデックスは展開した本文を対象にする
+    assert sorted(hit[1] for hit in db.search(project_id, "猫である")) == sorted(row[0] for row in listing)
+    db.close()
@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+
+import pytest
+
+from core import database
+from core.database import DatabaseManager, retry_when_locked
+from core.storage import DuplicateTitle, VersionConflict
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "data.db"))
+    yield manager
+    manager.close()
+
+
+def _new_block(db, content):
+    """ 新しい作品にメモのブロックを1つ作り、その ID を返す """
+    project_id = db.save_project("作品")
+    db.save_block("memo", content, project_id)
+    return db.fetch_blocks_by_project(project_id)[0][0]
+
+
+def _block(db, block_id):
+    project_id = db.fetch_parent_id("blocks", block_id)
+    return next(row for row in db.fetch_blocks_by_project(project_id) if row[0] == block_id)
+
+
+def _episode(db):
+    project_id = db.save_project("作品")
+    db.save_chapter(project_id, "一章")
+    chapter_id = db.fetch_chapters_by_project(project_id)[0][0]
+    db.save_episode(chapter_id, "第一話", "本文1")
+    db.save_episode(chapter_id, "第二話", "本文2")
+    return [row[0] for row in db.fetch_episode_list(chapter_id)]
+
+
+# --- 版を指定した更新（compare-and-swap） ---
+def test_stale_block_version_raises_and_keeps_row(db):
+    block_id = _new_block(db, "元")
+    version = _block(db, block_id)[7]
+    assert db.update_block(block_id, "一回目", expected_version=version) == version + 1
+
+    with pytest.raises(VersionConflict) as conflict:
+        db.update_block(block_id, "古い版から", expected_version=version)
+    assert (conflict.value.expected, conflict.value.actual) == (version, version + 1)
+    assert _block(db, block_id)[2] == "一回目"
+    assert _block(db, block_id)[7] == version + 1
+
+
+def test_stale_episode_version_raises_and_keeps_row(db):
+    first, _ = _episode(db)
+    content, version = db.fetch_episode_for_edit(first)
+    db.update_episode(first, "第一話", "一回目", expected_version=version)
+
+    with pytest.raises(VersionConflict):
+        db.update_episode(first, "第一話", "古い版から", expected_version=version)
+    assert db.fetch_episode_for_edit(first) == ("一回目", version + 1)
+
+
+def test_rename_to_sibling_title_raises_duplicate_title(db):
+    first, second = _episode(db)
+    version = db.fetch_episode_for_edit(second)[1]
+
+    with pytest.raises(DuplicateTitle):
+        db.update_episode(second, "第一話", "書き換え", expected_version=version)
+    assert db.fetch_episode_for_edit(second) == ("本文2", version)
+
+
+# --- ロック待ちのやり直し ---
+class _Flaky:
+    """ 最初の failures 回は "database is locked" で失敗する書き込み """
+
+    def __init__(self, failures, message="database is locked"):
+        self._tx = database._TransactionState()
+        self.failures = failures
+        self.message = message
+        self.calls = 0
+
+    @retry_when_locked
+    def write(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise sqlite3.OperationalError(self.message)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waited = []
+    monkeypatch.setattr(database.time, "sleep", waited.append)
+    return waited
+
+
+def test_locked_write_is_retried_with_bounded_backoff(sleeps):
+    flaky = _Flaky(failures=database.LOCK_RETRY_ATTEMPTS - 1)
+    assert flaky.write() == "ok"
+    assert flaky.calls == database.LOCK_RETRY_ATTEMPTS
+    assert len(sleeps) == database.LOCK_RETRY_ATTEMPTS - 1
+    assert all(0 < s <= database.LOCK_RETRY_MAX_DELAY * 1.5 for s in sleeps)
+
+
+def test_locked_write_gives_up_after_max_attempts(sleeps):
+    flaky = _Flaky(failures=database.LOCK_RETRY_ATTEMPTS)
+    with pytest.raises(sqlite3.OperationalError):
+        flaky.write()
+    assert flaky.calls == database.LOCK_RETRY_ATTEMPTS
+
+
+def test_locked_write_inside_transaction_is_not_retried(sleeps):
+    flaky = _Flaky(failures=1)
+    flaky._tx.depth = 1
+    with pytest.raises(sqlite3.OperationalError):
+        flaky.write()
+    assert (flaky.calls, sleeps) == (1, [])
+
+
+def test_other_errors_are_not_retried(sleeps):
+    flaky = _Flaky(failures=1, message="no such table: blocks")
+    with pytest.raises(sqlite3.OperationalError):
+        flaky.write()
+    assert (flaky.calls, sleeps) == (1, [])
+
+
+# --- 同時更新 ---
+def test_concurrent_increments_lose_no_updates(db):
+    threads, ops = 8, 25
+    block_id = _new_block(db, "0")
+    initial = _block(db, block_id)[7]
+    barrier = threading.Barrier(threads)
+    errors = []
+
+    def increment():
+        barrier.wait()
+        try:
+            for _ in range(ops):
+                while True:
+                    row = _block(db, block_id)
+                    try:
+                        db.update_block(block_id, str(int(row[2]) + 1), expected_version=row[7])
+                        break
+                    except VersionConflict:
+                        continue
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=increment) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    row = _block(db, block_id)
+    assert int(row[2]) == threads * ops
+    assert row[7] == initial + threads * ops
@@ -0,0 +1,65 @@
+import pytest
+
+from app.controller import NotionController
+from core.backends import MemoryBackend
+from core.storage import DuplicateTitle
+
+
+@pytest.fixture
+def controller():
+    c = NotionController(MemoryBackend())
+    yield c
+    c.close()
+
+
+def _two_episodes(controller):
+    project_id = controller.add_project("作品")
+    controller.add_chapter(project_id, "一章")
+    chapter_id = controller.get_chapters(project_id)[0][0]
+    controller.add_episode(chapter_id, "第一話", "本文1")
+    controller.add_episode(chapter_id, "第二話", "本文2")
+    first, second = (row[0] for row in controller.get_episode_list(chapter_id))
+    return chapter_id, first, second
+
+
+def test_rename_episode_to_sibling_title_raises_duplicate_title(controller):
+    chapter_id, first, second = _two_episodes(controller)
+    content, edit = controller.open_episode(second)
+
+    with pytest.raises(DuplicateTitle):
+        controller.update_episode(second, "第一話", "書き換え", edit=edit)
+    assert edit.error is not None
+    assert [row[1] for row in controller.get_episode_list(chapter_id)] == ["第一話", "第二話"]
+    assert controller.get_episode_body(second) == "本文2"
+
+    # 別のタイトルなら保存でき、エラーも消える
+    controller.update_episode(second, "第二話 改", "書き換え", edit=edit)
+    assert edit.error is None
+    assert controller.get_episode_body(second) == "書き換え"
+
+
+def test_queued_rename_to_sibling_title_reports_duplicate_title(controller):
+    chapter_id, first, second = _two_episodes(controller)
+    content, edit = controller.open_episode(second)
+
+    ticket = controller.save_episode_async(second, "第一話", "書き換え", edit)
+    with pytest.raises(DuplicateTitle):
+        ticket.wait(timeout=5)
+    assert isinstance(edit.error, DuplicateTitle)
+    assert controller.get_episode_body(second) == "本文2"
+
+
+def test_revision_text_is_cached_until_episode_is_saved(controller, monkeypatch):
+    chapter_id, first, second = _two_episodes(controller)
+    controller.update_episode(first, "第一話", "二版")
+    rev_no = controller.get_revisions(first)[-1][0]
+    calls = []
+    fetch = controller.db.fetch_revision_text
+    monkeypatch.setattr(controller.db, "fetch_revision_text", lambda *args: calls.append(args) or fetch(*args))
+
+    assert controller.get_revision_text(first, rev_no) == controller.get_revision_text(first, rev_no)
+    assert len(calls) == 1
+    # 保存すると履歴が変わりうるので読み直す
+    controller.update_episode(first, "第一話", "三版")
+    controller.get_revision_text(first, rev_no)
+    assert len(calls) == 2
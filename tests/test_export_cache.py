@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from app.export_cache import ExportCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = ExportCache(directory=str(tmp_path / "exports"))
+    yield c
+    c.close()
+
+
+def _write(text):
+    def build(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return build
+
+
+def test_failed_build_is_not_left_building(cache):
+    def fail(path):
+        raise RuntimeError("書き出しに失敗")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_build("key", fail)
+    assert cache._building == {}
+    assert cache.open("key") is None
+
+    # 次の依頼では作り直せる
+    with cache.get_or_build("key", _write("本文")) as f:
+        assert f.read().decode("utf-8") == "本文"
+
+
+def test_waiter_builds_after_a_concurrent_build_fails(cache):
+    started, release = threading.Event(), threading.Event()
+
+    def fail(path):
+        started.set()
+        release.wait(5)
+        raise RuntimeError("書き出しに失敗")
+
+    errors = []
+
+    def first():
+        try:
+            cache.get_or_build("key", fail)
+        except RuntimeError as e:
+            errors.append(e)
+
+    t1 = threading.Thread(target=first)
+    t1.start()
+    started.wait(5)
+    results = []
+    t2 = threading.Thread(target=lambda: results.append(cache.get_or_build("key", _write("本文"))))
+    t2.start()
+    release.set()
+    t1.join(5)
+    t2.join(5)
+
+    assert not t2.is_alive()
+    assert len(errors) == 1
+    with results[0] as f:
+        assert f.read().decode("utf-8") == "本文"
+    assert cache._building == {}
@@ -0,0 +1,53 @@
+import io
+import re
+import zipfile
+
+import pytest
+
+from app.exporter import ManuscriptExporter
+from core.backends import open_storage
+from core.profiling import Profiler, profiling
+
+
+@pytest.fixture(params=["sqlite", "memory", "sharded"])
+def db(request, tmp_path):
+    kind = request.param
+    path = None if kind == "memory" else str(tmp_path / ("data" if kind == "sharded" else "data.db"))
+    backend = open_storage(kind, path)
+    yield backend
+    backend.close()
+
+
+def test_episodes_are_streamed_in_order_with_one_query(db):
+    project_id = db.save_project("作品")
+    for title in ("一章", "空の章", "三章"):
+        db.save_chapter(project_id, title)
+    first, empty, third = (row[0] for row in db.fetch_chapters_by_project(project_id))
+    db.save_episode(first, "第一話", "本文1")
+    db.save_episode(first, "第二話", "")
+    db.save_episode(third, "第三話", "本文3\n二行目")
+
+    profiler = Profiler()
+    with profiling(profiler):
+        rows = [(ch, ch_title, ep_title, body) for ch, ch_title, _, ep_title, body
+                in ManuscriptExporter(db).iter_episodes(project_id)]
+
+    assert rows == [
+        (first, "一章", "第一話", "本文1"),
+        (first, "一章", "第二話", ""),
+        (empty, "空の章", None, None),
+        (third, "三章", "第三話", "本文3\n二行目"),
+    ]
+    # 話ごとに本文を読み直さない
+    assert sum(q["count"] for q in profiler.report()["queries"]) == 1
+
+
+
+def test_epub_export_is_readable(db):
+    project_id = db.save_project("作品")
+    db.save_chapter(project_id, "一章")
+    db.save_episode(db.fetch_chapters_by_project(project_id)[0][0], "第一話", "本文")
+    data = b"".join(ManuscriptExporter(db).iter_bytes(project_id, "作品", "EPUB (.epub)"))
+    with zipfile.ZipFile(io.BytesIO(data)) as epub:
+        opf = epub.read("OEBPS/content.opf").decode()
+    assert re.search(r'<meta property="dcterms:modified">\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ</meta>', opf)
@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+from app.importer import CsvImporter
+from core.backends import open_storage
+
+CSV = (
+    "type,content,val1,val2\n"
+    "TextBlock,メモ,,\n"
+    "CharacterBlock,主人公,太郎,主役\n"
+    "Chapter,,一章,\n"
+    "Episode,本文1,第一話,一章\n"
+    "Episode,本文2,第二話,二章\n"
+    "Episode,重複,第一話,一章\n"
+    "Unknown,,,\n"
+)
+
+
+@pytest.fixture(params=["sqlite", "sharded"])
+def db(request, tmp_path):
+    kind = request.param
+    backend = open_storage(kind, str(tmp_path / ("data" if kind == "sharded" else "data.db")))
+    yield backend
+    backend.close()
+
+
+def _contents(db, project_id):
+    chapters = db.fetch_chapters_by_project(project_id)
+    episodes = [row[1] for ch_id, _ in chapters for row in db.fetch_episode_list(ch_id)]
+    return [row[2] for row in db.fetch_blocks_by_project(project_id)], [t for _, t in chapters], episodes
+
+
+def test_import_across_chunks(db):
+    project_id = db.save_project("作品")
+    result = CsvImporter(db, chunk_size=2).run(project_id, io.BytesIO(CSV.encode("utf-8-sig")))
+
+    assert (result.rows_read, result.blocks, result.chapters, result.episodes, result.skipped) == (7, 2, 2, 2, 2)
+    assert _contents(db, project_id) == (["メモ", "主人公"], ["一章", "二章"], ["第一話", "第二話"])
+
+
+def test_failure_in_a_later_chunk_rolls_back_everything(db):
+    project_id = db.save_project("作品")
+    db.save_block("text", "既存", project_id)
+    # いくつものチャンクを書き込んだ後で（TextIOWrapper が読み込む単位より後ろで）、壊れた UTF-8 に当たる
+    broken = (CSV + "TextBlock,追加のメモ,,\n" * 2000).encode("utf-8") + b"TextBlock,\xff\xfe,,\n"
+
+    progress = []
+    with pytest.raises(UnicodeDecodeError):
+        CsvImporter(db, chunk_size=2).run(project_id, io.BytesIO(broken), lambda r, f: progress.append(r.blocks))
+    assert progress[-1] > 100
+    assert _contents(db, project_id) == (["既存"], [], [])
+
+
+def test_progress_callback_error_rolls_back(db):
+    project_id = db.save_project("作品")
+    calls = []
+
+    def on_progress(result, fraction):
+        calls.append(result.rows_read)
+        if len(calls) == 2:
+            raise RuntimeError("中断")
+
+    with pytest.raises(RuntimeError):
+        CsvImporter(db, chunk_size=2).run(project_id, io.BytesIO(CSV.encode("utf-8")), on_progress)
+    assert calls == [2, 4]
+    assert _contents(db, project_id) == ([], [], [])
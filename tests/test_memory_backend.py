@@ -0,0 +1,24 @@
+import threading
+
+from core.backends import MemoryBackend
+
+
+def test_block_iterator_holds_connection_until_exhausted():
+    db = MemoryBackend()
+    project_id = db.save_project("作品")
+    for i in range(3):
+        db.save_block("memo", f"メモ{i}", project_id)
+
+    rows = db.iter_blocks_by_project(project_id, batch_size=1)
+    first = next(rows)
+    writer = threading.Thread(target=db.save_block, args=("memo", "別スレッド", project_id))
+    writer.start()
+    # 読み出し中の接続に他のスレッドは書き込めない
+    writer.join(0.2)
+    assert writer.is_alive()
+
+    assert [first[2], *(row[2] for row in rows)] == ["メモ0", "メモ1", "メモ2"]
+    writer.join(5)
+    assert not writer.is_alive()
+    assert len(list(db.iter_blocks_by_project(project_id))) == 4
+    db.close()
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from core import migrations
+from core.database import DatabaseManager
+from core.migrations import SCHEMA_VERSION, get_schema_version
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """ マイグレーションを導入する前のアプリが作ったデータベース（user_version 0、重複したタイトルあり） """
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    migrations._create_base_tables(conn)
+    conn.execute("INSERT INTO projects (title) VALUES ('作品')")
+    conn.executemany("INSERT INTO chapters (project_id, title) VALUES (1, ?)", [("一章",), ("一章",), ("二章",)])
+    conn.executemany("INSERT INTO episodes (chapter_id, title, content) VALUES (1, ?, ?)",
+                     [("第一話", "本文A"), ("第一話", "本文B")])
+    conn.execute("INSERT INTO blocks (project_id, block_type, content, name) VALUES (1, 'character', 'メモ', '太郎')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_baseline_database_is_upgraded_in_place(baseline):
+    db = DatabaseManager(baseline)
+    with db.transaction() as conn:
+        assert get_schema_version(conn) == SCHEMA_VERSION
+
+    # 重複していたタイトルは「タイトル (id)」に改名され、最初の行はそのまま残る
+    assert [title for _, title in db.fetch_chapters_by_project(1)] == ["一章", "一章 (2)", "二章"]
+    episodes = db.fetch_episode_list(1)
+    assert [row[1] for row in episodes] == ["第一話", "第一話 (2)"]
+    assert [db.fetch_episode_body(row[0]) for row in episodes] == ["本文A", "本文B"]
+    assert db.fetch_blocks_by_project(1)[0][4] == "太郎"
+
+    # 以後の重複は制約で防がれる
+    assert db.save_chapter(1, "二章") is False
+    db.close()
+
+    # もう一度開いても何もしない
+    DatabaseManager(baseline).close()
+
+
+def test_stale_version_read_does_not_reapply_migrations(baseline, monkeypatch):
+    """ 別の接続が先に適用した後で、古いバージョンを読んでいた接続が migrate しても失敗しない """
+    first, second = sqlite3.connect(baseline), sqlite3.connect(baseline)
+    assert migrations.migrate(first) == SCHEMA_VERSION
+
+    stale = [0]
+    original = migrations.get_schema_version
+    monkeypatch.setattr(migrations, "get_schema_version", lambda conn: stale.pop() if stale else original(conn))
+    assert migrations.migrate(second) == SCHEMA_VERSION
+    first.close()
+    second.close()
@@ -0,0 +1,87 @@
+import pytest
+
+from core.database import DatabaseManager
+from core.ordering import ORDER_GAP, key_between
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "data.db"))
+    yield manager
+    manager.close()
+
+
+def _chapter_with_episodes(db, count):
+    project_id = db.save_project("作品")
+    db.save_chapter(project_id, "一章")
+    chapter_id = db.fetch_chapters_by_project(project_id)[0][0]
+    for i in range(count):
+        db.save_episode(chapter_id, f"第{i + 1}話", "")
+    return project_id, chapter_id, [row[0] for row in db.fetch_episode_list(chapter_id)]
+
+
+def _orders(db, chapter_id):
+    return {row[0]: row[2] for row in db.fetch_episode_list(chapter_id)}
+
+
+def test_key_between():
+    assert key_between(None, None) == ORDER_GAP
+    assert key_between(None, ORDER_GAP) == 0
+    assert key_between(ORDER_GAP, None) == 2 * ORDER_GAP
+    assert key_between(0, 10) == 5
+    assert key_between(4, 5) is None
+
+
+def test_move_rewrites_only_the_moved_row(db):
+    _, chapter_id, ids = _chapter_with_episodes(db, 4)
+    before = _orders(db, chapter_id)
+
+    assert db.move_episode(ids[3], after_id=ids[0])
+    assert [row[0] for row in db.fetch_episode_list(chapter_id)] == [ids[0], ids[3], ids[1], ids[2]]
+    after = _orders(db, chapter_id)
+    assert [i for i in ids if after[i] != before[i]] == [ids[3]]
+
+    # 先頭へ
+    assert db.move_episode(ids[2])
+    assert [row[0] for row in db.fetch_episode_list(chapter_id)] == [ids[2], ids[0], ids[3], ids[1]]
+
+
+def test_exhausted_gap_is_rebalanced(db, monkeypatch):
+    _, chapter_id, ids = _chapter_with_episodes(db, 4)
+    rebalanced = []
+    original = db._rebalance_order
+    monkeypatch.setattr(db, "_rebalance_order", lambda *args: rebalanced.append(args) or original(*args))
+
+    # 最後の話を1話目の直後へ移すたびに、1話目との間が半分になる
+    expected = list(ids)
+    for _ in range(40):
+        moved = expected.pop()
+        db.move_episode(moved, after_id=expected[0])
+        expected.insert(1, moved)
+        assert [row[0] for row in db.fetch_episode_list(chapter_id)] == expected
+
+    assert rebalanced
+    # 振り直した後は間隔が空いている
+    orders = sorted(_orders(db, chapter_id).values())
+    assert all(b - a >= 2 for a, b in zip(orders, orders[1:]))
+
+
+def test_move_across_parents_is_rejected(db):
+    project_id, chapter_id, ids = _chapter_with_episodes(db, 2)
+    db.save_chapter(project_id, "二章")
+    other = db.fetch_chapters_by_project(project_id)[1][0]
+    db.save_episode(other, "別の章の話", "")
+    other_episode = db.fetch_episode_list(other)[0][0]
+
+    with pytest.raises(ValueError):
+        db.move_episode(ids[0], after_id=other_episode)
+    assert db.move_episode(-1) is False
+
+
+def test_move_chapter(db):
+    project_id = db.save_project("作品")
+    for title in ("一章", "二章", "三章"):
+        db.save_chapter(project_id, title)
+    first, _, third = (row[0] for row in db.fetch_chapters_by_project(project_id))
+    db.move_chapter(first, after_id=third)
+    assert [title for _, title in db.fetch_chapters_by_project(project_id)] == ["二章", "三章", "一章"]
@@ -0,0 +1,37 @@
+from core.database import DatabaseManager
+from core.profiling import ITER_RECORD_ROWS, Profiler, profiling
+
+
+def _query(profiler, prefix):
+    return next(q for q in profiler.report()["queries"] if q["sql"].startswith(prefix))
+
+
+def test_streamed_reads_are_recorded(tmp_path):
+    db = DatabaseManager(str(tmp_path / "data.db"))
+    project_id = db.save_project("作品")
+    for i in range(ITER_RECORD_ROWS + 10):
+        db.save_block("memo", f"メモ{i}", project_id)
+
+    profiler = Profiler()
+    with profiling(profiler):
+        # fetchmany で少しずつ読む書き出し用のジェネレータ
+        assert len(list(db.iter_blocks_by_project(project_id, batch_size=100))) == ITER_RECORD_ROWS + 10
+        # for 文で読む場合
+        with db.transaction() as conn:
+            assert sum(1 for _ in conn.execute("SELECT id FROM blocks")) == ITER_RECORD_ROWS + 10
+
+    assert _query(profiler, "SELECT id, block_type")["rows"] == ITER_RECORD_ROWS + 10
+    assert _query(profiler, "SELECT id FROM blocks")["rows"] == ITER_RECORD_ROWS + 10
+    assert _query(profiler, "SELECT id FROM blocks")["total_ms"] > 0
+    db.close()
+
+
+def test_queries_outside_profiling_are_not_recorded(tmp_path):
+    db = DatabaseManager(str(tmp_path / "data.db"))
+    profiler = Profiler()
+    with profiling(profiler):
+        db.fetch_all_projects()
+    db.save_project("作品")
+    db.fetch_all_projects()
+    assert [q["count"] for q in profiler.report()["queries"]] == [1]
+    db.close()
@@ -0,0 +1,71 @@
+import pytest
+
+from core import revisions
+from core.database import DatabaseManager
+
+
+@pytest.mark.parametrize("base, text", [
+    ("", "一行目\n"),
+    ("一行目\n二行目\n三行目", "一行目\n二行目\n三行目"),
+    ("一行目\n二行目\n三行目", "零行目\n一行目\n三行目\n四行目"),
+    ("一行目\r\n二行目\r\n", "一行目\r\n二行目を変更\r\n"),
+    ("末尾に改行なし", "末尾に改行なし\n追加"),
+    ("消す\n残す\n", ""),
+])
+def test_delta_round_trip(base, text):
+    assert revisions.apply_delta(base, revisions.make_delta(base, text)) == text
+    assert revisions.unpack_text(revisions.pack_text(text)) == text
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "data.db"), compression="zlib")
+    yield manager
+    manager.close()
+
+
+def _episode(db):
+    project_id = db.save_project("作品")
+    db.save_chapter(project_id, "一章")
+    chapter_id = db.fetch_chapters_by_project(project_id)[0][0]
+    db.save_episode(chapter_id, "第一話", "")
+    return db.fetch_episode_list(chapter_id)[0][0]
+
+
+def _stored(db, episode_id):
+    with db.transaction() as conn:
+        return conn.execute(
+            "SELECT rev_no, base_rev FROM episode_revisions WHERE episode_id = ? ORDER BY rev_no", (episode_id,)
+        ).fetchall()
+
+
+def test_every_revision_restores_its_text(db, monkeypatch):
+    # 連続保存をまとめないようにして、保存ごとに版を作る
+    monkeypatch.setattr(db, "REVISION_COALESCE_SECONDS", 0)
+    episode_id = _episode(db)
+    body = "\n".join(f"{i}行目の文章。" * 20 for i in range(50))
+    texts = []
+    for i in range(revisions.KEYFRAME_INTERVAL + 5):
+        body = body.replace(f"{i}行目", f"{i}行目（改稿）", 1)
+        db.update_episode(episode_id, "第一話", body)
+        texts.append(body)
+
+    stored = _stored(db, episode_id)
+    assert len(stored) == len(texts)
+    # 小さな変更は差分、KEYFRAME_INTERVAL ごとに全文
+    assert [rev for rev, base in stored if base is None] == [1, revisions.KEYFRAME_INTERVAL + 1]
+    for (rev_no, _), text in zip(stored, texts):
+        assert db.fetch_revision_text(episode_id, rev_no) == text
+    assert [row[0] for row in db.fetch_revisions(episode_id)] == [rev for rev, _ in reversed(stored)]
+
+
+def test_quick_saves_are_coalesced_and_unchanged_text_is_skipped(db):
+    episode_id = _episode(db)
+    base = "本文。" * 500
+    db.update_episode(episode_id, "第一話", base)
+    db.update_episode(episode_id, "第一話", base + "一")
+    db.update_episode(episode_id, "第一話", base + "一二")
+    db.update_episode(episode_id, "第一話", base + "一二")
+
+    assert _stored(db, episode_id) == [(1, None), (2, 1)]
+    assert db.fetch_revision_text(episode_id, 2) == base + "一二"
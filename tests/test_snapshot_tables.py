@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from core.backends import open_storage
+
+
+@pytest.fixture(params=["sqlite", "memory", "sharded"])
+def db(request, tmp_path):
+    kind = request.param
+    path = None if kind == "memory" else str(tmp_path / ("data" if kind == "sharded" else "data.db"))
+    backend = open_storage(kind, path)
+    yield backend
+    backend.close()
+
+
+def _project(db):
+    project_id = db.save_project("作品")
+    db.save_chapter(project_id, "一章")
+    chapter_id = db.fetch_chapters_by_project(project_id)[0][0]
+    db.save_episode(chapter_id, "第一話", "本文")
+    return project_id
+
+
+def test_import_project_tables_copies_project(db):
+    tables = db.fetch_snapshot_tables(_project(db))
+    new_id = db.import_project_tables("複製", tables)
+    assert db.fetch_snapshot_tables(new_id)["episodes"]["content"] == ["本文"]
+
+
+def test_failed_import_leaves_no_project(db):
+    tables = db.fetch_snapshot_tables(_project(db))
+    before = db.fetch_all_projects()
+
+    def batches():
+        yield tables["episodes"]
+        raise RuntimeError("読み込み失敗")
+
+    with pytest.raises(RuntimeError):
+        db.import_project_tables("失敗", dict(tables, episodes=batches()))
+    assert db.fetch_all_projects() == before
+    if hasattr(db, "shard_path"):
+        assert not os.path.exists(db.shard_path(before[-1][0] + 1))
@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+from app.backup import _inspect
+from core.compression import register_sql_functions
+from core.database import DatabaseManager
+from core.migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+
+@pytest.fixture
+def path(tmp_path):
+    db = DatabaseManager(str(tmp_path / "data.db"), compression="zlib")
+    project_id = db.save_project("作品")
+    db.save_chapter(project_id, "一章")
+    db.save_episode(db.fetch_chapters_by_project(project_id)[0][0], "第一話", "本文" * 1000)
+    db.close()
+    return str(tmp_path / "data.db")
+
+
+def test_bare_connection_needs_registered_functions(path):
+    conn = sqlite3.connect(path)
+    with pytest.raises(sqlite3.OperationalError, match="no such function"):
+        conn.execute("UPDATE episodes SET title = '改題'")
+    conn.rollback()
+
+    register_sql_functions(conn)
+    conn.execute("UPDATE episodes SET title = '改題'")
+    conn.commit()
+    assert conn.execute("SELECT rowid FROM episodes_fts WHERE episodes_fts MATCH '本文本文'").fetchall() == [(1,)]
+    conn.close()
+
+
+def test_migrate_from_bare_connection(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "bare.db"), isolation_level=None)
+    assert migrate(conn) == SCHEMA_VERSION
+    conn.execute("INSERT INTO projects (title) VALUES ('作品')")
+    conn.execute("INSERT INTO chapters (project_id, title) VALUES (1, '一章')")
+    conn.execute("INSERT INTO episodes (chapter_id, title, content) VALUES (1, '第一話', '本文')")
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    conn.close()
+
+
+def test_backup_inspect_reads_migrated_database(path):
+    assert _inspect(path) == ("ok", [[1, "作品"]])